@@ -22,9 +22,11 @@
 # the specific language governing permissions and limitations under the License. 
 #
 # ============================================================================== 
-from pyevall.comparators.formats import PyEvALLFormat
+from pyevall.comparators.formats import PyEvALLFormat, PyEvALLEncoding
 from pyevall.utils.utils import PyEvALLUtils
+import pandas as pd
 import numpy as np
+import math
        
        
        
@@ -34,15 +36,27 @@ class Comparator(object):
     COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL="multilabel"
     COMPARATOR_PROPERTY_CLASSIFICATION_LEWEDI="lewedi"
     COMPARATOR_PROPERTY_RANKING="ranking"
+    #Sufficient statistics shared by the metrics, computed only once per test case
+    COMPARATOR_STATISTIC_CONF_MATRIX="conf_matrix"
+    COMPARATOR_STATISTIC_MARGINALS="marginals"
+    COMPARATOR_STATISTIC_CLASS_COUNTS="class_counts"
 
 
-    def __init__(self, p_df, g_df, tc, evaluation_id):
+    def __init__(self, p_df, g_df, tc, evaluation_id, encoding=None):
         self.evaluation_id=evaluation_id
         self.logger = PyEvALLUtils.get_logger(__name__, evaluation_id)    
         self.logger.debug("Initializing object")            
         self.pred_df= p_df
         self.gold_df = g_df
         self.testcase=tc   
+        #Integer codes of the ids and labels, shared by gold and predictions
+        if encoding is None:
+            encoding = PyEvALLEncoding(g_df).encode_predictions(p_df)
+        self.encoding=encoding
+        #Scores of the gold against itself shared by the comparators of the same gold standard, if any
+        self.gold_scores=None
+        self.pred_positions=None
+        self.missing_pred=None
         self.proporties=({
             Comparator.COMPARATOR_PROPERTY_CLASSIFICATION:False,
             Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL:False,
@@ -58,7 +72,35 @@ class Comparator(object):
     #                                        #
     ##########################################   
     def get_pred_df(self):
-        return self.pred_df    
+        return self.pred_df
+    
+    
+    #Type of the values of the gold. The parser checks that all the values of a test case have the same type, so 
+    #only the first value is inspected.
+    def get_gold_value_type(self):
+        return type(self.gold_df[PyEvALLFormat.VALUE].iloc[:1].tolist()[0])    
+    
+    
+    #Alignment between gold and predictions shared by all metrics, computed only once. It returns the position in
+    #pred_df of the prediction of each gold instance (-1 if not predicted) and the mask of instances without prediction.
+    def get_alignment(self):
+        if self.pred_positions is None:
+            self.logger.debug("Aligning gold and predictions for testcase %s", self.testcase)
+            #Only the first prediction of an id is considered
+            first = self.encoding.get_first_positions(self.encoding.pred_ids)
+            self.pred_positions = first[self.encoding.gold_ids]
+            self.missing_pred = self.pred_positions<0
+        return self.pred_positions, self.missing_pred
+    
+    
+    #Values of the predictions aligned with gold_df, None for instances without prediction. A copy of pred_df 
+    #with the same order of rows can be provided to align transformed values.
+    def get_pred_values_aligned(self, pred_df=None):
+        if pred_df is None:
+            pred_df = self.pred_df
+        pred_positions, missing_pred = self.get_alignment()
+        pred_values = pred_df[PyEvALLFormat.VALUE].to_numpy()
+        return [None if missing else pred_values[pos] for pos, missing in zip(pred_positions, missing_pred)]
     
     
     def get_testcase(self):
@@ -69,11 +111,10 @@ class Comparator(object):
 #        return df[PyEvALLFormat.VALUE].unique()    
     
     
+    #Classes of gold in order of appearance, that is, the labels with the codes 0..num_gold_labels-1
     def get_classes_gold(self):
-        if self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL]:
-            return self.gold_df[PyEvALLFormat.VALUE].unique()   
-        elif self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL]:
-            return self.gold_df[PyEvALLFormat.VALUE].explode().unique()
+        if self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL] or self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL]:
+            return self.encoding.labels[:self.encoding.num_gold_labels]
     
     
     def get_col_as_list_df(self, df, col):        
@@ -93,22 +134,48 @@ class Comparator(object):
     
     
     def get_num_instances_gold_per_category_in_value(self, cl):
-        if self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL]:
-            return self.gold_df[self.gold_df[PyEvALLFormat.VALUE] == cl].shape[0]  
-        elif self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL]:
-            occurences = self.gold_df.apply(lambda row: self.is_category_in_array(cl, row[PyEvALLFormat.VALUE]), axis=1).tolist()
-            return sum(occurences)   
+        if self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL] or self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL]:
+            if self.class_counts_gold==None:
+                self.generate_class_counts()
+            if cl in self.class_counts_gold:
+                return self.class_counts_gold[cl]
+            return self.count_category_in_value(self.gold_df, cl)
     
     
     #Class may not exist in predictions
     def get_num_instances_pred_per_category_in_value(self, cl):        
         if len(self.pred_df)==0:
             return None
+        if self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL] or self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL]:
+            if self.class_counts_pred==None:
+                self.generate_class_counts()
+            if cl in self.class_counts_pred:
+                return self.class_counts_pred[cl]
+            return self.count_category_in_value(self.pred_df, cl)
+        
+        
+    #Instances of a class that is not in gold, counted over the rows of the DataFrame
+    def count_category_in_value(self, df, cl):
         if self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL]:
-            return self.pred_df[self.pred_df[PyEvALLFormat.VALUE] == cl].shape[0]     
-        elif self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL]:
-            occurences = self.pred_df.apply(lambda row: self.is_category_in_array(cl, row[PyEvALLFormat.VALUE]), axis=1).tolist()
-            return sum(occurences)
+            return df[df[PyEvALLFormat.VALUE] == cl].shape[0]  
+        occurences = df.apply(lambda row: self.is_category_in_array(cl, row[PyEvALLFormat.VALUE]), axis=1).tolist()
+        return sum(occurences)
+        
+        
+    #Number of instances of each class of gold in the gold and in the predictions, computed in one pass
+    def generate_class_counts(self):
+        self.logger.debug("Generating class counts for testcase %s", self.testcase)
+        lst_classes = list(self.get_classes_gold())
+        self.class_counts_gold = self.count_classes(self.encoding.gold_labels, self.encoding.gold_label_rows, len(self.gold_df), lst_classes)
+        self.class_counts_pred = self.count_classes(self.encoding.pred_labels, self.encoding.pred_label_rows, len(self.pred_df), lst_classes)
+        
+        
+    def count_classes(self, codes, rows, size, lst_classes):
+        if self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL]:
+            counts = np.bincount(codes[codes<len(lst_classes)], minlength=len(lst_classes))
+        else:
+            counts = self.get_matrix_labels(codes, rows, size).sum(axis=0)
+        return dict(zip(lst_classes, counts.tolist()))
         
         
     def is_category_in_array(self, cl, classes):
@@ -119,12 +186,12 @@ class Comparator(object):
     
     #Check if there is only one class in both the gold and the output, and if there is the same number of instances.
     def is_1_category_in_value_goldAndPred_and_same_instances(self):   
-        lst_gold = self.gold_df[PyEvALLFormat.VALUE].unique()
-        lst_pred = self.pred_df[PyEvALLFormat.VALUE].unique()
+        lst_gold = np.unique(self.encoding.gold_labels)
+        lst_pred = np.unique(self.encoding.pred_labels)
         if len(lst_gold)==1 and len(lst_pred)==1:
             if lst_gold[0]==lst_pred[0]:
-                lst_id_gold=self.gold_df[PyEvALLFormat.ID].unique()
-                lst_id_pred=self.pred_df[PyEvALLFormat.ID].unique()
+                lst_id_gold=self.encoding.gold_ids
+                lst_id_pred=self.encoding.pred_ids
                 dif1 = np.setdiff1d(lst_id_gold, lst_id_pred)
                 dif2 = np.setdiff1d(lst_id_pred, lst_id_gold)
  
@@ -140,21 +207,25 @@ class ClassificationComparator(Comparator):
     def __init__(self):           
         self.logger.debug("Initializing object")
         self.hierarchy = PyEvALLUtils.get_active_configuration(self.evaluation_id)[PyEvALLUtils.PARAM_HIERARCHY]       
+        self.hierarchy_index = PyEvALLUtils.get_active_configuration(self.evaluation_id)[PyEvALLUtils.HIERARCHY_INDEX]
 
         self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION]=True
         self.preprocess_df_format_classification()
         self.conf_matrix_monolabel=dict()
         self.conf_matrix_multilabel=dict()
         self.index_classes=dict()
+        self.class_counts_gold=None
+        self.class_counts_pred=None
+        self.marginals_pred=None
         
         
     def preprocess_df_format_classification(self):      
-        lst_g_type=self.gold_df[PyEvALLFormat.VALUE].apply(type).unique()                  
-        if lst_g_type[0]==type(""):
+        g_type=self.get_gold_value_type()                  
+        if g_type==type(""):
             self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL]= True 
-        elif lst_g_type[0]==type([]):
+        elif g_type==type([]):
             self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL]= True 
-        elif lst_g_type[0]==type(dict()):
+        elif g_type==type(dict()):
             self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_LEWEDI]= True
         else:
             self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION]= False 
@@ -165,6 +236,23 @@ class ClassificationComparator(Comparator):
         self.logger.debug("Generating Confusion matrix")        
         self.generate_index_classes_and_init_matrix()  
         self.generate_conf_matrix_row()
+        
+        
+    def generate_statistics(self, lst_statistics):
+        """
+        Computes in one pass the sufficient statistics required by a group of metrics, so that all of them are 
+        derived from the same confusion matrix, marginals and class counts of the test case.
+        """
+        if not (self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL] 
+                or self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL]):
+            return
+        if Comparator.COMPARATOR_STATISTIC_CONF_MATRIX in lst_statistics or Comparator.COMPARATOR_STATISTIC_MARGINALS in lst_statistics:
+            if len(self.conf_matrix_monolabel)==0 and len(self.conf_matrix_multilabel)==0:
+                self.generate_conf_matrix()
+        if Comparator.COMPARATOR_STATISTIC_MARGINALS in lst_statistics and self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL]:
+            self.get_marginals_pred()
+        if Comparator.COMPARATOR_STATISTIC_CLASS_COUNTS in lst_statistics and self.class_counts_gold==None:
+            self.generate_class_counts()
 
             
     def generate_index_classes_and_init_matrix(self):
@@ -183,39 +271,52 @@ class ClassificationComparator(Comparator):
     
     
     #Only ids that exist in gold are computed
-    def generate_conf_matrix_row(self):                 
-        self.gold_df.apply(lambda row: self.generate_pair_matrix(row[PyEvALLFormat.ID], row[PyEvALLFormat.VALUE],self.pred_df), axis=1)
-
-
-    def generate_pair_matrix(self, gold_id, gold_value, pred_df):
-        self.logger.debug("Adding pair id in confusion matrix: gold - (%s,%s) for testcase %s", gold_id, gold_value, self.testcase)
-        row = pred_df[pred_df[PyEvALLFormat.ID] == gold_id]
+    def generate_conf_matrix_row(self):
+        pos_pred, missing_pred = self.get_alignment()
+        pos_pred = pos_pred[~missing_pred]
+        
         if self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL]:
-            if not row.empty:
-                pred_value= row.iloc[0][PyEvALLFormat.VALUE]
-                if pred_value in self.index_classes:
-                    pos_gold = self.get_index_matrix_by_class(gold_value)
-                    pos_pred = self.get_index_matrix_by_class(pred_value)
-                    self.conf_matrix_monolabel[pos_gold, pos_pred]=self.conf_matrix_monolabel[pos_gold, pos_pred]+1
-                    
+            self.generate_conf_matrix_monolabel(self.encoding.gold_labels[~missing_pred], self.encoding.pred_labels[pos_pred])
         elif self.proporties[Comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MULTILABEL]:
-            if not row.empty:
-                pred_value= row.iloc[0][PyEvALLFormat.VALUE]                  
-                for cl in self.conf_matrix_multilabel:                        
-                    #True positive
-                    if cl in gold_value and cl in pred_value:
-                        self.conf_matrix_multilabel[cl][1][0]+=1
-                    #False negative
-                    elif cl in gold_value and not cl in pred_value:
-                        self.conf_matrix_multilabel[cl][1][1]+=1
-                    #True negative
-                    elif not cl in gold_value and not cl in pred_value:
-                        self.conf_matrix_multilabel[cl][0][0]+=1     
-                    #False positive
-                    elif not cl in gold_value and cl in pred_value:
-                        self.conf_matrix_multilabel[cl][0][1]+=1            
-
-
+            gold_labels = self.get_matrix_labels(self.encoding.gold_labels, self.encoding.gold_label_rows, len(self.gold_df))
+            pred_labels = self.get_matrix_labels(self.encoding.pred_labels, self.encoding.pred_label_rows, len(self.pred_df))
+            self.generate_conf_matrix_multilabel(gold_labels[~missing_pred], pred_labels[pos_pred])
+            
+    
+    def generate_conf_matrix_monolabel(self, codes_gold, codes_pred):
+        self.logger.debug("Adding %s pairs in confusion matrix for testcase %s", len(codes_gold), self.testcase)
+        size = len(self.index_classes)
+        #Predictions of classes not in gold are not computed
+        valid = codes_pred<size
+        counts = np.bincount(codes_gold[valid].astype(np.int64)*size + codes_pred[valid], minlength=size*size)
+        self.conf_matrix_monolabel = self.conf_matrix_monolabel + counts.reshape(size, size)
+        
+        
+    def generate_conf_matrix_multilabel(self, gold_labels, pred_labels):
+        self.logger.debug("Adding %s pairs in confusion matrix for testcase %s", len(gold_labels), self.testcase)
+        lst_classes = list(self.conf_matrix_multilabel)
+        
+        #True positive
+        tp = np.sum(gold_labels & pred_labels, axis=0)
+        #False negative
+        fn = np.sum(gold_labels & ~pred_labels, axis=0)
+        #True negative
+        tn = np.sum(~gold_labels & ~pred_labels, axis=0)
+        #False positive
+        fp = np.sum(~gold_labels & pred_labels, axis=0)
+        for index, cl in enumerate(lst_classes):
+            self.conf_matrix_multilabel[cl][1][0]+=tp[index]
+            self.conf_matrix_multilabel[cl][1][1]+=fn[index]
+            self.conf_matrix_multilabel[cl][0][0]+=tn[index]
+            self.conf_matrix_multilabel[cl][0][1]+=fp[index]
+            
+            
+    def get_matrix_labels(self, codes, rows, size):
+        #Boolean matrix instances x classes of gold with the classes of each instance, given the code and the row of each label
+        labels = np.zeros(shape=(size, self.encoding.num_gold_labels), dtype=bool)
+        in_gold = codes<self.encoding.num_gold_labels
+        labels[rows[in_gold], codes[in_gold]] = True
+        return labels
 
 
     def get_index_matrix_by_class(self, cl):   
@@ -250,18 +351,18 @@ class ClassificationComparator(Comparator):
 
     def get_pred_for_class(self,cl):
         self.logger.debug("Getting predicted instances for class %s in testcase %s", cl, self.testcase)
-        #Generate confusion matrix if it is empty
-        if len(self.conf_matrix_monolabel)==0 and len(self.conf_matrix_multilabel)==0:
-            self.generate_conf_matrix()
-            
-        pred_for_class=0
-        matrix = self.conf_matrix_monolabel
         index = self.get_index_matrix_by_class(cl)
-        length = len(matrix)
-        for i in range(length):
-            pred_for_class+= matrix[i, index]
-        
-        return pred_for_class
+        return self.get_marginals_pred()[index]
+    
+    
+    #Predicted instances of each class: sum of each column of the confusion matrix
+    def get_marginals_pred(self):
+        if self.marginals_pred is None:
+            #Generate confusion matrix if it is empty
+            if len(self.conf_matrix_monolabel)==0 and len(self.conf_matrix_multilabel)==0:
+                self.generate_conf_matrix()
+            self.marginals_pred = self.conf_matrix_monolabel.sum(axis=0)
+        return self.marginals_pred
 
 
         
@@ -272,41 +373,69 @@ class RankingComparator(Comparator):
         self.proporties[Comparator.COMPARATOR_PROPERTY_RANKING]=True
         self.preprocess_df_format_ranking()
         if self.proporties[Comparator.COMPARATOR_PROPERTY_RANKING]:
-            self.pred_df_sorted= self.pred_df.sort_values(PyEvALLFormat.VALUE)
+            #Position in pred_df of each prediction of the ranking
+            self.pred_order= self.pred_df[PyEvALLFormat.VALUE].reset_index(drop=True).sort_values().index.to_numpy()
+            self.pred_df_sorted= self.pred_df.iloc[self.pred_order]
             self.duplicate_values=None
+            self.ranking_cum_relevants=None
 
 
     def preprocess_df_format_ranking(self):         
         #If gold has different data types in value it is an error.          
-        lst_g_type=self.gold_df[PyEvALLFormat.VALUE].apply(type).unique()
-        if not (lst_g_type[0]==type(1)):
+        if not (self.get_gold_value_type()==type(1)):
             self.proporties[Comparator.COMPARATOR_PROPERTY_RANKING]= False
             return 
         
         
     
+    #Ranking engine: arrays aligned with pred_df_sorted, computed only once and shared by all ranking metrics. It 
+    #contains the value in gold of each prediction, the mask of predictions that are in gold, the mask of relevant
+    #predictions (value greater than 0 in gold) and the cumulative sum of relevant predictions.
+    def generate_ranking_arrays(self):
+        self.logger.debug("Generating ranking arrays for testcase %s", self.testcase)
+        pos = self.encoding.get_first_positions(self.encoding.gold_ids)[self.get_pred_ids_sorted()]
+        gold_values = self.gold_df[PyEvALLFormat.VALUE].to_numpy()
+        
+        self.ranking_in_gold = pos>=0
+        self.ranking_gold_values = np.where(self.ranking_in_gold, gold_values[pos].astype(np.float64), 0.0)
+        self.ranking_relevants = self.ranking_in_gold & (self.ranking_gold_values>0)
+        self.ranking_cum_relevants = np.cumsum(self.ranking_relevants)
+        
+    
+    #Codes of the ids of the predictions sorted as the ranking
+    def get_pred_ids_sorted(self):
+        return self.encoding.pred_ids[self.pred_order]
+    
+    
+    def get_ranking_arrays(self):
+        if self.ranking_cum_relevants is None:
+            self.generate_ranking_arrays()
+        return self.ranking_gold_values, self.ranking_in_gold, self.ranking_relevants, self.ranking_cum_relevants
+    
+    
+    #Discount log2(k+1) of the positions k=1..size of a ranking, with the same precision of math.log10
+    def get_ranking_discounts(self, size):
+        return np.array([math.log10(k+1)/math.log10(2) for k in range(1, size+1)], dtype=np.float64)
+    
+    
+    #Gain 2^value-1 of the gold values sorted as the perfect ranking
+    def get_gains_perfect_rank_gold(self):
+        values = np.sort(self.gold_df[PyEvALLFormat.VALUE].to_numpy().astype(np.float64))[::-1]
+        return np.power(2.0, values)-1
+    
+    
     def get_first_k_relevant_items_in_pred(self, param_k):
-        relevants=0
         k= min(param_k, len(self.pred_df_sorted))
-        for i in range(0,k):
-            id = self.pred_df_sorted.iloc[i, 1]
-            row = self.gold_df[self.gold_df[PyEvALLFormat.ID] == id]
-            if len(row)>0:
-                if row[PyEvALLFormat.VALUE].tolist()[0]>0:
-                    relevants+=1
-            
-        return relevants
+        if k<=0:
+            return 0
+        return int(self.get_ranking_arrays()[3][k-1])
     
     
     def get_position_first_relevant_in_pred(self):
-        k= len(self.pred_df_sorted)
-        for i in range(0,k):
-            id = self.pred_df_sorted.iloc[i, 1]
-            row = self.gold_df[self.gold_df[PyEvALLFormat.ID] == id]
-            if len(row)>0:
-                if row[PyEvALLFormat.VALUE].tolist()[0]>0:
-                    return (i+1)            
-        return None
+        relevants = self.get_ranking_arrays()[2]
+        if not relevants.any():
+            return None
+        return int(np.argmax(relevants))+1
     
     
     def get_all_relevants_items_in_gold(self):
@@ -340,13 +469,176 @@ class RankingComparator(Comparator):
         
         
 class PyEvALLComparator(ClassificationComparator, RankingComparator):
-    def __init__(self, p_df, g_df, tc, evaluation_id):
-        Comparator.__init__(self,p_df, g_df, tc, evaluation_id)
+    def __init__(self, p_df, g_df, tc, evaluation_id, encoding=None):
+        Comparator.__init__(self,p_df, g_df, tc, evaluation_id, encoding)
         ClassificationComparator.__init__(self)
         RankingComparator.__init__(self)
 
 
+
+
+class PyEvALLRankingBatch(object):
+    """
+    Rankings of all the test cases (queries) packed in CSR arrays, so that ranking metrics are computed for all 
+    the queries at once. The items of query q are in the positions offsets[q]:offsets[q+1] of the arrays, sorted 
+    as the ranking of predictions (pred_df_sorted of each comparator). Queries without the ranking property are 
+    empty.
+    """
+    #Maximum number of cells of the padded matrices used to accumulate values inside each query
+    MAX_CELLS_ACCUMULATE=1<<22
+    
+    
+    def __init__(self, lst_comparators, evaluation_id):
+        self.evaluation_id=evaluation_id
+        self.logger = PyEvALLUtils.get_logger(__name__, evaluation_id)    
+        self.logger.debug("Generating ranking batch of %s test cases", len(lst_comparators))
+        self.comparators = lst_comparators
+        self.size = len(lst_comparators)
+        self.ranking = np.array([comp.proporties[Comparator.COMPARATOR_PROPERTY_RANKING] for comp in lst_comparators], dtype=bool)
+        self.generate_ranking_arrays()
+        self.generate_gold_arrays()
+        
+        
+    def get_ranking_comparators(self):
+        return [comp for comp, ranking in zip(self.comparators, self.ranking) if ranking]
+    
+    
+    #Offsets of the segments of each query given their lengths
+    @staticmethod
+    def get_offsets(lengths):
+        offsets = np.zeros(len(lengths)+1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return offsets
+    
+    
+    #Position of each item inside its query, starting at 1
+    @staticmethod
+    def get_positions(offsets):
+        lengths = np.diff(offsets)
+        return np.arange(1, offsets[-1]+1, dtype=np.int64) - np.repeat(offsets[:-1], lengths)
+    
+    
+    def generate_ranking_arrays(self):
+        lst_comp = self.get_ranking_comparators()
+        pred_lengths = np.zeros(self.size, dtype=np.int64)
+        pred_lengths[self.ranking] = [len(comp.pred_df_sorted) for comp in lst_comp]
+        gold_lengths = np.zeros(self.size, dtype=np.int64)
+        gold_lengths[self.ranking] = [len(comp.gold_df) for comp in lst_comp]
+        self.offsets = self.get_offsets(pred_lengths)
+        self.gold_offsets = self.get_offsets(gold_lengths)
+        self.positions = self.get_positions(self.offsets)
+        self.gold_positions = self.get_positions(self.gold_offsets)
+        self.query = np.repeat(np.arange(self.size), pred_lengths)
+        self.gold_query = np.repeat(np.arange(self.size), gold_lengths)
+        
+        if len(lst_comp)==0:
+            pred_ids = np.array([], dtype=np.int32)
+            gold_ids = np.array([], dtype=np.int32)
+            self.values = np.array([], dtype=np.int64)
+            num_ids = 1
+        else:
+            pred_ids = np.concatenate([comp.get_pred_ids_sorted() for comp in lst_comp])
+            gold_ids = np.concatenate([comp.encoding.gold_ids for comp in lst_comp])
+            self.values = np.concatenate([comp.gold_df[PyEvALLFormat.VALUE].to_numpy() for comp in lst_comp])
+            num_ids = max(len(comp.encoding.ids) for comp in lst_comp)
+            
+        #Alignment of all the queries at once with a key that combines the query and the code of the id, only the 
+        #first occurrence of an id in the gold of a query is considered
+        pred_keys = self.query*num_ids + pred_ids
+        gold_keys = self.gold_query*num_ids + gold_ids
+        first = np.flatnonzero(~pd.Series(gold_keys).duplicated().to_numpy())
+        pos = pd.Index(gold_keys[first]).get_indexer(pred_keys)
+        
+        self.in_gold = pos>=0
+        self.gold_values = np.where(self.in_gold, self.values[first][pos].astype(np.float64), 0.0)
+        self.relevants = self.in_gold & (self.gold_values>0)
+        self.cum_relevants = self.accumulate_int(self.relevants, self.offsets)
+        
         
+    def generate_gold_arrays(self):
+        relevants_gold = self.values>0
+        self.relevants_in_gold = np.bincount(self.gold_query[relevants_gold], minlength=self.size)
         
+        #Gold values of each query sorted as the perfect ranking
+        values = self.values.astype(np.float64)
+        order = np.lexsort((-values, self.gold_query))
+        self.perfect_values = values[order]
+        gold_lengths = np.diff(self.gold_offsets)
+        nonempty = gold_lengths>0
+        self.max_gold_values = np.zeros(self.size, dtype=np.int64)
+        self.max_gold_values[nonempty] = self.perfect_values[self.gold_offsets[:-1][nonempty]]
         
-        
\ No newline at end of file
+        #Duplicated values in the gold of each query, shared with the comparators
+        duplicated = pd.DataFrame({"q": self.gold_query, "v": self.values}).duplicated().to_numpy()
+        duplicate_values = np.bincount(self.gold_query[duplicated], minlength=self.size)>0
+        for comp, ranking, duplicate in zip(self.comparators, self.ranking, duplicate_values):
+            if ranking and comp.duplicate_values==None:
+                comp.duplicate_values = duplicate
+        
+        
+    #Discount log2(k+1) of the positions of a ranking, with the same precision of math.log10
+    def get_discounts(self, positions):
+        size = int(positions.max()) if len(positions)>0 else 0
+        discounts = np.array([math.log10(k+1)/math.log10(2) for k in range(1, size+1)], dtype=np.float64)
+        return discounts[positions-1]
+    
+    
+    #Cumulative sum of integer values inside each query
+    def accumulate_int(self, values, offsets):
+        cum_values = np.cumsum(values, dtype=np.int64)
+        before = np.concatenate(([0], cum_values))[offsets[:-1]]
+        return cum_values - np.repeat(before, np.diff(offsets))
+    
+    
+    def accumulate(self, values, offsets, ufunc=np.add, pad=0.0):
+        """
+        Accumulates the float values inside each query with ufunc (np.add or np.multiply). The queries are sorted 
+        by length and copied in padded matrices, the accumulation of each row is sequential so the result is the 
+        same as accumulating each query alone. 
+        """
+        result = np.empty(len(values), dtype=np.float64)
+        lengths = np.diff(offsets)
+        order = np.argsort(lengths, kind="stable")
+        order = order[lengths[order]>0]
+        start = 0
+        while start<len(order):
+            #Largest chunk of queries whose padded matrix fits in the maximum number of cells
+            cells = np.arange(1, len(order)-start+1)*lengths[order[start:]]
+            end = start + max(1, int(np.count_nonzero(cells<=PyEvALLRankingBatch.MAX_CELLS_ACCUMULATE)))
+            rows = order[start:end]
+            width = int(lengths[rows[-1]])
+            columns = np.arange(width)
+            mask = columns<lengths[rows][:, None]
+            index = (offsets[rows][:, None] + columns)[mask]
+            matrix = np.full((len(rows), width), pad, dtype=np.float64)
+            matrix[mask] = values[index]
+            result[index] = ufunc.accumulate(matrix, axis=1)[mask]
+            start = end
+        return result
+    
+    
+    #Value of each query at the position cutoff of a cumulative array (the whole query if None), 0 if it is empty
+    def get_value_at_cutoff(self, cum_values, offsets, cutoff=None):
+        lengths = np.diff(offsets)
+        size = lengths if cutoff is None else np.clip(np.minimum(cutoff, lengths), 0, None)
+        if len(cum_values)==0:
+            return np.zeros(len(lengths), dtype=cum_values.dtype)
+        return np.where(size>0, cum_values[np.maximum(offsets[:-1]+size-1, 0)], 0)
+    
+    
+    #Relevant items in the first k predictions of each query
+    def get_first_k_relevant_items_in_pred(self, param_k):
+        return self.get_value_at_cutoff(self.cum_relevants, self.offsets, param_k)
+    
+    
+    #Position of the first relevant item of each query, 0 if there are no relevant items
+    def get_position_first_relevant_in_pred(self):
+        position = np.zeros(self.size, dtype=np.int64)
+        index = np.flatnonzero(self.relevants)
+        queries, first = np.unique(self.query[index], return_index=True)
+        position[queries] = self.positions[index[first]]
+        return position
+    
+    
+    def get_all_relevants_items_in_gold(self):
+        return self.relevants_in_gold
@@ -26,21 +26,1597 @@ import pyevall.comparators.comparators as comparators
 from pyevall.reports.reports import PyEvALLReport
 from pyevall.utils.utils import PyEvALLUtils
 import pandas as pd
-import csv
+import numpy as np
 import os
 import pathlib as p
 import json
+import re
+import numbers
+import itertools
+import copy
+import hashlib
+import uuid
+import zipfile
+import glob
+import struct
+import math
+import collections.abc
+import array
 import jsonschema
-from jsonschema import validate
+from jsonschema import validate, validators, exceptions
 
 
-class PyEvALLFormat(object):  
+class PyEvALLJSONReader(object):
+    """
+    Incremental reader of a JSON array of records. The file is read in chunks and each record is decoded as soon 
+    as it is complete, so the whole document is never loaded in memory. Iterating the reader raises ValueError if 
+    the file is not a valid JSON array.
+    """
+    CHUNK_SIZE = 1 << 20
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+    
+    def __init__(self, file):
+        self.file = file
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        
+        
+    def read_chunk(self):
+        chunk = self.file.read(self.CHUNK_SIZE)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = len(chunk)==0
+        return not self.eof
+    
+    
+    def next_char(self):
+        """
+        Skips the whitespace and returns the next character, or None at the end of the file.
+        """
+        while True:
+            self.pos = self.WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_chunk():
+                return None
+    
+    
+    def decode_value(self):
+        """
+        Decodes the value that starts in the current position, reading more chunks until it is complete.
+        """
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                #a number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise
+            self.read_chunk()
+    
+    
+    def is_array(self):
+        return self.next_char()=="["
+        
+        
+    def __iter__(self):
+        if not self.is_array():
+            raise ValueError("The JSON document is not an array")
+        self.pos += 1
+        if self.next_char()=="]":
+            self.pos += 1
+        else:
+            while True:
+                yield self.decode_value()
+                char = self.next_char()
+                self.pos += 1
+                if char=="]":
+                    break
+                if char!=",":
+                    raise ValueError("Expecting ',' delimiter in the JSON array")
+                self.next_char()
+        if self.next_char() is not None:
+            raise ValueError("Extra data after the JSON array")
+
+
+
+class PyEvALLColumnBuffer(object):
+    """
+    Compact buffer of a column of records. Strings are stored as int32 codes of a dictionary, so each distinct
+    string is kept only once, and integers and floats in typed arrays. The buffer falls back to a list of objects
+    when the values mix types or are lists or dictionaries.
+    """
+    TYPECODES = {int: "q", float: "d"}
+    
+    def __init__(self):
+        self.value_type = None
+        self.values = None
+        self.dictionary = None
+        
+        
+    def append(self, value):
+        if type(value) is not self.value_type:
+            self.append_object(value)
+        elif self.dictionary is None:
+            try:
+                self.values.append(value)
+            except OverflowError as e:
+                self.to_objects()
+                self.values.append(value)
+        else:
+            self.values.append(self.dictionary.setdefault(value, len(self.dictionary)))
+            
+            
+    def append_object(self, value):
+        if self.value_type is None and (type(value) is str or type(value) in self.TYPECODES):
+            self.value_type = type(value)
+            if self.value_type is str:
+                self.values = array.array("i")
+                self.dictionary = dict()
+            else:
+                self.values = array.array(self.TYPECODES[self.value_type])
+            self.append(value)
+        else:
+            self.to_objects()
+            self.values.append(value)
+        
+        
+    def to_objects(self):
+        if self.value_type is not object:
+            self.values = self.get_column().tolist() if self.value_type is not None else []
+            self.value_type = object
+            self.dictionary = None
+        
+        
+    def __len__(self):
+        return 0 if self.values is None else len(self.values)
+        
+        
+    def get_codes(self):
+        """
+        Returns the codes of the strings of the buffer and the array of the distinct strings in order of appearance.
+        """
+        return np.frombuffer(self.values, dtype=np.int32), np.array(list(self.dictionary), dtype=object)
+        
+        
+    def get_column(self):
+        """
+        Returns the column as a NumPy array of integers, floats or strings, or as a list of objects.
+        """
+        if self.value_type is None:
+            return []
+        if self.value_type is object:
+            return self.values
+        if self.value_type is str:
+            codes, uniques = self.get_codes()
+            return uniques[codes]
+        return np.frombuffer(self.values, dtype=np.int64 if self.value_type is int else np.float64)
+    
+    
+class PyEvALLParser(object):
+    """
+    Base class with the functionality shared to read, convert and validate the input files of PyEvALL. The
+    errors found are inserted in the PyEvALLReport referenced by the attribute pyevall_report.
+    """
     DELIMITER_TSV = "\t"
     DELIMITER_CSV = ","
     TEST_CASE = "test_case"
     ID = "id"
     VALUE = "value" 
+    MEMORY_PRED_NAME = "predictions"
+    MEMORY_GOLD_NAME = "goldstandard"
+    RECORD_VALIDATOR = validators.validator_for(PyEvALLUtils.FORMAT_JSON_SCHEMA)(PyEvALLUtils.FORMAT_JSON_SCHEMA)
+    RECORD_KEYS = frozenset(PyEvALLUtils.FORMAT_JSON_SCHEMA["items"]["properties"])
+    RECORD_REQUIRED_KEYS = tuple(PyEvALLUtils.FORMAT_JSON_SCHEMA["items"]["required"])
+    VALUE_PATTERN_KEYS = re.compile("^.*$")
+    JSON_START_SIZE = 4096
+    
+
+    def parser_file(self, path_file, file_name, stop_error):
+        """
+        Identify the format of a file (JSON, TSV or CSV), parse it and validate its records against the schema.
+    
+        Parameters:
+            - path_file: Path to the file.
+            - file_name: Name of the file.
+            - stop_error: Boolean indicating whether to stop on encountering repeated ids.
+    
+        Returns:
+            - Tuple containing a boolean indicating if the records are valid and a dictionary with a DataFrame per
+                test case, or None if the file could not be parsed or does not conform to the schema.
+    
+        Functionality:
+            - Files in the binary format of PyEvALL are memory mapped instead of parsed.
+            - JSON arrays are read incrementally, and the files that can not be JSON are detected from their first lines.
+            - TSV and CSV files are read directly into columns and converted to records in memory, without writing
+                any temporary file, and a warning with the format identified is inserted in the report.
+            - If the file is neither JSON, TSV nor CSV, the error of the JSON parser is reported.
+        """
+        if PyEvALLBinaryFormat.is_binary(path_file):
+            try:
+                return self.parser_binary(path_file, file_name)
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                self.logger.debug("File %s is not a valid binary file: %s", file_name, e)
+        
+        if self.check_json_start(path_file):
+            try:
+                return self.parser_json_stream(path_file, file_name, stop_error)
+            except ValueError as e:
+                pass
+        
+        for delimiter, warning in ((self.DELIMITER_TSV, PyEvALLReport.FORMAT_TSV_FORMAT_IDENTIFIED_WARNING),
+                                   (self.DELIMITER_CSV, PyEvALLReport.FORMAT_CSV_FORMAT_IDENTIFIED_WARNING)):
+            try:
+                df_data = self.parse_tsv_csv(path_file, delimiter)
+            except Exception as e:
+                continue
+            self.pyevall_report.insert_file_warning(file_name, warning, False)
+            self.logger.debug("Warning %s in file %s", warning, file_name) 
+            return self.parser_records(df_data, file_name, stop_error)
+                               
+        return self.parser_json(path_file, file_name, stop_error)
+    
+    
+    def parser_binary(self, path_file, file_name):
+        """
+        Opens a file in the binary format of PyEvALL. Its records were validated when the file was converted, so 
+        the test cases are loaded without any validation.
+    
+        Returns:
+            - Tuple containing True, the lazy mapping of the DataFrame of each test case and the types of the values.
+        """
+        test_cases, types, meta = PyEvALLBinaryFormat.read(path_file)
+        self.logger.debug("File %s opened in binary format with %s test cases", file_name, len(test_cases))
+        return True, test_cases, types
+    
+    
+    def check_json_start(self, path_file):
+        """
+        Check from the first characters of a file if it can be a JSON document, so that TSV and CSV files are not 
+        read completely by the JSON parser. The leading whitespace is skipped, and a document that does not start 
+        with an array, an object or a string can only be a single value that fits in the characters read.
+        """
+        try:
+            with open(path_file, 'r', encoding='utf-8') as f:
+                chunk = f.read(self.JSON_START_SIZE)
+                start = chunk.strip()
+                while start=="" and chunk!="":
+                    chunk = f.read(self.JSON_START_SIZE)
+                    start = chunk.strip()
+                complete = f.read(1)==""
+            if start=="":
+                return False
+            if start[0] in '[{"':
+                return True
+            if not complete:
+                return False
+            json.loads(start)
+        except ValueError as e:
+            return False
+        return True
+
+           
+    def check_file_exist(self, path_file, file_name):
+        """
+        Check if a file exists and is not empty.
+    
+        Parameters:
+            - path_file: Path to the file to check.
+            - file_name: Name of the file.
+    
+        Returns:
+            - Boolean indicating whether the file exists and is not empty.
+    
+        Functionality:
+            - Uses the Path class to create a Path object for the file.
+            - Checks if the file exists.
+            - Checks if the file is not empty.
+            - Inserts file error into the PyEvALLReport if file is empty or does not exist.
+            - Logs error message if file is empty or does not exist.
+            - Returns True if the file exists and is not empty, otherwise False.
+        """
+        path = p.Path(path_file)
+        if path.exists():
+            if path.stat().st_size > 0:
+                return True
+            else:
+                self.pyevall_report.insert_file_error(file_name, PyEvALLReport.FORMAT_EMPTY_FILE_ERROR, None, True)
+                self.logger.debug("Error %s in file %s: file empty", PyEvALLReport.FORMAT_EMPTY_FILE_ERROR, file_name)
+                return False                
+        else:
+            self.pyevall_report.insert_file_error(file_name, PyEvALLReport.FORMAT_FILE_NOT_EXIST_ERROR, None, True)
+            self.logger.debug("Error %s in file %s: file not exist", PyEvALLReport.FORMAT_FILE_NOT_EXIST_ERROR, file_name)
+            return False    
+    
+     
+    ##########################################
+    #                                        #
+    #            PARSER JSON FORMAT          #
+    #                                        #
+    ##########################################     
+               
+    def parser_json(self, path, file_name, stop_error):
+        """
+        Parse a JSON file and validate its format against a schema.
+    
+        Parameters:
+            - path: Path to the JSON file.
+            - file_name: Name of the JSON file.
+            - stop_error: Boolean indicating whether to stop on encountering repeated ids.
+    
+        Returns:
+            - Tuple containing a boolean indicating if parsing was successful and a dictionary with a DataFrame per 
+                test case, or None if the file contains errors.
+    
+        Functionality:
+            - Attempts to open and load the JSON file.
+            - Inserts file error into the PyEvALLReport if JSON format is incorrect.
+            - Validates the JSON data against a predefined schema.
+            - Inserts file error into the PyEvALLReport if JSON schema is incorrect.
+        """
+        data = None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:                
+                data = json.load(f) 
+        except ValueError as e:
+            self.pyevall_report.insert_file_error(file_name, PyEvALLReport.FORMAT_INCORRECT_JSON_ERROR, str(e), True)
+            self.logger.debug("Error %s in file %s in line %s", PyEvALLReport.FORMAT_INCORRECT_JSON_ERROR, file_name, e)             
+            return False, None, None
+        
+        return self.read_document(data, file_name, stop_error)
+    
+    
+    def parser_json_stream(self, path, file_name, stop_error):
+        """
+        Parse a JSON file reading its records one at a time, so that the peak memory is proportional to the 
+        columns of the test cases and not to the whole document.
+    
+        Parameters:
+            - path: Path to the JSON file.
+            - file_name: Name of the JSON file.
+            - stop_error: Boolean indicating whether to stop on encountering repeated ids.
+    
+        Returns:
+            - The same tuple than parser_json. Raises ValueError if the file is not a JSON document, without 
+                inserting any error in the report.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = PyEvALLJSONReader(f)
+            if reader.is_array():
+                return self.read_records(reader, file_name, stop_error)
+        
+        #Other JSON documents are loaded completely to report the error of the schema
+        with open(path, 'r', encoding='utf-8') as f:                
+            data = json.load(f) 
+        return self.read_document(data, file_name, stop_error)
+    
+    
+    def read_document(self, data, file_name, stop_error):
+        if isinstance(data, list):
+            return self.read_records(data, file_name, stop_error)
+        #the schema only accepts arrays of records
+        if self.is_strict_validation():
+            self.validate_schema(data, file_name)
+        else:
+            self.insert_schema_error(file_name, "%r is not of type 'array'" % (data,))
+        return False, None, None
+    
+    
+    def is_strict_validation(self):
+        """
+        Returns True if the records are validated with jsonschema instead of the fast validator of PyEvALL.
+        """
+        return PyEvALLUtils.get_active_configuration(self.evaluation_id)[PyEvALLUtils.PARAM_VALIDATION]==PyEvALLUtils.PARAM_OPTION_VALIDATION_STRICT
+    
+    
+    def validate_schema(self, data, file_name):
+        """
+        Validate a document with jsonschema against the schema of the JSON format of PyEvALL.
+    
+        Parameters:
+            - data: Document to validate.
+            - file_name: Name of the file or in-memory source of the document.
+    
+        Returns:
+            - Boolean indicating if the document is valid.
+        """
+        try:
+            validate(instance=data, schema=PyEvALLUtils.FORMAT_JSON_SCHEMA)
+        except jsonschema.exceptions.ValidationError as e:
+            self.insert_schema_error(file_name, e)
+            return False
+        return True
+    
+    
+    def insert_schema_error(self, file_name, e, index=None):
+        """
+        Inserts the error of the schema in the report, with the number of the record that does not conform to the
+        schema if it is known.
+        """
+        if index is None:
+            self.pyevall_report.insert_file_error(file_name, PyEvALLReport.FORMAT_INCORRECT_SCHEMA_JSON_ERROR, str(e), True)
+        else:
+            self.pyevall_report.insert_file_line_error(file_name, index, PyEvALLReport.FORMAT_INCORRECT_SCHEMA_JSON_ERROR, str(e), True)
+        self.logger.debug("Error %s in file %s in line %s: %s", PyEvALLReport.FORMAT_INCORRECT_SCHEMA_JSON_ERROR, file_name, index, e)             
+    
+    
+    def check_record(self, record):
+        """
+        Fast validation of a record of the array, equivalent to the schema of the records of the JSON format.
+    
+        Parameters:
+            - record: Record to validate.
+    
+        Returns:
+            - Message describing the first error found in the record, or None if the record is valid.
+        """
+        if not isinstance(record, dict):
+            return "%r is not of type 'object'" % (record,)
+        for key in PyEvALLParser.RECORD_REQUIRED_KEYS:
+            if not key in record:
+                return "%r is a required property" % (key,)
+        if len(record)!=len(PyEvALLParser.RECORD_KEYS):
+            extra = [key for key in record if not key in PyEvALLParser.RECORD_KEYS]
+            return "Additional properties are not allowed (%s %s unexpected)" % (", ".join(repr(key) for key in extra), "was" if len(extra)==1 else "were")
+        for key in (PyEvALLParser.TEST_CASE, PyEvALLParser.ID):
+            if not isinstance(record[key], str):
+                return "%r is not of type 'string'" % (record[key],)
+        if not self.check_value(record[PyEvALLParser.VALUE]):
+            return "%r is not valid under any of the given schemas" % (record[PyEvALLParser.VALUE],)
+        return None
+    
+    
+    def check_value(self, value):
+        """
+        Returns True if the value is a string, a non empty list of strings, an integer or a dictionary of numbers.
+        """
+        if isinstance(value, str):
+            return True
+        if isinstance(value, bool):
+            return False
+        if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+            return True
+        if isinstance(value, list):
+            return len(value)>0 and all(isinstance(item, str) for item in value)
+        if isinstance(value, dict):
+            return all(isinstance(number, numbers.Number) and not isinstance(number, bool)
+                       for key, number in value.items() if isinstance(key, str) and PyEvALLParser.VALUE_PATTERN_KEYS.search(key))
+        return False
+    
+    
+    def validate_record(self, record, index):
+        """
+        Strict validation with jsonschema of a record of the array against the schema of the records.
+    
+        Parameters:
+            - record: Record to validate.
+            - index: Position of the record in the array.
+    
+        Returns:
+            - The most relevant error of the record, with the same path that it has in the validation of the whole
+                array, or None if the record is valid.
+        """
+        error = None
+        for e in PyEvALLParser.RECORD_VALIDATOR.descend(record, PyEvALLUtils.FORMAT_JSON_SCHEMA["items"], path=index):
+            e.schema_path.appendleft("items")
+            if error is None or exceptions.relevance(e) > exceptions.relevance(error):
+                error = e
+        return error
+    
+   
+    def read_records(self, records, file_name, stop_error):
+        """
+        Validate the records, load them into one columnar table and split it by test case.
+    
+        Parameters:
+            - records: Iterable of records, that is consumed only once.
+            - file_name: Name of the file being checked.
+            - stop_error: Boolean indicating whether to stop on encountering repeated ids.
+    
+        Returns:
+            - Tuple containing a boolean indicating if there are no errors, a dictionary with a DataFrame per test
+                case and a dictionary with the types of the values of each test case. Both dictionaries are None if 
+                the records do not conform to the schema.
+    
+        Functionality:
+            - Validates each record against the schema, with the fast validator or with jsonschema in the strict 
+                mode. The fast validator reports the first record that is not valid, and the strict mode the same 
+                error than the validation of the whole array. The error is inserted once all the records have been read,
+                with the number of the record.
+            - Appends the test case, id and value of each record to the columns of the table. The test cases and the 
+                values are stored in compact buffers, as codes of the distinct strings or typed arrays of numbers.
+            - Checks for repeated IDs within test cases: if the error is found in the predictions the system continues and inform,
+                if the error is found in the gold the process stop.
+            - Inserts file line error into the PyEvALLReport if repeated IDs are found.
+        """
+        strict = self.is_strict_validation()
+        schema_error=None
+        error_index=None
+        tcs, ids, values = PyEvALLColumnBuffer(), [], PyEvALLColumnBuffer()
+        for index, inst in enumerate(records):
+            if strict:
+                error = self.validate_record(inst, index)
+                if error is not None and (schema_error is None or exceptions.relevance(error) > exceptions.relevance(schema_error)):
+                    schema_error = error
+                    error_index = index
+            elif schema_error is None:
+                error = self.check_record(inst)
+                if error is not None:
+                    schema_error = "%s in record %s: %r" % (error, index+1, inst)
+                    error_index = index
+                
+            if schema_error is not None:
+                #the records are not loaded once the file is not valid
+                tcs, ids, values = None, None, None
+            else:
+                tcs.append(inst[PyEvALLFormat.TEST_CASE])
+                ids.append(inst[PyEvALLFormat.ID])
+                values.append(inst[PyEvALLFormat.VALUE])
+        
+        if schema_error is not None:
+            self.insert_records_error(file_name, schema_error, error_index, strict)
+            return False, None, None
+        
+        if len(tcs)==0:
+            return self.split_records(file_name, stop_error, [], ids, [])
+        codes, tc_uniques = tcs.get_codes()
+        return self.split_records(file_name, stop_error, codes, ids, values.get_column(), tc_uniques)
+    
+    
+    def insert_records_error(self, file_name, schema_error, error_index, strict):
+        """
+        Inserts the error of the schema of the record in the position error_index, with the number of the record.
+        """
+        if strict:
+            #the path of the best match is relative to the value when it is an error of its alternatives
+            schema_error = exceptions.best_match([schema_error])
+        self.insert_schema_error(file_name, schema_error, error_index+1)
+        
+        
+    def split_records(self, file_name, stop_error, tcs, ids, values, tc_uniques=None):
+        """
+        Splits the columns of the records by test case and inserts the errors of the repeated ids in the report.
+        """
+        test_cases, types, lst_repeated = self.split_test_cases(tcs, ids, values, tc_uniques)
+        for index in lst_repeated:
+            self.pyevall_report.insert_file_line_error(file_name, index, PyEvALLReport.FORMAT_IDS_REPEATED_ROW_ERROR, None, stop_error)
+            self.logger.debug("Error %s in file %s in line %s", PyEvALLReport.FORMAT_IDS_REPEATED_ROW_ERROR, file_name, index)
+        return len(lst_repeated)==0, test_cases, types
+    
+    
+    def split_test_cases(self, tcs, ids, values, tc_uniques=None):
+        """
+        Builds one table with the columns of all the records and splits it by test case.
+    
+        Parameters:
+            - tcs: Test case of each record, or the code of the test case of each record if tc_uniques is given.
+            - ids: Id of each record.
+            - values: Value of each record, or a NumPy array of integers or floats.
+            - tc_uniques: Array with the test cases in order of appearance, indexed by the codes of tcs.
+    
+        Returns:
+            - Tuple with a dictionary with the DataFrame of each test case, a dictionary with the types of the values
+                of each test case and the list of lines with repeated ids.
+    
+        Functionality:
+            - Detects the repeated ids of each test case with a single call to duplicated, keeping the first record.
+            - Sorts the table by test case, in order of appearance, and slices it with the offsets of each test case,
+                so the DataFrames of the test cases share the columns of the table.
+            - Infers the types of the values only once. If the values mix numbers with other types across the test 
+                cases, each test case is built with its own column so its type is inferred as in a single test case.
+        """
+        if tc_uniques is None:
+            tcs, tc_uniques = pd.factorize(np.asarray(tcs, dtype=object))
+        ids = np.asarray(ids, dtype=object)
+        repeated = pd.DataFrame({PyEvALLFormat.TEST_CASE: tcs, PyEvALLFormat.ID: ids}).duplicated().to_numpy()
+        lst_repeated = (np.flatnonzero(repeated)+1).tolist()
+        
+        if isinstance(values, np.ndarray) and values.dtype!=object:
+            value_types = np.full(len(values), int if values.dtype.kind=="i" else float, dtype=object)
+        else:
+            value_types = np.fromiter(map(type, values), dtype=object, count=len(values))
+        lst_types = set(value_types)
+        column = pd.Series(values, dtype=object)
+        shared = len(lst_types & {int, float})==0
+        if lst_types=={int} or lst_types=={float}:
+            column = pd.Series(values)
+            shared = column.dtype==np.int64 or column.dtype==np.float64
+        
+        #the first record of each test case is always kept, so the order of appearance of the test cases is the same
+        keep = np.flatnonzero(~repeated)
+        codes = tcs[keep]
+        order = keep[np.argsort(codes, kind="stable")]
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(tc_uniques)))))
+        table = pd.DataFrame({PyEvALLFormat.TEST_CASE: tc_uniques[tcs[order]], 
+                              PyEvALLFormat.ID: ids[order],
+                              PyEvALLFormat.VALUE: column.to_numpy()[order]})
+        value_types = value_types[order]
+        
+        test_cases=dict()
+        types=dict()
+        for num, tc in enumerate(tc_uniques):
+            start, end = offsets[num], offsets[num+1]
+            if not shared:
+                test_cases[tc] = pd.DataFrame({PyEvALLFormat.TEST_CASE: tc, PyEvALLFormat.ID: table[PyEvALLFormat.ID].to_numpy()[start:end],
+                                               PyEvALLFormat.VALUE: list(table[PyEvALLFormat.VALUE].to_numpy()[start:end])})
+                types[tc] = test_cases[tc][PyEvALLFormat.VALUE].apply(type).unique()
+            else:
+                test_cases[tc] = table.iloc[start:end]
+                types[tc] = pd.unique(value_types[start:end]) if len(lst_types)>1 else np.array(list(lst_types), dtype=object)
+        return test_cases, types, lst_repeated
+    
+    
+    ##########################################
+    #                                        #
+    #            IN-MEMORY RECORDS           #
+    #                                        #
+    ##########################################  
+    def is_in_memory(self, source):
+        """
+        Returns True if the source is data already loaded in memory (a DataFrame, a list of records or a NumPy 
+        array) instead of the path to a file.
+        """
+        return not isinstance(source, (str, os.PathLike))
+    
+    
+    def check_records_exist(self, data, file_name):
+        """
+        Check that the in-memory data is not empty, the equivalent of check_file_exist for a file.
+    
+        Parameters:
+            - data: DataFrame, list of records or NumPy array.
+            - file_name: Name of the in-memory source in the report.
+    
+        Returns:
+            - Boolean indicating whether the data contains any record.
+        """
+        if data is not None and len(data) > 0:
+            return True
+        self.pyevall_report.insert_file_error(file_name, PyEvALLReport.FORMAT_EMPTY_FILE_ERROR, None, True)
+        self.logger.debug("Error %s in file %s: file empty", PyEvALLReport.FORMAT_EMPTY_FILE_ERROR, file_name)
+        return False
+    
+    
+    def parser_records(self, data, file_name, stop_error):
+        """
+        Validate in-memory data against the schema of the JSON format and split it per test case.
+    
+        Parameters:
+            - data: DataFrame or NumPy array with the columns test_case, id and value, or list of records.
+            - file_name: Name of the in-memory source in the report.
+            - stop_error: Boolean indicating whether to stop on encountering repeated ids.
+    
+        Returns:
+            - The same tuple than parser_json.
+    
+        Functionality:
+            - DataFrames and structured NumPy arrays are read by the name of their columns, and two dimensional
+                NumPy arrays by the position of the columns test_case, id and value.
+            - The columns of the DataFrames are validated and split per test case without converting them to 
+                records, and the lists of records are validated and split as the JSON files.
+        """
+        try:
+            data = self.convert_to_frame(data)
+        except (ValueError, TypeError) as e:
+            self.insert_schema_error(file_name, e)
+            return False, None, None
+        
+        if isinstance(data, pd.DataFrame):
+            return self.read_frame(data, file_name, stop_error)
+        return self.read_records(data, file_name, stop_error)
+    
+    
+    def convert_to_frame(self, data):
+        if isinstance(data, np.ndarray):
+            if data.dtype.names is None:
+                return pd.DataFrame(data.tolist(), columns=[PyEvALLParser.TEST_CASE, PyEvALLParser.ID, PyEvALLParser.VALUE])
+            return pd.DataFrame(data)
+        if isinstance(data, pd.DataFrame):
+            return data
+        return list(data)
+    
+    
+    def convert_to_records(self, data):
+        """
+        Converts the rows of a DataFrame to records, with the values converted to Python types and the missing
+        values to None, as in a JSON file.
+        """
+        data = data.astype(object)
+        return data.where(data.notna(), None).to_dict(orient="records")
+    
+    
+    def read_frame(self, data, file_name, stop_error):
+        """
+        Validate the columns of a DataFrame and split it by test case, the equivalent of read_records for the
+        records of a DataFrame.
+    
+        Parameters:
+            - data: DataFrame with the columns test_case, id and value.
+            - file_name: Name of the file or in-memory source of the DataFrame.
+            - stop_error: Boolean indicating whether to stop on encountering repeated ids.
+    
+        Returns:
+            - The same tuple than read_records.
+    
+        Functionality:
+            - The columns are validated with the types of the columns and checks of missing values, and only the 
+                values of the columns with mixed types are checked one by one.
+            - Only the rows that are not valid are converted to records, to report the error of the first one with 
+                its number, or the most relevant error of jsonschema in the strict mode. A DataFrame with other 
+                columns is validated as a list of records.
+            - The columns are passed to split_test_cases without building any record.
+        """
+        if len(data.columns)!=len(PyEvALLParser.RECORD_KEYS) or set(data.columns)!=PyEvALLParser.RECORD_KEYS:
+            return self.read_records(self.convert_to_records(data), file_name, stop_error)
+        
+        valid = np.ones(len(data), dtype=bool)
+        columns = []
+        for key in (PyEvALLParser.TEST_CASE, PyEvALLParser.ID):
+            column_valid, column = self.check_string_column(data[key])
+            valid &= column_valid
+            columns.append(column)
+        column_valid, column = self.check_value_column(data[PyEvALLParser.VALUE])
+        valid &= column_valid
+        columns.append(column)
+        
+        lst_index = np.flatnonzero(~valid)
+        if len(lst_index)>0:
+            strict = self.is_strict_validation()
+            if not strict:
+                lst_index = lst_index[:1]
+            schema_error=None
+            error_index=None
+            for index, inst in zip(lst_index.tolist(), self.convert_to_records(data.iloc[lst_index])):
+                if strict:
+                    error = self.validate_record(inst, index)
+                    if error is not None and (schema_error is None or exceptions.relevance(error) > exceptions.relevance(schema_error)):
+                        schema_error = error
+                        error_index = index
+                else:
+                    schema_error = "%s in record %s: %r" % (self.check_record(inst), index+1, inst)
+                    error_index = index
+            self.insert_records_error(file_name, schema_error, error_index, strict)
+            return False, None, None
+        
+        return self.split_records(file_name, stop_error, *columns)
+    
+    
+    def check_string_column(self, column):
+        """
+        Returns the mask of the rows of a column whose value is a string, and the column as an array of objects.
+        """
+        if isinstance(column.dtype, pd.StringDtype):
+            return column.notna().to_numpy(), column.to_numpy(dtype=object)
+        if column.dtype!=object:
+            column = column.astype(object)
+        values = column.to_numpy(dtype=object)
+        if pd.api.types.infer_dtype(values, skipna=False)=="string":
+            return np.ones(len(values), dtype=bool), values
+        return np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=len(values)), values
+    
+    
+    def check_value_column(self, column):
+        """
+        Returns the mask of the rows of a column whose value conforms to the schema, and the values of the column
+        as a numeric array or as Python objects.
+        """
+        if column.dtype.kind in "iu":
+            return np.ones(len(column), dtype=bool), column.to_numpy(dtype=np.int64)
+        if column.dtype.kind=="f":
+            values = column.to_numpy(dtype=np.float64)
+            with np.errstate(invalid="ignore"):
+                return np.isfinite(values) & (values==np.floor(values)), values
+        if column.dtype.kind=="b":
+            return np.zeros(len(column), dtype=bool), None
+        if isinstance(column.dtype, pd.StringDtype):
+            return column.notna().to_numpy(), column.to_numpy(dtype=object)
+        if column.dtype!=object:
+            column = column.astype(object)
+        values = column.to_numpy(dtype=object)
+        if pd.api.types.infer_dtype(values, skipna=False)=="string":
+            return np.ones(len(values), dtype=bool), values
+        #NumPy scalars are converted to Python types, as in the records of a DataFrame
+        values = [v.item() if isinstance(v, np.generic) else v for v in values]
+        return np.fromiter(map(self.check_value, values), dtype=bool, count=len(values)), values
+        
+    
+    ##########################################
+    #                                        #
+    #            WRAPPER TSV AND CSV         #
+    #                                        #
+    ##########################################      
+    def parse_tsv_csv(self, path_input_file, delimiter): 
+        """
+        Read a TSV or CSV file into a DataFrame with the columns test_case, id and value.
+    
+        Parameters:
+            - path_input_file: Path to the file.
+            - delimiter: Delimiter of the columns.
+    
+        Returns:
+            - DataFrame with the content of the file. The column value is numeric if all its values are numbers.
+        """
+        # The first line consist of headings of the record  
+        # so we will store it in an array and move to  
+        # next line in input_file. 
+        with open(path_input_file, 'r') as file:
+            a = file.readline() 
+        df_data=None
+        
+        #We read with pandas to preserver the format
+        titles = [t.strip() for t in a.split(delimiter)] 
+        if not self.check_headers(titles):
+            titles[0]=PyEvALLFormat.TEST_CASE
+            titles[1]=PyEvALLFormat.ID
+            titles[2]=PyEvALLFormat.VALUE       
+            df_data = pd.read_csv(path_input_file, sep=delimiter, index_col=False, header=None,
+                          skip_blank_lines=False, names=titles, dtype={
+                            PyEvALLFormat.TEST_CASE: 'str',
+                            PyEvALLFormat.ID: 'str',
+                            PyEvALLFormat.VALUE: 'str'
+                        })   
+        else:
+            df_data = pd.read_csv(path_input_file, sep=delimiter, index_col=False,
+                          skip_blank_lines=False, dtype={
+                            PyEvALLFormat.TEST_CASE: 'str',
+                            PyEvALLFormat.ID: 'str',
+                            PyEvALLFormat.VALUE: 'str'
+                        })                                
+        
+        #if all the value columns are numbers convert to ranking format, otherwise mataint str
+        try:
+            df_data[PyEvALLFormat.VALUE] = pd.to_numeric(df_data[PyEvALLFormat.VALUE])
+        except ValueError as e:
+            df_data[PyEvALLFormat.VALUE]=df_data[PyEvALLFormat.VALUE].astype("str")
+        
+        return df_data
+
+
+    def check_headers(self, row):
+        if len(row)==3:
+            if row[0]==PyEvALLFormat.TEST_CASE and row[1]==PyEvALLFormat.ID and row[2]==PyEvALLFormat.VALUE:        
+                return True
+        return False
+
+
+
+class PyEvALLEncoding(object):
+    """
+    Dictionary encoding of the ids and the class labels of a test case. Ids and labels are mapped to dense int32 
+    codes shared by the gold and the predictions, so the comparators align and count instances with integer arrays 
+    instead of comparing strings. The codes of the gold are assigned first, in order of appearance, so a code lower 
+    than num_gold_ids (num_gold_labels) belongs to an id (label) of the gold. The arrays ids and labels are the 
+    reverse mapping from the codes to the original values. Labels are only encoded for monolabel (string) and 
+    multilabel (list of strings) values, in the multilabel case with the row of each label in label_rows.
+    """
+    
+    def __init__(self, gold_df=None):
+        """
+        Constructor for initializing the encoding of the gold of a test case.
+        
+        Parameters:
+            - gold_df: DataFrame with the gold of the test case. If it is None the codes of the gold are set later 
+                with load_gold, for instance from the gold cache.
+        """
+        self.ids = None
+        self.num_gold_ids = 0
+        self.gold_ids, self.pred_ids = None, None
+        self.labels = None
+        self.num_gold_labels = 0
+        self.multilabel = False
+        self.gold_labels, self.gold_label_rows = None, None
+        self.pred_labels, self.pred_label_rows = None, None
+        if gold_df is not None:
+            self.encode_gold(gold_df)
+            
+            
+    def encode_gold(self, gold_df):
+        gold_ids, ids = self.encode(gold_df[PyEvALLParser.ID].to_numpy())
+        gold_labels, labels, gold_label_rows = None, None, None
+        values = gold_df[PyEvALLParser.VALUE].to_numpy()
+        value_type = type(values[0]) if len(values)>0 else None
+        if value_type==str or value_type==list:
+            flat_labels, gold_label_rows = self.flatten_labels(values, value_type==list)
+            gold_labels, labels = self.encode(flat_labels)
+        self.load_gold(ids, gold_ids, labels, gold_labels, gold_label_rows, value_type==list)
+        
+        
+    def load_gold(self, ids, gold_ids, labels=None, gold_labels=None, gold_label_rows=None, multilabel=False):
+        """
+        Sets the dictionaries and the codes of the gold.
+        
+        Parameters:
+            - ids: Array with the id of each code.
+            - gold_ids: Code of the id of each instance of the gold.
+            - labels: Array with the label of each code, None if the values are not labels.
+            - gold_labels: Code of each label of the gold.
+            - gold_label_rows: Row of each label of the gold in the multilabel case.
+            - multilabel: Boolean indicating if each instance has a list of labels.
+        """
+        self.ids, self.gold_ids = ids, gold_ids
+        self.num_gold_ids = len(ids)
+        self.labels, self.gold_labels, self.gold_label_rows = labels, gold_labels, gold_label_rows
+        self.num_gold_labels = 0 if labels is None else len(labels)
+        self.multilabel = multilabel
+            
+    
+    #Codes of the values in order of appearance and the values of each code
+    @staticmethod
+    def encode(values):
+        codes, uniques = pd.factorize(values)
+        return codes.astype(np.int32), np.asarray(uniques, dtype=object)
+    
+    
+    #Codes of the values with an existing dictionary, the values not in the dictionary are appended to it
+    @staticmethod
+    def encode_with_dictionary(values, dictionary):
+        codes = pd.Index(dictionary).get_indexer(values)
+        unknown = codes<0
+        if unknown.any():
+            new_codes, new_uniques = pd.factorize(values[unknown])
+            codes[unknown] = new_codes + len(dictionary)
+            dictionary = np.concatenate((dictionary, np.asarray(new_uniques, dtype=object)))
+        return codes.astype(np.int32), dictionary
+    
+    
+    #Labels of the values, one per row in the monolabel case and all the labels of each row in the multilabel case
+    @staticmethod
+    def flatten_labels(values, multilabel):
+        if not multilabel:
+            return values, None
+        lengths = [len(value) for value in values]
+        labels = np.empty(sum(lengths), dtype=object)
+        labels[:] = list(itertools.chain.from_iterable(values))
+        return labels, np.repeat(np.arange(len(values), dtype=np.int32), lengths)
+        
+        
+    def encode_predictions(self, pred_df):
+        """
+        Returns a copy of the encoding with the predictions of the test case, extending the dictionaries with the 
+        ids and labels that are not in the gold. The encoding of the gold is not modified, so it can be shared by 
+        the evaluation of several prediction files.
+        
+        Parameters:
+            - pred_df: DataFrame with the predictions of the test case.
+        """
+        encoding = copy.copy(self)
+        encoding.pred_ids, encoding.ids = self.encode_with_dictionary(pred_df[PyEvALLParser.ID].to_numpy(), self.ids)
+        if self.labels is not None:
+            labels, encoding.pred_label_rows = self.flatten_labels(pred_df[PyEvALLParser.VALUE].to_numpy(), self.multilabel)
+            encoding.pred_labels, encoding.labels = self.encode_with_dictionary(labels, self.labels)
+        return encoding
+    
+    
+    #Position of the first occurrence of each id code in the codes, -1 for the ids that do not occur
+    def get_first_positions(self, codes):
+        positions = np.full(len(self.ids), -1, dtype=np.int64)
+        uniques, first = np.unique(codes, return_index=True)
+        positions[uniques] = first
+        return positions
+    
+    
+    def decode_ids(self, codes):
+        return self.ids[codes]
+    
+    
+    def decode_labels(self, codes):
+        return self.labels[codes]
+    
+    
+    
+    
+class PyEvALLBinaryFormat(object):
+    """
+    Native binary format of PyEvALL: an uncompressed NumPy .npz archive with one array per column of the validated
+    and encoded records, so the file is opened without parsing any text. The arrays are memory mapped from the 
+    archive, and only the test cases that are evaluated are read from disk. The strings are stored as their UTF-8 
+    bytes concatenated in a uint8 array, with the int64 offsets of the bytes of each string in the array with the 
+    same name and the suffix _byte_offsets (CSR). The archive contains:
+        - test_cases and offsets: name of each test case and offsets of its records, which are sorted by test case.
+        - ids: id of each record, unique in each test case.
+        - Monolabel and multilabel values: labels (dictionary of labels of each test case, concatenated) with
+            label_offsets, label_codes (int32 code of each label in the dictionary of its test case) and, for 
+            multilabel values, label_indptr with the offsets of the labels of each record (CSR).
+        - Ranking values: values with the integer value of each record.
+        - LeWiDi values: classes (the keys of the distributions), distributions, a dense matrix records x classes
+            with NaN for the classes that are not in the distribution of a record, and positions, with the position
+            of each class in the distribution of each record, so the distributions keep the order of their keys.
+        - pyevall_meta: JSON document with the version and the kind of values.
+    Files in this format are created with PyEvALLEvaluation.convert_to_binary.
+    """
+    FORMAT_VERSION="2"
+    ZIP_MAGIC=b"PK\x03\x04"
+    META="pyevall_meta"
+    BYTE_OFFSETS="_byte_offsets"
+    KIND_MONOLABEL="monolabel"
+    KIND_MULTILABEL="multilabel"
+    KIND_RANKING="ranking"
+    KIND_LEWEDI="lewedi"
+    KINDS={str:KIND_MONOLABEL, list:KIND_MULTILABEL, int:KIND_RANKING, dict:KIND_LEWEDI}
+    TYPES={kind:value_type for value_type, kind in KINDS.items()}
+    READ_ARRAY_HEADER={(1, 0): np.lib.format.read_array_header_1_0, (2, 0): np.lib.format.read_array_header_2_0}
+    
+    
+    @staticmethod
+    def is_binary(path_file):
+        """
+        Returns True if the file is an archive in the binary format of PyEvALL.
+        """
+        try:
+            with open(path_file, "rb") as f:
+                if f.read(len(PyEvALLBinaryFormat.ZIP_MAGIC))!=PyEvALLBinaryFormat.ZIP_MAGIC:
+                    return False
+            with zipfile.ZipFile(path_file) as archive:
+                return PyEvALLBinaryFormat.META + ".npy" in archive.namelist()
+        except (OSError, zipfile.BadZipFile) as e:
+            return False
+        
+        
+    @staticmethod
+    def open_arrays(path_file):
+        """
+        Memory maps the arrays of an uncompressed .npz archive.
+    
+        Returns:
+            - Dictionary with the name and the memory mapped array of each member of the archive.
+        """
+        with zipfile.ZipFile(path_file) as archive:
+            infos = archive.infolist()
+        arrays = dict()
+        with open(path_file, "rb") as f:
+            for info in infos:
+                if info.compress_type!=zipfile.ZIP_STORED:
+                    raise ValueError("Compressed member %s can not be memory mapped" % info.filename)
+                #The data of a member starts after its local header, with variable name and extra fields
+                f.seek(info.header_offset)
+                header = f.read(30)
+                name_length, extra_length = struct.unpack("<HH", header[26:30])
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                version = np.lib.format.read_magic(f)
+                if not version in PyEvALLBinaryFormat.READ_ARRAY_HEADER:
+                    raise ValueError("Version %s of member %s not supported" % (version, info.filename))
+                shape, fortran_order, dtype = PyEvALLBinaryFormat.READ_ARRAY_HEADER[version](f)
+                if dtype.hasobject:
+                    raise ValueError("Member %s contains Python objects" % info.filename)
+                name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+                if math.prod(shape)==0:
+                    arrays[name] = np.empty(shape, dtype=dtype)
+                else:
+                    arrays[name] = np.memmap(path_file, dtype=dtype, mode="r", offset=f.tell(), shape=shape, 
+                                             order="F" if fortran_order else "C")
+        return arrays
+    
+    
+    @staticmethod
+    def read(path_file):
+        """
+        Opens a file in the binary format.
+    
+        Returns:
+            - Tuple with the lazy mapping of the DataFrame of each test case, a dictionary with the types of the 
+                values of each test case and the metadata of the file.
+        """
+        arrays = PyEvALLBinaryFormat.open_arrays(path_file)
+        meta = json.loads(arrays.pop(PyEvALLBinaryFormat.META).tobytes().decode("utf-8"))
+        if meta["format_version"]!=PyEvALLBinaryFormat.FORMAT_VERSION:
+            raise ValueError("Version %s of the binary format not supported" % meta["format_version"])
+        test_cases = PyEvALLBinaryTestCases(path_file, arrays, meta["kind"])
+        types = dict.fromkeys(test_cases, np.array([PyEvALLBinaryFormat.TYPES[meta["kind"]]], dtype=object))
+        return test_cases, types, meta
+    
+    
+    @staticmethod
+    def get_arrays(gold):
+        """
+        Returns the kind of values and the arrays of a parsed PyEvALLGoldStandard, or None if it can not be stored in 
+        the binary format because its values have different types.
+        """
+        kinds = set()
+        for tc in gold.gold_types:
+            types = gold.get_value_types(tc)
+            if len(types)!=1 or not types[0] in PyEvALLBinaryFormat.KINDS:
+                return None
+            kinds.add(PyEvALLBinaryFormat.KINDS[types[0]])
+        if len(kinds)!=1:
+            return None
+        kind = kinds.pop()
+        
+        lst_tc = list(gold.gold_df)
+        encodings = [gold.get_encoding(tc) for tc in lst_tc]
+        #The ids are unique in each test case, so the dictionary of ids is the column of ids
+        if any(encoding.num_gold_ids!=len(gold.gold_df[tc]) for tc, encoding in zip(lst_tc, encodings)):
+            return None
+        offsets = np.concatenate(([0], np.cumsum([len(gold.gold_df[tc]) for tc in lst_tc]))).astype(np.int64)
+        arrays = {"offsets": offsets}
+        PyEvALLBinaryFormat.add_strings(arrays, "test_cases", lst_tc)
+        PyEvALLBinaryFormat.add_strings(arrays, "ids", itertools.chain.from_iterable(encoding.ids for encoding in encodings))
+        values = [gold.gold_df[tc][PyEvALLFormat.VALUE].to_numpy() for tc in lst_tc]
+        if kind==PyEvALLBinaryFormat.KIND_RANKING:
+            arrays["values"] = np.concatenate(values)
+            if arrays["values"].dtype!=np.int64:
+                return None
+        elif kind==PyEvALLBinaryFormat.KIND_LEWEDI:
+            classes = list(dict.fromkeys(itertools.chain.from_iterable(itertools.chain.from_iterable(values))))
+            index = {cl: num for num, cl in enumerate(classes)}
+            distributions = np.full((offsets[-1], len(classes)), np.nan)
+            positions = np.full((offsets[-1], len(classes)), -1, dtype=np.int16 if len(classes)<(1<<15) else np.int32)
+            for row, distribution in enumerate(itertools.chain.from_iterable(values)):
+                for position, (cl, value) in enumerate(distribution.items()):
+                    distributions[row, index[cl]] = value
+                    positions[row, index[cl]] = position
+            PyEvALLBinaryFormat.add_strings(arrays, "classes", classes)
+            arrays["distributions"] = distributions
+            arrays["positions"] = positions
+        else:
+            PyEvALLBinaryFormat.add_strings(arrays, "labels", itertools.chain.from_iterable(encoding.labels for encoding in encodings))
+            arrays["label_offsets"] = np.concatenate(([0], np.cumsum([encoding.num_gold_labels for encoding in encodings]))).astype(np.int64)
+            arrays["label_codes"] = np.concatenate([encoding.gold_labels for encoding in encodings]).astype(np.int32)
+            if kind==PyEvALLBinaryFormat.KIND_MULTILABEL:
+                lengths = np.concatenate([np.bincount(encoding.gold_label_rows, minlength=encoding.num_gold_ids) for encoding in encodings])
+                arrays["label_indptr"] = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        return kind, arrays
+    
+    
+    #Strings as their UTF-8 bytes concatenated and the offsets of the bytes of each string
+    @staticmethod
+    def add_strings(arrays, name, values):
+        encoded = [value.encode("utf-8", "surrogatepass") for value in values]
+        arrays[name] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        arrays[name + PyEvALLBinaryFormat.BYTE_OFFSETS] = np.concatenate(([0], np.cumsum([len(value) for value in encoded]))).astype(np.int64)
+        
+        
+    #Array of objects with the strings from start to end of an array of strings
+    @staticmethod
+    def get_strings(arrays, name, start, end):
+        offsets = arrays[name + PyEvALLBinaryFormat.BYTE_OFFSETS][start:end+1].tolist()
+        data = arrays[name][offsets[0]:offsets[-1]].tobytes()
+        text = data.decode("utf-8", "surrogatepass")
+        strings = np.empty(end-start, dtype=object)
+        if len(text)==len(data):
+            #ASCII strings, the offsets of the bytes are also the offsets of the characters
+            strings[:] = [text[a-offsets[0]:b-offsets[0]] for a, b in zip(offsets[:-1], offsets[1:])]
+        else:
+            strings[:] = [data[a-offsets[0]:b-offsets[0]].decode("utf-8", "surrogatepass") for a, b in zip(offsets[:-1], offsets[1:])]
+        return strings
+    
+    
+    @staticmethod
+    def write(path_file, gold, meta=None):
+        """
+        Writes a parsed PyEvALLGoldStandard in the binary format. The archive is written in a temporary file and 
+        renamed, so other processes never read an incomplete file.
+    
+        Parameters:
+            - path_file: Path of the binary file.
+            - gold: PyEvALLGoldStandard object already parsed and validated.
+            - meta: Dictionary with additional metadata stored in the file.
+    
+        Returns:
+            - Boolean indicating if the records could be stored in the binary format.
+        """
+        kind_arrays = PyEvALLBinaryFormat.get_arrays(gold)
+        if kind_arrays is None:
+            return False
+        kind, arrays = kind_arrays
+        meta = dict() if meta is None else dict(meta)
+        meta.update({"format_version": PyEvALLBinaryFormat.FORMAT_VERSION, "version": PyEvALLUtils.VERSION, "kind": kind})
+        arrays[PyEvALLBinaryFormat.META] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+        tmp_file = path_file + ".tmp" + uuid.uuid4().hex
+        try:
+            with open(tmp_file, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_file, path_file)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        return True
+    
+    
+    
+    
+class PyEvALLBinaryTestCases(collections.abc.Mapping):
+    """
+    Read-only mapping from each test case of a binary file to its DataFrame. The DataFrame and the encoding of a 
+    test case are built from the memory mapped arrays the first time they are requested, so only the pages of the
+    evaluated test cases are read from disk.
+    """
+    
+    def __init__(self, path_file, arrays, kind):
+        self.path_file = path_file
+        self.arrays = arrays
+        self.kind = kind
+        self.index = {tc: num for num, tc in enumerate(PyEvALLBinaryFormat.get_strings(arrays, "test_cases", 0, len(arrays["offsets"])-1))}
+        self.frames = dict()
+        self.encodings = dict()
+        
+        
+    def __getitem__(self, tc):
+        if not tc in self.frames:
+            self.frames[tc] = self.load_test_case(self.index[tc], tc)
+        return self.frames[tc]
+    
+    
+    def __iter__(self):
+        return iter(self.index)
+    
+    
+    def __len__(self):
+        return len(self.index)
+    
+    
+    def __contains__(self, tc):
+        return tc in self.index
+    
+    
+    #The memory mapped arrays are not pickled, the file is opened again by the other process
+    def __getstate__(self):
+        return {"path_file": self.path_file, "kind": self.kind}
+    
+    
+    def __setstate__(self, state):
+        test_cases, types, meta = PyEvALLBinaryFormat.read(state["path_file"])
+        self.__dict__.update(test_cases.__dict__)
+        
+        
+    def get_range(self, num):
+        offsets = self.arrays["offsets"]
+        return int(offsets[num]), int(offsets[num+1])
+        
+        
+    #Dictionary of labels and codes of the labels of a test case, with the offsets of the labels of each record
+    def get_labels(self, num):
+        start, end = self.get_range(num)
+        label_offsets = self.arrays["label_offsets"]
+        labels = PyEvALLBinaryFormat.get_strings(self.arrays, "labels", int(label_offsets[num]), int(label_offsets[num+1]))
+        if self.kind==PyEvALLBinaryFormat.KIND_MONOLABEL:
+            return labels, np.asarray(self.arrays["label_codes"][start:end]), None
+        indptr = np.asarray(self.arrays["label_indptr"][start:end+1])
+        return labels, np.asarray(self.arrays["label_codes"][indptr[0]:indptr[-1]]), indptr-indptr[0]
+        
+    
+    def load_test_case(self, num, tc):
+        start, end = self.get_range(num)
+        ids = PyEvALLBinaryFormat.get_strings(self.arrays, "ids", start, end)
+        if self.kind==PyEvALLBinaryFormat.KIND_RANKING:
+            values = np.array(self.arrays["values"][start:end])
+        elif self.kind==PyEvALLBinaryFormat.KIND_LEWEDI:
+            classes = PyEvALLBinaryFormat.get_strings(self.arrays, "classes", 0, len(self.arrays["classes" + PyEvALLBinaryFormat.BYTE_OFFSETS])-1).tolist()
+            values = [dict(item[1:] for item in sorted(zip(positions, classes, row)) if item[0]>=0) for positions, row in 
+                      zip(self.arrays["positions"][start:end].tolist(), self.arrays["distributions"][start:end].tolist())]
+        else:
+            labels, codes, indptr = self.get_labels(num)
+            values = labels[codes]
+            if indptr is not None:
+                values = [value.tolist() for value in np.split(values, indptr[1:-1])]
+        return pd.DataFrame({PyEvALLParser.TEST_CASE: tc, PyEvALLParser.ID: ids, PyEvALLParser.VALUE: values})
+    
+    
+    def get_encoding(self, tc):
+        """
+        Returns the encoding of the gold of a test case from the codes stored in the file.
+        """
+        if not tc in self.encodings:
+            num = self.index[tc]
+            start, end = self.get_range(num)
+            encoding = PyEvALLEncoding()
+            ids = self[tc][PyEvALLParser.ID].to_numpy()
+            if self.kind==PyEvALLBinaryFormat.KIND_MONOLABEL or self.kind==PyEvALLBinaryFormat.KIND_MULTILABEL:
+                labels, codes, indptr = self.get_labels(num)
+                rows = None if indptr is None else np.repeat(np.arange(end-start, dtype=np.int32), np.diff(indptr))
+                encoding.load_gold(ids, np.arange(end-start, dtype=np.int32), labels, codes, rows, indptr is not None)
+            else:
+                encoding.load_gold(ids, np.arange(end-start, dtype=np.int32))
+            self.encodings[tc] = encoding
+        return self.encodings[tc]
+    
+    
+    
+    
+class PyEvALLGoldCache(object):
+    """
+    Persistent cache of parsed gold standards, enabled with the parameter gold_cache. Each gold standard is stored
+    in the binary format of PyEvALL, in a file named with the hash of the content of the gold file and the version 
+    of PyEvALL, so a modified file or a new version never reuses an old entry. Later evaluations memory map the 
+    file instead of parsing and validating the gold standard, and restore the warnings of its file report. Only 
+    valid gold standards whose values have the same type in all the test cases are cached.
+    """
+    HASH_CHUNK_SIZE=1<<20
+    
+    
+    def __init__(self, folder, evaluation_id):
+        self.folder=folder
+        self.logger = PyEvALLUtils.get_logger(__name__, evaluation_id)
+        
+        
+    def get_key(self, path_file):
+        """
+        Returns the hash of the content of the file, the version of PyEvALL and the version of the binary format.
+        """
+        sha = hashlib.sha256()
+        sha.update(("pyevall-%s-binary-%s\n" % (PyEvALLUtils.VERSION, PyEvALLBinaryFormat.FORMAT_VERSION)).encode("utf-8"))
+        with open(path_file, "rb") as f:
+            for chunk in iter(lambda: f.read(PyEvALLGoldCache.HASH_CHUNK_SIZE), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+    
+    
+    def get_entry_file(self, key):
+        return os.path.join(self.folder, key + ".npz")
+    
+    
+    def load(self, key, gold):
+        """
+        Loads a cached gold standard into the PyEvALLGoldStandard object.
+    
+        Parameters:
+            - key: Key of the gold standard returned by get_key.
+            - gold: PyEvALLGoldStandard object where the test cases, types and warnings are loaded.
+    
+        Returns:
+            - Boolean indicating if the gold standard was found in the cache.
+        """
+        try:
+            test_cases, types, meta = PyEvALLBinaryFormat.read(self.get_entry_file(key))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            self.logger.debug("Gold standard %s not found in the cache: %s", key, e)
+            return False
+        gold.index_gold(True, test_cases, types)
+        #Warnings of the file report, such as the identification of the TSV or CSV formats
+        file_report = gold.get_file_report()
+        file_report[PyEvALLReport.STATUS_TAG] = meta["status"]
+        file_report[PyEvALLReport.ERRORS_TAG].update(meta["errors"])
+        self.logger.debug("Gold standard %s loaded from the cache", key)
+        return True
+    
+    
+    def store(self, key, gold):
+        """
+        Stores a valid gold standard in the cache.
+    
+        Parameters:
+            - key: Key of the gold standard returned by get_key.
+            - gold: PyEvALLGoldStandard object already parsed and validated.
+        """
+        file_report = gold.get_file_report()
+        meta = {"status": file_report[PyEvALLReport.STATUS_TAG], "errors": file_report[PyEvALLReport.ERRORS_TAG]}
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            if PyEvALLBinaryFormat.write(self.get_entry_file(key), gold, meta):
+                self.logger.debug("Gold standard %s stored in the cache", key)
+            else:
+                self.logger.debug("Gold standard %s can not be cached", key)
+        except OSError as e:
+            self.logger.debug("Gold standard %s not stored in the cache: %s", key, e)
+            
+            
+    #Each evaluation stores its new scores in its own file, so concurrent evaluations never overwrite the others
+    def get_scores_file(self, key):
+        return os.path.join(self.folder, key + ".scores." + uuid.uuid4().hex + ".json")
+    
+    
+    def load_scores(self, key):
+        """
+        Returns the dictionary with the scores of the gold standard against itself stored in the cache by all the 
+        evaluations, empty if there are no scores of the gold standard.
+        """
+        scores = dict()
+        for path_file in sorted(glob.glob(os.path.join(glob.escape(self.folder), glob.escape(key) + ".scores*.json"))):
+            try:
+                with open(path_file, encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.debug("Scores of the gold standard %s not loaded from %s: %s", key, path_file, e)
+                continue
+            if isinstance(entry, dict):
+                scores.update(entry)
+        return scores
+    
+    
+    def store_scores(self, key, scores):
+        """
+        Stores the scores of the gold standard against itself computed by an evaluation. The file is written in a
+        temporary file and renamed, so other processes never read an incomplete file.
+        """
+        path_file = self.get_scores_file(key)
+        tmp_file = path_file + ".tmp" + uuid.uuid4().hex
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(scores, f)
+            os.replace(tmp_file, path_file)
+        except OSError as e:
+            self.logger.debug("Scores of the gold standard %s not stored in the cache: %s", key, e)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+    
+    
+    
+    
+class PyEvALLGoldScores(object):
+    """
+    Scores of the gold standard against itself, such as the ICM of the gold used by ICMNorm to normalize. They only 
+    depend on the gold of the test case, the hierarchy and the parameters of the metric, so they are computed once 
+    and shared by the evaluation of all the prediction files with the same PyEvALLGoldStandard object. If the gold 
+    cache is enabled, the new scores are kept in memory and stored next to the cached gold standard for later 
+    evaluations when the evaluation finishes.
+    """
+    
+    def __init__(self, cache=None, key=None):
+        self.cache=cache
+        self.key=key
+        self.scores=None
+        self.new_scores=dict()
+        
+        
+    @staticmethod
+    def get_key(test_case, metric, hierarchy, params):
+        return json.dumps([test_case, metric, hierarchy, params], default=str)
+    
+    
+    def get_scores(self):
+        if self.scores==None:
+            self.scores = dict() if self.cache==None else self.cache.load_scores(self.key)
+        return self.scores
+    
+    
+    def contains(self, key):
+        return key in self.get_scores()
+    
+    
+    def get(self, key):
+        return self.get_scores()[key]
+    
+    
+    def set(self, key, score):
+        self.get_scores()[key]=score
+        if self.cache!=None:
+            self.new_scores[key]=score
+            
+            
+    def flush(self):
+        """
+        Stores in the cache the scores computed since the last call.
+        """
+        if len(self.new_scores)>0:
+            new_scores, self.new_scores = self.new_scores, dict()
+            self.cache.store_scores(self.key, new_scores)
+    
+    
+    
+    
+class PyEvALLGoldStandard(PyEvALLParser):
+    """
+    Gold standard parsed, validated and indexed only once. The same object can be shared by the evaluation of 
+    several prediction files, avoiding to read, validate and split the gold file per test case for each of them.
+    """
+    
+    def __init__(self, gold_file, evaluation_id):
+        """
+        Constructor for initializing an instance of the class.
+        
+        Parameters:
+            - gold_file: Path to the file containing the gold standard labels, or the gold standard already in memory 
+                as a DataFrame, a list of records or a NumPy array.
+            - evaluation_id: Identifier of the active evaluation configuration.
+            
+        Functionality:
+            - Checks that the gold file exists and identifies its format (JSON, TSV or CSV).
+            - In-memory gold standards are converted to records and validated without any file I/O.
+            - Parses and validates the JSON-formatted file and splits it into one DataFrame per test case.
+            - Stores the errors found in its own PyEvALLReport, so they can be merged in the report of each evaluation.
+            - Computes the types of the attribute value for each test case.
+        """
+        self.evaluation_id = evaluation_id         
+        self.logger = PyEvALLUtils.get_logger(__name__, evaluation_id)
+        #atributtes
+        self.exist=False
+        self.valid=False
+        self.pyevall_report=PyEvALLReport()
+        self.pyevall_report.init_report()
+        
+        self.gold_df=dict()
+        self.gold_types=dict()
+        self.gold_encodings=dict()
+        self.gold_scores=PyEvALLGoldScores()
+        
+        if self.is_in_memory(gold_file):
+            self.gold_path=None
+            self.gold_file_name= PyEvALLParser.MEMORY_GOLD_NAME
+            self.pyevall_report.insert_file(self.gold_file_name, True)
+            if self.check_records_exist(gold_file, self.gold_file_name):
+                self.exist=True
+                self.logger.debug("Initializing PyEvALLGoldStandard object from memory")
+                self.valid= self.index_gold(*self.parser_records(gold_file, self.gold_file_name, True))
+            return
+        
+        self.gold_path=gold_file
+        self.gold_file_name= os.path.split(self.gold_path)[1]
+        self.pyevall_report.insert_file(self.gold_file_name, True)
+        
+        if self.check_file_exist(self.gold_path, self.gold_file_name):
+            self.exist=True
+            self.logger.debug("Initializing PyEvALLGoldStandard object")
+            self.valid= self.parse_gold_json_format()
+            
     
+    def parse_gold_json_format(self):
+        """
+        Parse the gold standard file in JSON, TSV or CSV format.
+    
+        Returns:
+            - Boolean indicating if the gold standard is valid.
+    
+        Functionality:
+            - If the gold cache is enabled, loads the gold standard from the cache when the same file was already parsed.
+            - Parses gold standard file into a dictionary if it is valid.
+            - Checks the format of the gold standard file and converts it into DataFrame for each test case.
+            - Stores the types of the attribute value for each test case.
+            - If the gold cache is enabled, stores the valid gold standard in the cache.
+        """
+        cache_folder = PyEvALLUtils.get_active_configuration(self.evaluation_id)[PyEvALLUtils.PARAM_GOLD_CACHE]
+        if cache_folder==None or PyEvALLBinaryFormat.is_binary(self.gold_path):
+            return self.index_gold(*self.parser_file(self.gold_path, self.gold_file_name, True))
+        
+        cache = PyEvALLGoldCache(cache_folder, self.evaluation_id)
+        key = cache.get_key(self.gold_path)
+        self.gold_scores = PyEvALLGoldScores(cache, key)
+        if cache.load(key, self):
+            return True
+        valid = self.index_gold(*self.parser_file(self.gold_path, self.gold_file_name, True))
+        if valid:
+            cache.store(key, self)
+        return valid
+    
+    
+    def index_gold(self, valid, test_cases, types):
+        """
+        Stores the DataFrame of each test case of the parsed gold standard and the types of their values.
+    
+        Parameters:
+            - valid: Boolean indicating if the gold standard was parsed and validated without errors.
+            - test_cases: Dictionary with a DataFrame per test case.
+            - types: Dictionary with the types of the values of each test case.
+    
+        Returns:
+            - Boolean indicating if the gold standard is valid.
+        """
+        #if gold contains errors we stop evaluation and inform
+        if valid: 
+            if isinstance(test_cases, PyEvALLBinaryTestCases):
+                #the test cases of binary files are loaded when they are requested
+                self.gold_df = test_cases
+            else:
+                self.gold_df.update(test_cases)
+            self.gold_types.update(types)
+        return valid
+    
+    
+    def get_file_report(self):
+        return self.pyevall_report.report[PyEvALLReport.FILES_TAG][self.gold_file_name]
+    
+    
+    def get_value_types(self, tc):
+        return self.gold_types[tc]
+    
+    
+    #Encoding of the ids and labels of the gold of a test case, computed only once and shared by all the predictions
+    def get_encoding(self, tc):
+        if isinstance(self.gold_df, PyEvALLBinaryTestCases):
+            return self.gold_df.get_encoding(tc)
+        if not tc in self.gold_encodings:
+            self.gold_encodings[tc] = PyEvALLEncoding(self.gold_df[tc])
+        return self.gold_encodings[tc]
+    
+    
+    
+    
+class PyEvALLFormat(PyEvALLParser):  
 
     def __init__(self, pyevall_report, pred_file, gold_file, evaluation_id): 
         """
@@ -48,14 +1624,17 @@ class PyEvALLFormat(object):
         
         Parameters:
             - pyevall_report: An instance of PyEvALLReport class to manage the evaluation report.
-            - pred_file: Path to the file containing system predictions.
-            - gold_file: Path to the file containing the gold standard labels.
+            - pred_file: Path to the file containing system predictions, or the predictions already in memory as a
+                DataFrame, a list of records or a NumPy array.
+            - gold_file: Path to the file containing the gold standard labels, the gold standard already in memory, 
+                or a PyEvALLGoldStandard object already parsed.
 
             
         Functionality:
             - Initializes attributes and configures the evaluation based on the provided files and parameters.
-            - Determines the format of input files and converts them to JSON format if needed.
-            - Parses the JSON-formatted files for further processing.
+            - Parses the gold standard, unless a PyEvALLGoldStandard object is provided, and merges its errors in the report.
+            - Determines the format of the predictions file (JSON, TSV or CSV).
+            - Parses the JSON-formatted predictions file for further processing.
             - If files or formats are invalid, sets valid_execution flag to False.
             - Logs debugging information during the initialization process.
             - Returns an initialized instance ready for evaluation.
@@ -67,140 +1646,53 @@ class PyEvALLFormat(object):
         self.valid_execution=True
         self.pyevall_report=pyevall_report
        
-        self.pred_path=pred_file
-        self.pred_file_name= os.path.split(self.pred_path)[1]       
         self.pred_df=dict()
+        self.pred_types=dict()
+        self.pred_in_memory=self.is_in_memory(pred_file)
+        if self.pred_in_memory:
+            self.pred_path=None
+            self.pred_file_name= PyEvALLParser.MEMORY_PRED_NAME
+        else:
+            self.pred_path=pred_file
+            self.pred_file_name= os.path.split(self.pred_path)[1]       
         self.pyevall_report.insert_file(self.pred_file_name, False)
         
-        self.gold_path=gold_file
-        self.gold_file_name= os.path.split(self.gold_path)[1]
-        self.gold_df=dict()
+        if isinstance(gold_file, PyEvALLGoldStandard):
+            self.gold= gold_file
+        else:
+            self.gold= PyEvALLGoldStandard(gold_file, evaluation_id)
+        self.gold_path=self.gold.gold_path
+        self.gold_file_name= self.gold.gold_file_name
+        self.gold_df=self.gold.gold_df
         self.pyevall_report.insert_file(self.gold_file_name, True)
                 
+        if self.pred_in_memory:
+            #in-memory predictions are parsed without any file I/O
+            if self.check_records_exist(pred_file, self.pred_file_name) and self.gold.exist:
+                self.logger.debug("Initializing PyEvALLFormat object from memory")
+                self.index_predictions(*self.parser_records(pred_file, self.pred_file_name, False))
+            else:
+                self.valid_execution=False
+        
         #check if the predictions file exist 
-        if self.check_file_exist(self.pred_path, self.pred_file_name):
+        elif self.check_file_exist(self.pred_path, self.pred_file_name):
             #if file does not exist we can not evaluate
-            if self.check_file_exist(self.gold_path, self.gold_file_name):
-                #Identify format, convert to json and parse it
+            if self.gold.exist:
+                #Identify format and parse it
                 self.logger.debug("Initializing PyEvALLFormat object")   
-                update_path, path= self.check_valids_for_tsv_csv_formats(self.pred_path, self.pred_file_name)
-                if update_path:
-                    self.pred_path=path
-                update_path, path= self.check_valids_for_tsv_csv_formats(self.gold_path, self.gold_file_name)
-                if update_path:
-                    self.gold_path=path
-                     
                 self.parse_files_json_format()
             else:
                 self.valid_execution=False                                   
                 
         else:
-            #The prediction file contains errors so the execution is not valid, but we parser the gold to detect possible errors 
+            #The prediction file contains errors so the execution is not valid, but we parser it to detect possible errors 
             self.valid_execution=False
-            #Check gold for errors
-            if self.check_file_exist(self.gold_path, self.gold_file_name):
-                update_path, path= self.check_valids_for_tsv_csv_formats(self.gold_path, self.gold_file_name)
-                if update_path:
-                    self.gold_path=path
-                    
+            if self.gold.exist and p.Path(self.pred_path).exists():
                 self.parse_files_json_format()
-
-    #check the format of the file, convert if is tsv or csv, ,and return the json.
-    def check_valids_for_tsv_csv_formats(self, path_file, file_name):         
-        try:
-            with open(path_file, 'r', encoding='utf-8') as f:                
-                data = json.load(f) 
-                return True, path_file
-        except ValueError as e:
-            pass               
-        
-        try:
-            with open(path_file, encoding='utf-8') as file:
-                rd = csv.reader(file, delimiter=self.DELIMITER_TSV, quotechar='"')
-                self.delimiter =self.DELIMITER_TSV
-                path = self.parse_tsv_csv_2_json(path_file, file_name)
-                self.pyevall_report.insert_file_warning(file_name, PyEvALLReport.FORMAT_TSV_FORMAT_IDENTIFIED_WARNING, False)
-                self.logger.debug("Warning %s in file %s in line %s", PyEvALLReport.FORMAT_TSV_FORMAT_IDENTIFIED_WARNING, file_name) 
-                return True, path
-        except Exception as e:
-            pass
         
-        try:
-            with open(path_file, encoding='utf-8') as file:
-                rd = csv.reader(file, delimiter=self.DELIMITER_CSV, quotechar='"')
-                self.delimiter =self.DELIMITER_CSV
-                path = path = self.parse_tsv_csv_2_json(path_file, file_name)
-                self.pyevall_report.insert_file_warning(file_name, PyEvALLReport.FORMAT_CSV_FORMAT_IDENTIFIED_WARNING, False)
-                self.logger.debug("Warning %s in file %s in line %s", PyEvALLReport.FORMAT_CSV_FORMAT_IDENTIFIED_WARNING, file_name) 
-                return True, path
-        except Exception as e:
-            pass          
-                               
-        return False, None
-
-    
-           
-    def check_file_exist(self, path_file, file_name):
-        """
-        Check if a file exists and is not empty.
-    
-        Parameters:
-            - path_file: Path to the file to check.
-            - file_name: Name of the file.
-    
-        Returns:
-            - Boolean indicating whether the file exists and is not empty.
-    
-        Functionality:
-            - Uses the Path class to create a Path object for the file.
-            - Checks if the file exists.
-            - Checks if the file is not empty.
-            - Inserts file error into the PyEvALLReport if file is empty or does not exist.
-            - Logs error message if file is empty or does not exist.
-            - Returns True if the file exists and is not empty, otherwise False.
-        """
-        path = p.Path(path_file)
-        if path.exists():
-            if path.stat().st_size > 0:
-                return True
-            else:
-                self.pyevall_report.insert_file_error(file_name, PyEvALLReport.FORMAT_EMPTY_FILE_ERROR, None, True)
-                self.logger.debug("Error %s in file %s: file empty", PyEvALLReport.FORMAT_EMPTY_FILE_ERROR, file_name)
-                return False                
-        else:
-            self.pyevall_report.insert_file_error(file_name, PyEvALLReport.FORMAT_FILE_NOT_EXIST_ERROR, None, True)
-            self.logger.debug("Error %s in file %s: file not exist", PyEvALLReport.FORMAT_FILE_NOT_EXIST_ERROR, file_name)
-            return False    
-    
-     
-    def check_repeated_ids(self, lst_ids_per_tc, testcase, id):
-        """
-        Check if an ID is repeated within a test case.
-    
-        Parameters:
-            - lst_ids_per_tc: Dictionary containing lists of IDs per test case.
-            - testcase: Test case to check for repeated IDs.
-            - id: ID to check for repetition within the test case.
-    
-        Returns:
-            - Boolean indicating whether the ID is repeated within the test case.
-    
-        Functionality:
-            - Checks if the test case exists in the dictionary.
-            - Checks if the ID exists in the list of IDs for the test case.
-            - If the test case exists, appends the ID to its list of IDs.
-            - If the test case does not exist, creates a new entry with an empty list for IDs and appends the ID.
-            - Returns True if the ID is repeated within the test case, otherwise False.
-        """
-        if testcase in lst_ids_per_tc:
-            if id in lst_ids_per_tc[testcase]:
-                return True
-            else:                
-                lst_ids_per_tc[testcase].append(id)
-        else:
-            lst_ids_per_tc[testcase]=[]
-            lst_ids_per_tc[testcase].append(id)
-        return False 
+        if not self.gold.valid:
+            self.valid_execution=False
+        self.pyevall_report.merge_file_report(self.gold_file_name, self.gold.get_file_report())
         
         
     def get_pyevall_comparators(self):
@@ -214,6 +1706,7 @@ class PyEvALLFormat(object):
             - Iterates through each test case in the gold standard data.
             - Checks if the test case exists in the predictions data.
             - Checks consistency of JSON data for the test case.
+            - Encodes the ids and labels of consistent test cases with the dictionaries of the gold.
             - Initializes PyEvALLComparator instance for consistent test cases.
             - Appends initialized comparators to the list.
             - Returns the list of comparators for further evaluation.
@@ -222,7 +1715,9 @@ class PyEvALLFormat(object):
         for tc in self.gold_df:
             if tc in self.pred_df:
                 if self.check_consistency_json_data(tc, self.pred_df[tc], self.gold_df[tc], self.gold_file_name, self.pred_file_name):
-                    comp = comparators.PyEvALLComparator(self.pred_df[tc], self.gold_df[tc], tc, self.evaluation_id)
+                    encoding = self.gold.get_encoding(tc).encode_predictions(self.pred_df[tc])
+                    comp = comparators.PyEvALLComparator(self.pred_df[tc], self.gold_df[tc], tc, self.evaluation_id, encoding)
+                    comp.gold_scores = self.gold.gold_scores
                     lst_comparators.append(comp)
         return lst_comparators         
         
@@ -234,128 +1729,53 @@ class PyEvALLFormat(object):
     ##########################################     
     def parse_files_json_format(self):
         """
-        Parse JSON-formatted prediction and gold standard files.
+        Parse the prediction file in JSON, TSV or CSV format.
     
         Functionality:
             - Parses prediction file into a dictionary if it is valid.
             - Checks the format of the prediction file and converts it into DataFrame for each test case.
             - Inserts file error into the PyEvALLReport if prediction file is empty or invalid.
-            - Parses gold standard file into a dictionary if it is valid.
-            - Checks the format of the gold standard file and converts it into DataFrame for each test case.
-            - Inserts file error into the PyEvALLReport if gold standard file is empty or invalid.
-            - Sets valid_execution flag to False if any file contains errors.
+            - Sets valid_execution flag to False if the file contains errors.
         """        
+        self.index_predictions(*self.parser_file(self.pred_path, self.pred_file_name, False))
+        
+    
+    def index_predictions(self, valid, test_cases, types):
+        """
+        Stores the DataFrame of each test case of the parsed predictions and the types of their values.
+    
+        Parameters:
+            - valid: Boolean indicating if the predictions were parsed and validated without errors.
+            - test_cases: Dictionary with a DataFrame per test case, or None if the predictions could not be parsed.
+            - types: Dictionary with the types of the values of each test case.
+        """
         #if predictions contains errors we stop evaluation and inform
-        valid, pred_dict = self.parser_json(self.pred_path, self.pred_file_name)  
-        if valid: 
-            valid, pred_dict= self.check_format_json(self.pred_file_name, pred_dict, False)
-            if len(pred_dict)>0:
-                for tc in pred_dict:          
-                    self.pred_df[tc]= pd.DataFrame.from_dict(pred_dict[tc])  
+        if test_cases is not None: 
+            if isinstance(test_cases, PyEvALLBinaryTestCases):
+                #the test cases of binary files are loaded when they are requested
+                self.pred_df = test_cases
+                self.pred_types.update(types)
+            elif len(test_cases)>0:
+                self.pred_df.update(test_cases)
+                self.pred_types.update(types)
             else:
                 self.pyevall_report.insert_file_error(self.pred_file_name, PyEvALLReport.FORMAT_EMPTY_FILE_ERROR, None, True)
                 self.logger.debug("Error %s in file %s: file empty", PyEvALLReport.FORMAT_EMPTY_FILE_ERROR, self.pred_file_name)
                 self.valid_execution=False                 
         else:
             self.valid_execution=False                    
-       
-        #if gold contains errors we stop evaluation and inform
-        valid, gold_dict = self.parser_json(self.gold_path, self.gold_file_name)
-        if valid:       
-            valid, gold_dict= self.check_format_json(self.gold_file_name, gold_dict, True)  
-            if valid: 
-                for tc in gold_dict:         
-                    self.gold_df[tc]= pd.DataFrame.from_dict(gold_dict[tc])   
-            else:
-                self.valid_execution=False                                          
-        else:
-            self.valid_execution=False 
           
                
-    def parser_json(self, path, file_name):
-        """
-        Parse a JSON file and validate its format against a schema.
-    
-        Parameters:
-            - path: Path to the JSON file.
-            - file_name: Name of the JSON file.
-    
-        Returns:
-            - Tuple containing a boolean indicating if parsing was successful and the parsed data.
-    
-        Functionality:
-            - Attempts to open and load the JSON file.
-            - Inserts file error into the PyEvALLReport if JSON format is incorrect.
-            - Validates the JSON data against a predefined schema.
-            - Inserts file error into the PyEvALLReport if JSON schema is incorrect.
-            - Returns a tuple with a boolean indicating success and the parsed data.
-        """
-        data = None
-        try:
-            with open(path, 'r', encoding='utf-8') as f:                
-                data = json.load(f) 
-        except ValueError as e:
-            self.pyevall_report.insert_file_error(file_name, PyEvALLReport.FORMAT_INCORRECT_JSON_ERROR, str(e), True)
-            self.logger.debug("Error %s in file %s in line %s", PyEvALLReport.FORMAT_INCORRECT_JSON_ERROR, file_name, e)             
-            return False, data
-        
-        try:
-            validate(instance=data, schema=PyEvALLUtils.FORMAT_JSON_SCHEMA)
-        except jsonschema.exceptions.ValidationError as e:
-            self.pyevall_report.insert_file_error(file_name, PyEvALLReport.FORMAT_INCORRECT_SCHEMA_JSON_ERROR, str(e), True)
-            self.logger.debug("Error %s in file %s in line %s", PyEvALLReport.FORMAT_INCORRECT_SCHEMA_JSON_ERROR, file_name, e)             
-            return False, data
-        
-        return True, data
-    
-   
-    def check_format_json(self, file_name, data, stop_error):
-        """
-        Check the format of JSON data and detect repeated IDs within test cases.
-    
-        Parameters:
-            - file_name: Name of the JSON file being checked.
-            - data: JSON data to be checked for format and repeated IDs.
-            - stop_error: Boolean indicating whether to stop on encountering an error.
-    
-        Returns:
-            - Tuple containing a boolean indicating if there are no errors and the cleaned data.
-    
-        Functionality:
-            - Initializes dictionaries to store clean data and track IDs per test case.
-            - Iterates through each instance in the data.
-            - Checks for repeated IDs within test cases: if the error is found in the predictions the system continues and inform,
-                if the error is found in the gold the process stop.
-            - Appends instances to clean data if IDs are not repeated.
-            - Inserts file line error into the PyEvALLReport if repeated IDs are found.
-            - Logs error message if repeated IDs are found.
-            - Returns a tuple with a boolean indicating if there are no errors and the cleaned data.
-        """
-        clean_data=dict()
-        lst_ids_per_tc=dict()
-        no_errors=True
-        for index, inst in enumerate(data,1):
-            if not self.check_repeated_ids(lst_ids_per_tc, inst[PyEvALLFormat.TEST_CASE], inst[PyEvALLFormat.ID]):
-                if not inst[PyEvALLFormat.TEST_CASE] in clean_data:
-                    clean_data[inst[PyEvALLFormat.TEST_CASE]]=[]
-                clean_data[inst[PyEvALLFormat.TEST_CASE]].append(inst)
-            else:
-                self.pyevall_report.insert_file_line_error(file_name, index, PyEvALLReport.FORMAT_IDS_REPEATED_ROW_ERROR, None, stop_error)
-                self.logger.debug("Error %s in file %s in line %s", PyEvALLReport.FORMAT_IDS_REPEATED_ROW_ERROR, file_name, index)
-                no_errors=False     
-        return no_errors, clean_data    
-    
-    
     def check_consistency_json_data(self, tc, pred_df, gold_df, gold_file_name, pred_file_name):
         #If gold has different data types in value it is an error.          
-        lst_g_type=gold_df[PyEvALLFormat.VALUE].apply(type).unique()
+        lst_g_type=self.gold.get_value_types(tc)
         if len(lst_g_type)!=1:
             self.pyevall_report.insert_file_testcase_error(gold_file_name, tc, PyEvALLReport.FORMAT_DIFFERENTE_TYPES_IN_VALUE_FIELD_ERROR, None, True)
             self.logger.debug("Error %s in file %s: file empty", PyEvALLReport.FORMAT_DIFFERENTE_TYPES_IN_VALUE_FIELD_ERROR, gold_file_name)
             return False 
                              
         #If predictions has different data types in value it is an error.                            
-        lst_p_type=pred_df[PyEvALLFormat.VALUE].apply(type).unique()
+        lst_p_type=self.pred_types[tc]
         if len(lst_p_type)!=1:
             self.pyevall_report.insert_file_testcase_error(pred_file_name, tc, PyEvALLReport.FORMAT_DIFFERENTE_TYPES_IN_VALUE_FIELD_ERROR, None, True)
             self.logger.debug("Error %s in file %s: file empty", PyEvALLReport.FORMAT_DIFFERENTE_TYPES_IN_VALUE_FIELD_ERROR, pred_file_name)
@@ -368,64 +1788,3 @@ class PyEvALLFormat(object):
             return False
         
         return True
-            
-  
-    ##########################################
-    #                                        #
-    #            WRAPPER TSV AND CSV         #
-    #                                        #
-    ##########################################      
-    def parse_tsv_csv_2_json(self, path_input_file, input_file_name): 
-        arr = [] 
-        file = open(path_input_file, 'r') 
-        a = file.readline() 
-          
-        # The first line consist of headings of the record  
-        # so we will store it in an array and move to  
-        # next line in input_file. 
-        df_data=None
-        
-        #We read with pandas to preserver the format
-        titles = [t.strip() for t in a.split(self.delimiter)] 
-        if not self.check_headers(titles):
-            titles[0]=PyEvALLFormat.TEST_CASE
-            titles[1]=PyEvALLFormat.ID
-            titles[2]=PyEvALLFormat.VALUE       
-            df_data = pd.read_csv(path_input_file, sep=self.delimiter, index_col=False, header=None,
-                          skip_blank_lines=False, names=titles, dtype={
-                            PyEvALLFormat.TEST_CASE: 'str',
-                            PyEvALLFormat.ID: 'str',
-                            PyEvALLFormat.VALUE: 'str'
-                        })   
-        else:
-            df_data = pd.read_csv(path_input_file, sep=self.delimiter, index_col=False,
-                          skip_blank_lines=False, dtype={
-                            PyEvALLFormat.TEST_CASE: 'str',
-                            PyEvALLFormat.ID: 'str',
-                            PyEvALLFormat.VALUE: 'str'
-                        })                                
-        
-        #if all the value columns are numbers convert to ranking format, otherwise mataint str
-        try:
-            df_data[PyEvALLFormat.VALUE] = pd.to_numeric(df_data[PyEvALLFormat.VALUE])
-        except ValueError as e:
-            df_data[PyEvALLFormat.VALUE]=df_data[PyEvALLFormat.VALUE].astype("str")
-
-        
-        output_file_json= self.get_temp_file(input_file_name)   
-        with open(output_file_json, 'w', encoding='utf-8') as output_file: 
-            output_file.write(df_data.to_json(orient="records"))            
-        
-        return output_file_json
-
-    
-    def get_temp_file(self, file_name):
-        return os.path.join(PyEvALLUtils.get_tmp_dir_execution(), file_name)
-
-
-    def check_headers(self, row):
-        if len(row)==3:
-            if row[0]==PyEvALLFormat.TEST_CASE and row[1]==PyEvALLFormat.ID and row[2]==PyEvALLFormat.VALUE:        
-                return True
-        return False       
-    
\ No newline at end of file
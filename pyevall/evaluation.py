@@ -26,16 +26,69 @@ from pyevall.metrics.metricfactory import MetricFactory
 from pyevall.reports.reports import PyEvALLReport, PyEvALLDataframeReport,\
     PyEvALLMetaReport, PyEvALLMetaReportDataFrame
 from pyevall.utils.utils import PyEvALLUtils
-from pyevall.comparators.comparators import PyEvALLFormat
+from pyevall.comparators.comparators import PyEvALLFormat, PyEvALLRankingBatch
+from pyevall.comparators.formats import PyEvALLGoldStandard, PyEvALLBinaryFormat
 from pyevall.reports.reports import PyEvALLEmbeddedReport
+from concurrent.futures import ProcessPoolExecutor
+import threading
 import uuid
+import os
+
+
+#Gold standard shared by the evaluations executed in a worker process
+_worker_goldstandard = None
+
+
+def _init_worker(goldstandard):
+    global _worker_goldstandard
+    _worker_goldstandard = goldstandard
+    
+    
+def _evaluate_worker(predictions, lst_metrics, params):
+    evaluation = PyEvALLEvaluation()
+    return evaluation.evaluate(predictions, _worker_goldstandard, lst_metrics, **params)
 
 
 class PyEvALLEvaluation(object):
+    """
+    Evaluator of PyEvALL. The state of each call (identifier of the evaluation, logger, report and ranking batch) is
+    kept per thread, so one instance can be shared by evaluations running concurrently in several threads.
+    """
         
     def __init__(self):
-        self.logger = None
-        self.evaluation_id=None
+        self.call_state = threading.local()
+        
+    @property
+    def evaluation_id(self):
+        return getattr(self.call_state, "evaluation_id", None)
+    
+    @evaluation_id.setter
+    def evaluation_id(self, evaluation_id):
+        self.call_state.evaluation_id = evaluation_id
+        
+    @property
+    def logger(self):
+        return getattr(self.call_state, "logger", None)
+    
+    @logger.setter
+    def logger(self, logger):
+        self.call_state.logger = logger
+        
+    @property
+    def pyevall_report(self):
+        return getattr(self.call_state, "pyevall_report", None)
+    
+    @pyevall_report.setter
+    def pyevall_report(self, pyevall_report):
+        self.call_state.pyevall_report = pyevall_report
+        
+    @property
+    def ranking_batch(self):
+        return getattr(self.call_state, "ranking_batch", None)
+    
+    @ranking_batch.setter
+    def ranking_batch(self, ranking_batch):
+        self.call_state.ranking_batch = ranking_batch
         
     def load_evaluation_conf(self, **params):
         self.evaluation_id= str(uuid.uuid4())
@@ -44,6 +97,62 @@ class PyEvALLEvaluation(object):
 
     def remove_active_evaluation(self):
         PyEvALLUtils.remove_active_configuration(self.evaluation_id)  
+        
+        
+    def load_goldstandard(self, goldstandard, **params):
+        """
+        This function parses, validates and indexes a gold standard only once, so that it can be reused in several evaluations.
+
+        Parameters:
+            goldstandard (str): Path to the file with the gold standard, or the gold standard in memory (DataFrame, list of 
+                records or NumPy array).
+            **params: Dictionary of optional parameters of the evaluation.
+
+        Returns:
+            PyEvALLGoldStandard Object: Gold standard that can be passed to evaluate() or evaluate_lst().
+
+        Example of use:
+            >>> gold = test.load_goldstandard("GOLD.json")
+            >>> report_1 = test.evaluate("SYS1.json", gold, lst_metrics, **params)
+            >>> report_2 = test.evaluate("SYS2.json", gold, lst_metrics, **params)
+        """
+        self.load_evaluation_conf(**params)
+        gold = PyEvALLGoldStandard(goldstandard, self.evaluation_id)
+        self.remove_active_evaluation()
+        return gold
+    
+    
+    def convert_to_binary(self, source, target, **params):
+        """
+        This function converts a file (JSON, TSV or CSV) or records in memory, either predictions or gold standard, to
+        the binary format of PyEvALL. Binary files are memory mapped by evaluate() and evaluate_lst() without parsing
+        them, and only the test cases that are evaluated are read from disk.
+
+        Parameters:
+            source (str): Path to the file to convert, or the records in memory (DataFrame, list of records or NumPy array).
+            target (str): Path of the binary file.
+            **params: Dictionary of optional parameters of the evaluation.
+
+        Raises:
+            ValueError: If the source contains errors, such as an invalid schema or repeated ids, or its values have
+                different types.
+
+        Example of use:
+            >>> test.convert_to_binary("SYS1.json", "SYS1.npz")
+            >>> report = test.evaluate("SYS1.npz", "GOLD.json", lst_metrics, **params)
+        """
+        self.load_evaluation_conf(**params)
+        try:
+            parsed = PyEvALLGoldStandard(source, self.evaluation_id)
+            if not parsed.valid:
+                file_report = parsed.get_file_report()
+                raise ValueError("%s can not be converted, it contains errors: %s" % (parsed.gold_file_name, 
+                                 ", ".join(file_report[PyEvALLReport.ERRORS_TAG])))
+            if not PyEvALLBinaryFormat.write(target, parsed):
+                raise ValueError("%s can not be converted, its values have different types" % parsed.gold_file_name)
+            self.logger.info("File %s converted to binary format in %s", parsed.gold_file_name, target)
+        finally:
+            self.remove_active_evaluation()
             
     
     def evaluate_lst(self, lst_pred, goldstandard, lst_metrics, **params):
@@ -52,7 +161,8 @@ class PyEvALLEvaluation(object):
 
         Parameters:
             predictions (list): List of predicted values.
-            goldstandard (list): List of actual (ground truth) values.
+            goldstandard (list): List of actual (ground truth) values, or a PyEvALLGoldStandard object. The gold
+                standard is parsed only once and shared by the evaluation of all the predictions.
             lst_metrics (list): List of metric names to be evaluated.
             **params: Dictionary of optional parameters that are passed to metric creation and evaluation.
 
@@ -68,8 +178,12 @@ class PyEvALLEvaluation(object):
         """
         #Set evaluation configuration of PyEvALL
         self.load_evaluation_conf(**params)
+        
+        #Parse the gold standard only once for all the predictions
+        if not isinstance(goldstandard, PyEvALLGoldStandard):
+            goldstandard = PyEvALLGoldStandard(goldstandard, self.evaluation_id)
                 
-        self.logger.info("Evaluating the following metrics " + str(lst_metrics))  
+        self.logger.info("Evaluating the following metrics %s", lst_metrics)  
         # Create a PyEvALLFormat object to handle parsing and processing
         meta_report = None
         #if PyEvALLUtils.PARAM_REPORT in params and params[PyEvALLUtils.PARAM_REPORT]==PyEvALLUtils.PARAM_OPTION_REPORT_DATAFRAME:
@@ -78,14 +192,79 @@ class PyEvALLEvaluation(object):
         else:
             meta_report = PyEvALLMetaReport()
 
-        for num , pred in enumerate(lst_pred, start=1):
-            report = self.evaluate(pred, goldstandard, lst_metrics, load_config=False, **params)
-            meta_report.add_pyevall_report(report, num)
+        if PyEvALLUtils.get_active_configuration(self.evaluation_id)[PyEvALLUtils.PARAM_EXECUTION]==PyEvALLUtils.PARAM_OPTION_EXECUTION_PARALLEL:
+            self.evaluate_lst_parallel(meta_report, lst_pred, goldstandard, lst_metrics, **params)
+        else:
+            for num , pred in enumerate(lst_pred, start=1):
+                report = self.evaluate(pred, goldstandard, lst_metrics, load_config=False, **params)
+                meta_report.add_pyevall_report(report, num)
 
+        #the scores of the gold computed for all the predictions are stored only once
+        goldstandard.gold_scores.flush()
         #remove the active configuration for concurrence execution
         self.remove_active_evaluation()
         return meta_report
      
+    
+    def evaluate_lst_parallel(self, meta_report, lst_pred, goldstandard, lst_metrics, **params):
+        """
+        Evaluates the list of predictions distributing the files across a pool of worker processes. The gold standard 
+        is sent only once to each worker, and the reports are added to the meta-report in the order of the list.
+    
+        Args:
+            meta_report (PyEvALLMetaReport): The meta-report where the report of each file is added.
+            lst_pred (list): List of paths to the prediction files.
+            goldstandard (PyEvALLGoldStandard): The gold standard already parsed.
+            lst_metrics (list): List of metric names to be evaluated.
+    
+        Returns:
+            None
+        """
+        num_workers = PyEvALLUtils.get_active_configuration(self.evaluation_id)[PyEvALLUtils.PARAM_NUM_WORKERS]
+        if num_workers==None:
+            num_workers = os.cpu_count()
+        num_workers = max(1, min(num_workers, len(lst_pred)))
+        self.logger.debug("Evaluating %s files with %s worker processes", len(lst_pred), num_workers)
+        
+        #The workers evaluate each file as a single evaluation with the same parameters
+        worker_params = params.copy()
+        worker_params[PyEvALLUtils.PARAM_EXECUTION] = PyEvALLUtils.PARAM_OPTION_EXECUTION_SERIAL
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker, initargs=(goldstandard,)) as executor:
+            futures = [executor.submit(_evaluate_worker, pred, lst_metrics, worker_params) for pred in lst_pred]
+            for num , (pred, future) in enumerate(zip(lst_pred, futures), start=1):
+                try:
+                    report = future.result()
+                except Exception as e:
+                    #An error in a worker only invalidates the report of its file
+                    self.logger.debug("Error %s in file %s: %s", PyEvALLReport.EXECUTION_WORKER_ERROR, pred, e)
+                    report = self.generate_worker_error_report(pred, goldstandard, e)
+                meta_report.add_pyevall_report(report, num)
+                
+    
+    def generate_worker_error_report(self, predictions, goldstandard, exception):
+        """
+        Generates the report of a prediction file whose evaluation failed in a worker process.
+        
+        Args:
+            predictions (str): Path to the prediction file.
+            goldstandard (PyEvALLGoldStandard): The gold standard of the evaluation.
+            exception (Exception): The exception raised by the worker.
+        
+        Returns:
+            Report Object: Evaluation report with the error in the prediction file.
+        """
+        self.pyevall_report= PyEvALLReport()
+        self.pyevall_report.init_report() 
+        if isinstance(predictions, (str, os.PathLike)):
+            pred_file_name = os.path.split(predictions)[1]
+        else:
+            pred_file_name = PyEvALLGoldStandard.MEMORY_PRED_NAME
+        self.pyevall_report.insert_file(pred_file_name, False)
+        self.pyevall_report.insert_file_error(pred_file_name, PyEvALLReport.EXECUTION_WORKER_ERROR, str(exception), True)
+        self.pyevall_report.insert_file(goldstandard.gold_file_name, True)
+        self.pyevall_report.merge_file_report(goldstandard.gold_file_name, goldstandard.get_file_report())
+        return self.generate_report()
+     
           
     def evaluate(self, predictions, goldstandard, lst_metrics, load_config=True, **params):
         """
@@ -93,7 +272,7 @@ class PyEvALLEvaluation(object):
 
         Parameters:
             predictions (list): List of predicted values.
-            goldstandard (list): List of actual (ground truth) values.
+            goldstandard (list): List of actual (ground truth) values, or a PyEvALLGoldStandard object.
             lst_metrics (list): List of metric names to be evaluated.
             load_config (boolean): indicate if should load a new configuration or not.
             **params: Dictionary of optional parameters that are passed to metric creation and evaluation.
@@ -112,7 +291,7 @@ class PyEvALLEvaluation(object):
         if load_config:
             self.load_evaluation_conf(**params)
                 
-        self.logger.info("Evaluating the following metrics " + str(lst_metrics))  
+        self.logger.info("Evaluating the following metrics %s", lst_metrics)  
         # Create a PyEvALLFormat object to handle parsing and processing
         self.pyevall_report= PyEvALLReport()
         self.pyevall_report.init_report() 
@@ -127,18 +306,26 @@ class PyEvALLEvaluation(object):
         if parser.valid_execution: 
             # Get comparators for each test case if format is valid 
             testcase_comp = parser.get_pyevall_comparators() 
+            # Create a metric instance using MetricFactory for each metric in the provided list
+            lst_metric_instances = [(m, MetricFactory.get_instance_metric(m, self.evaluation_id)) for m in lst_metrics]
+            
+            # Compute once per test case the sufficient statistics shared by the metrics
+            self.execute_metric_plan(self.generate_metric_plan(lst_metric_instances), testcase_comp)
+            
             # Iterate through each metric in the provided list      
-            for m in lst_metrics:
+            for m, metric in lst_metric_instances:
                 m_params = params.copy()
                 m_params.update(metric_params.get(m, {}))
                 
-                self.logger.debug("Evaluating the following metric " + m)    
-                # Create a metric instance using MetricFactory            
-                metric = MetricFactory.get_instance_metric(m, self.evaluation_id)     
+                self.logger.debug("Evaluating the following metric %s", m)    
                 
                 if not metric==None:
                     # Evaluate the metric using the created instance and test case comparators
-                    if len(testcase_comp)>0:   
+                    if len(testcase_comp)>0 and metric.is_sweep(**m_params):
+                        # A list of values of the parameter is reported as one metric per value
+                        for metric_sweep in metric.get_lst_metrics_sweep(**m_params):
+                            self.evaluate_metric(metric_sweep, testcase_comp, **m_params)
+                    elif len(testcase_comp)>0:   
                         self.evaluate_metric(metric, testcase_comp, **m_params)       
                     else:
                         self.pyevall_report.insert_error_metric(metric, PyEvALLReport.METRIC_NOT_TEST_CASE_IN_COMMON_ERROR)         
@@ -151,10 +338,58 @@ class PyEvALLEvaluation(object):
         
         #remove the active configuration for concurrence execution
         if load_config:
+            #the scores of the gold computed by a single evaluation are stored once it finishes
+            parser.gold.gold_scores.flush()
             self.remove_active_evaluation()        
         return report
               
  
+    def evaluate_records(self, predictions, goldstandard, lst_metrics, **params):
+        """
+        This function evaluates a set of metrics on predictions and a gold standard already loaded in memory, running
+        the same validation and report pipeline than evaluate() without reading or writing any file.
+
+        Parameters:
+            predictions (list): List of records (dicts) with the keys test_case, id and value, or a NumPy array with
+                the columns test_case, id and value (structured, or two dimensional in this order).
+            goldstandard (list): List of records or NumPy array with the gold standard, or a PyEvALLGoldStandard object.
+            lst_metrics (list): List of metric names to be evaluated.
+            **params: Dictionary of optional parameters that are passed to metric creation and evaluation.
+
+        Returns:
+            Report Object: Evaluation report generated by PyEvALL. The errors of the in-memory data are reported 
+                under the names "predictions" and "goldstandard".
+
+        Example of use:
+            >>> predictions = [{"test_case": "EXIST2023", "id": "1", "value": "sexist"}]
+            >>> goldstandard = [{"test_case": "EXIST2023", "id": "1", "value": "sexist"}]
+            >>> evaluate_records(predictions, goldstandard, ['Accuracy'], **params)
+        """
+        return self.evaluate(predictions, goldstandard, lst_metrics, **params)
+    
+    
+    def evaluate_frames(self, predictions, goldstandard, lst_metrics, **params):
+        """
+        This function evaluates a set of metrics on predictions and a gold standard stored in pandas DataFrames,
+        running the same validation and report pipeline than evaluate() without reading or writing any file.
+
+        Parameters:
+            predictions (DataFrame): DataFrame with the columns test_case, id and value.
+            goldstandard (DataFrame): DataFrame with the columns test_case, id and value, or a PyEvALLGoldStandard object.
+            lst_metrics (list): List of metric names to be evaluated.
+            **params: Dictionary of optional parameters that are passed to metric creation and evaluation.
+
+        Returns:
+            Report Object: Evaluation report generated by PyEvALL.
+
+        Example of use:
+            >>> predictions = pd.DataFrame({"test_case": ["EXIST2023"], "id": ["1"], "value": ["sexist"]})
+            >>> goldstandard = pd.DataFrame({"test_case": ["EXIST2023"], "id": ["1"], "value": ["sexist"]})
+            >>> evaluate_frames(predictions, goldstandard, ['Accuracy'], **params)
+        """
+        return self.evaluate(predictions, goldstandard, lst_metrics, **params)
+    
+    
     def evaluate_metric(self, metric, lst_comparators, **params):
         """
         Evaluates a given metric on a set of comparators and updates the evaluation report.
@@ -171,10 +406,18 @@ class PyEvALLEvaluation(object):
         sum_tc=0
         valid_tc=0
         
+        # Metrics that support it are computed for all the test cases at once
+        lst_results=None
+        if metric.batch_evaluation:
+            lst_results = metric.evaluate_batch(self.get_ranking_batch(lst_comparators), **params)
+        
         # Iterate through each comparator
-        for comp in lst_comparators:
+        for index, comp in enumerate(lst_comparators):
             # Evaluate the metric using the current comparator                       
-            metric.evaluate(comp, **params)         
+            if lst_results==None:
+                metric.evaluate(comp, **params)         
+            else:
+                metric.evaluate_from_batch(comp, lst_results[index])
             
             # Check if the metric has any preconditions fired                           
             #if not len(metric.preconditions)==0:
@@ -200,6 +443,48 @@ class PyEvALLEvaluation(object):
         if not valid_tc==0:
             aveg_tc=sum_tc/len(lst_comparators)
         self.pyevall_report.insert_result_aveg_tc_metric(metric, aveg_tc)  
+        
+        
+    def generate_metric_plan(self, lst_metric_instances):
+        """
+        Groups the metrics by the sufficient statistics of the comparators that they need (confusion matrix, 
+        marginals, class counts).
+    
+        Args:
+            lst_metric_instances (list): A list of tuples with the name and the instance of each metric.
+    
+        Returns:
+            dict: The names of the metrics that need each statistic.
+        """
+        plan = dict()
+        for m, metric in lst_metric_instances:
+            if not metric==None:
+                for statistic in metric.statistics:
+                    plan.setdefault(statistic, []).append(m)
+        return plan
+    
+    
+    def execute_metric_plan(self, plan, lst_comparators):
+        """
+        Computes the statistics of the plan in one pass for each test case, so that all the metrics of a group 
+        are derived from them.
+        """
+        if len(plan)==0:
+            return
+        self.logger.debug("Metric plan: %s", plan)
+        lst_statistics = list(plan)
+        for comp in lst_comparators:
+            comp.generate_statistics(lst_statistics)
+        
+        
+    def get_ranking_batch(self, lst_comparators):
+        """
+        Returns the rankings of all the test cases packed in one batch, generated only once and shared by all 
+        the ranking metrics of the evaluation.
+        """
+        if self.ranking_batch==None or not self.ranking_batch.comparators is lst_comparators:
+            self.ranking_batch = PyEvALLRankingBatch(lst_comparators, self.evaluation_id)
+        return self.ranking_batch
                     
         
                 
@@ -58,16 +58,16 @@ class MetricFactory(Enum):
     @classmethod   
     def get_instance_metric(cls, metric, evaluation_id):
         logger = PyEvALLUtils.get_logger(__name__, evaluation_id)
-        logger.debug("Generating instance of metric " + str(metric))
+        logger.debug("Generating instance of metric %s", metric)
         instance=None
         try:
             module_ = importlib.import_module(str(PyEvALLUtils.MODULE_NAME))
             try:
                 instance = getattr(module_, metric)(evaluation_id)
             except AttributeError:
-                logger.debug("ERROR: The metric " + str(metric) + " does not exist.")
+                logger.debug("ERROR: The metric %s does not exist.", metric)
         except ImportError:
-            logger.debug("ERROR: The module " + PyEvALLUtils.MODULE_NAME + " does not exist.")       
+            logger.debug("ERROR: The module %s does not exist.", PyEvALLUtils.MODULE_NAME)       
         return instance
     
     
@@ -28,10 +28,13 @@ from pyevall.reports.reports import PyEvALLReport
 from pyevall.utils.utils import PyEvALLUtils
 from pyevall.comparators.comparators import PyEvALLComparator
 from pyevall.comparators.formats import PyEvALLFormat
+from pyevall.comparators.formats import PyEvALLGoldScores
 import numpy as np
 import pandas as pd
 from statistics import NormalDist
 import math
+import copy
+from collections import OrderedDict
 
 
 
@@ -47,6 +50,15 @@ class PyEvALLMetric(object):
         self.result=dict()
         self.preconditions=dict()
         self.status = PyEvALLReport.OK   
+        #Parameter that accepts a list of values evaluated in one pass, and acronym of each value
+        self.sweep_param=None
+        self.sweep_acronym=None
+        self.sweep_results=dict()
+        self.sweep_results_batch=None
+        #Metrics that can evaluate all the test cases at once with a batch of comparators
+        self.batch_evaluation=False
+        #Sufficient statistics of the comparator required by the metric, shared with the other metrics
+        self.statistics=[]
         
         
     def clear_results(self):
@@ -87,6 +99,105 @@ class PyEvALLMetric(object):
     def evaluate(self, **params):
         raise NotImplementedError("Please Implement this method")
     
+    
+    def is_sweep(self, **params):
+        return self.sweep_param!=None and isinstance(params.get(self.sweep_param), (list, tuple))
+    
+    
+    def get_lst_metrics_sweep(self, **params):
+        lst_values = params[self.sweep_param]
+        return [PyEvALLMetricSweep(self, index, value) for index, value in enumerate(lst_values)]
+    
+    
+    def get_sweep_results(self, comparator, **params):
+        #The results of all values are computed only once per test case and shared by the metrics of the sweep
+        tc = comparator.get_testcase()
+        if not tc in self.sweep_results:
+            lst_results = self.evaluate_sweep(comparator, list(params[self.sweep_param]), **params)
+            self.sweep_results[tc] = (lst_results, self.preconditions, self.status)
+            self.clear_results()
+        return self.sweep_results[tc]
+    
+    
+    def evaluate_sweep(self, comparator, lst_values, **params):
+        #By default each value is evaluated independently, metrics can override it to evaluate all in one pass.
+        lst_results = []
+        preconditions = None
+        for value in lst_values:
+            self.clear_results()
+            params[self.sweep_param] = value
+            self.evaluate(comparator, **params)
+            if preconditions==None:
+                preconditions = self.preconditions
+            if PyEvALLReport.AVERAGE_TAG in self.result:
+                lst_results.append(self.result[PyEvALLReport.AVERAGE_TAG])
+        self.preconditions = preconditions
+        if len(lst_results)==0:
+            return None
+        return lst_results
+    
+    
+    def evaluate_batch(self, batch, **params):
+        #Metrics with batch_evaluation return the list of results of all the test cases of the batch
+        raise NotImplementedError("Please Implement this method")
+    
+    
+    def evaluate_from_batch(self, comparator, result):
+        #The preconditions are checked for each test case, the result was computed for all of them at once
+        if self.fire_preconditions(comparator):
+            return
+        self.result[PyEvALLReport.AVERAGE_TAG]=result
+        
+        
+    def get_sweep_results_batch(self, batch, **params):
+        if self.sweep_results_batch is None:
+            self.sweep_results_batch = self.evaluate_sweep_batch(batch, list(params[self.sweep_param]), **params)
+        return self.sweep_results_batch
+    
+    
+    def evaluate_sweep_batch(self, batch, lst_values, **params):
+        #By default each value is evaluated independently, metrics can override it to share the computations.
+        lst_results = []
+        for value in lst_values:
+            params[self.sweep_param] = value
+            lst_results.append(self.evaluate_batch(batch, **params))
+        return lst_results
+    
+    
+    
+    
+class PyEvALLMetricSweep(PyEvALLMetric):
+    """
+    Metric that reports one value of a list of values of a parameter, such as P@5 and P@10. The results are
+    computed by the original metric in one pass for all the values of the list.
+    """
+    def __init__(self, metric, index, value):
+        super().__init__(metric.class_name + "@" + str(value), metric.name + " (" + metric.sweep_param + "=" + str(value) + ")", 
+                         metric.sweep_acronym.format(value), metric.evaluation_id)
+        self.metric = metric
+        self.index = index
+        self.batch_evaluation = metric.batch_evaluation
+        
+        
+    def evaluate(self, comparator, **params):
+        lst_results, preconditions, status = self.metric.get_sweep_results(comparator, **params)
+        self.preconditions = copy.deepcopy(preconditions)
+        self.status = status
+        if not lst_results==None:
+            self.result[PyEvALLReport.AVERAGE_TAG] = lst_results[self.index]
+            
+            
+    def evaluate_batch(self, batch, **params):
+        return self.metric.get_sweep_results_batch(batch, **params)[self.index]
+    
+    
+    def fire_preconditions(self, comparator):
+        self.metric.clear_results()
+        fired = self.metric.fire_preconditions(comparator)
+        self.preconditions = copy.deepcopy(self.metric.preconditions)
+        self.status = self.metric.status
+        return fired
+    
     ############################################################################
     ##                                                                        ##
     ##                        CLASSIFICATION METRICS                          ##  
@@ -105,6 +216,7 @@ class Accuracy(PyEvALLMetric):
     """     
     def __init__(self, evaluation_id):        
         super().__init__(MetricFactory.Accuracy.value, "Accuracy", "Acc", evaluation_id)    
+        self.statistics=[PyEvALLComparator.COMPARATOR_STATISTIC_CONF_MATRIX]
 
     def evaluate(self, comparator, **params):  
         self.logger.info("Executing accuracy evaluation method")      
@@ -144,6 +256,7 @@ class SystemPrecision(PyEvALLMetric):
     """     
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.SystemPrecision.value, "System Precision", "SP", evaluation_id)        
+        self.statistics=[PyEvALLComparator.COMPARATOR_STATISTIC_CONF_MATRIX]
 
 
     def evaluate(self, comparator, **params):   
@@ -176,6 +289,7 @@ class SystemPrecision(PyEvALLMetric):
 class Kappa(PyEvALLMetric):         
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.Kappa.value, "Cohen's Kappa", "Kappa", evaluation_id)           
+        self.statistics=[PyEvALLComparator.COMPARATOR_STATISTIC_CONF_MATRIX, PyEvALLComparator.COMPARATOR_STATISTIC_MARGINALS, PyEvALLComparator.COMPARATOR_STATISTIC_CLASS_COUNTS]
         
         
     def evaluate(self, comparator, **params):
@@ -222,6 +336,7 @@ class Kappa(PyEvALLMetric):
 class Precision(PyEvALLMetric):        
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.Precision.value, "Precision", "Pr", evaluation_id)           
+        self.statistics=[PyEvALLComparator.COMPARATOR_STATISTIC_CONF_MATRIX, PyEvALLComparator.COMPARATOR_STATISTIC_CLASS_COUNTS]
         
         
     def evaluate(self, comparator, **params):
@@ -243,10 +358,10 @@ class Precision(PyEvALLMetric):
                 self.result[PyEvALLReport.CLASSES_TAG][c]=p
                 aveg_class += p
                 num_classes+= 1
-                self.logger.debug("Precision for class "+ c + " in testcase " + comparator.get_testcase() + " is: " + str(p))
+                self.logger.debug("Precision for class %s in testcase %s is: %s", c, comparator.get_testcase(), p)
             else:
                 self.result[PyEvALLReport.CLASSES_TAG][c]=None
-                self.logger.debug("Precision for class "+ c + " in testcase " + comparator.get_testcase() + " not exist ")                        
+                self.logger.debug("Precision for class %s in testcase %s not exist ", c, comparator.get_testcase())                        
                 
         aveg=None
         if not num_classes==0:
@@ -271,6 +386,7 @@ class Precision(PyEvALLMetric):
 class Recall(PyEvALLMetric):          
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.Recall.value, "Recall", "Re", evaluation_id)          
+        self.statistics=[PyEvALLComparator.COMPARATOR_STATISTIC_CONF_MATRIX, PyEvALLComparator.COMPARATOR_STATISTIC_CLASS_COUNTS]
         
         
     def evaluate(self, comparator, **params):
@@ -288,7 +404,7 @@ class Recall(PyEvALLMetric):
             r= TP/instances_gold_class
             self.result[PyEvALLReport.CLASSES_TAG][c]=r
             aveg_class += r
-            self.logger.debug("Recall for class "+ c + " in testcase " + comparator.get_testcase() + " is: " + str(r))                      
+            self.logger.debug("Recall for class %s in testcase %s is: %s", c, comparator.get_testcase(), r)                      
                 
         aveg = aveg_class/len(classes)
         self.result[PyEvALLReport.AVERAGE_TAG]=aveg
@@ -310,6 +426,7 @@ class Recall(PyEvALLMetric):
 class FMeasure(PyEvALLMetric):     
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.FMeasure.value, "F-Measure", "F1", evaluation_id)  
+        self.statistics=[PyEvALLComparator.COMPARATOR_STATISTIC_CONF_MATRIX, PyEvALLComparator.COMPARATOR_STATISTIC_CLASS_COUNTS]
         self.alfa_param=0.5          
                 
                 
@@ -334,7 +451,7 @@ class FMeasure(PyEvALLMetric):
                     f1 = 1/((self.alfa_param/p) + ((1-self.alfa_param)/r));                        
                     self.result[PyEvALLReport.CLASSES_TAG][c]=f1
                     aveg_class += f1
-                    self.logger.debug("F1 for class "+ str(c) + " in testcase " + comparator.get_testcase() + " is: " + str(f1))
+                    self.logger.debug("F1 for class %s in testcase %s is: %s", c, comparator.get_testcase(), f1)
                 else:
                     self.result[PyEvALLReport.CLASSES_TAG][c]=0
             else:
@@ -358,6 +475,9 @@ class FMeasure(PyEvALLMetric):
 
 
 class ICM(PyEvALLMetric):   
+    #Maximum number of sets of classes with the information content memoized
+    INFORMATION_CONTENT_CACHE_SIZE = 100000
+    
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.ICM.value, "Information Contrast model", "ICM", evaluation_id)
         #parameters icm
@@ -368,9 +488,19 @@ class ICM(PyEvALLMetric):
         #data structures for probabilities
         self.gold_freq= dict() 
         self.gold_prob= dict()      
+        #hierarchy of the test case, with the classes of gold not included in the hierarchy of the evaluation
+        self.hierarchy= None
+        self.hierarchy_index= None
+        #LRU cache of the information content of the sets of classes during the evaluation. The entries are 
+        #shared by the test cases with the same context, that is, probabilities of the classes and hierarchy
+        self.information_content_cache= OrderedDict()
+        self.information_content_contexts= dict()
+        self.information_content_context= None
         
         
     def generate_prob(self, comparator):
+        self.hierarchy = comparator.hierarchy
+        self.hierarchy_index = comparator.hierarchy_index
         #Mono label classification
         if comparator.proporties[comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL]:
             #Flat classification
@@ -395,10 +525,11 @@ class ICM(PyEvALLMetric):
                 raise NotImplementedError("Please Implement this method")
             else:  
                 #check for classses not included in hierarchy   
-                comparator.gold_df.apply(lambda row: self.check_class_not_in_hierachy(row, comparator.hierarchy), axis=1)           
+                self.hierarchy = self.extend_hierarchy(comparator)
+                self.hierarchy_index = self.hierarchy_index.extend(self.hierarchy)
                 gold_size = len(comparator.gold_df)
                 
-                self.calculate_prob_hierarchy_multi_labe(comparator.hierarchy, comparator)           
+                self.calculate_prob_hierarchy_multi_labe(comparator)           
                 for c in self.gold_freq:
                     self.gold_prob[c]= self.gold_freq[c]/gold_size  
     
@@ -436,53 +567,39 @@ class ICM(PyEvALLMetric):
             gold_set=gold_row[PyEvALLFormat.VALUE]  
             
         for c in gold_set:
-            if not self.is_child(hierarchy, c):
+            if c not in hierarchy and not self.hierarchy_index.contains(c):
                 hierarchy[c]=[]     
     
     
-    def calculate_prob_hierarchy_multi_labe(self, hierarchy,comparator):
-        if len(hierarchy)==0:
-            return 0
-        
-        if isinstance(hierarchy, dict):
-            for c in hierarchy:
-                freq_c = sum(comparator.gold_df.apply(lambda row: self.belgons_item_to_class_or_subclass(row, c, hierarchy[c]), axis=1).tolist())
-                self.gold_freq[c]=freq_c
-                self.calculate_prob_hierarchy_multi_labe(hierarchy[c], comparator)
-                
-        elif isinstance(hierarchy, list):
-            for c in hierarchy:
-                freq_c = sum(comparator.gold_df.apply(lambda row: self.belgons_item_to_class_or_subclass(row, c, []), axis=1).tolist())
-                self.gold_freq[c]=freq_c        
-        
+    #Copy of the hierarchy with the classes of gold not included in it added to the first level. The hierarchy 
+    #of the evaluation is shared by all the test cases and metrics, so it is never modified.
+    def extend_hierarchy(self, comparator):
+        hierarchy = dict(comparator.hierarchy)
+        comparator.gold_df.apply(lambda row: self.check_class_not_in_hierachy(row, hierarchy), axis=1)
+        return hierarchy
     
-    def belgons_item_to_class_or_subclass(self, gold_row, clas, hierarchy):
-        gold_set=[]
-        if np.isscalar(gold_row[PyEvALLFormat.VALUE]):
-            gold_set.append(gold_row[PyEvALLFormat.VALUE])
-        else:
-            gold_set=gold_row[PyEvALLFormat.VALUE]
-            
-        if clas in gold_set:
-            return 1
-        else:
-            for c in gold_set:
-                if self.is_child(hierarchy, c):
-                    return 1
-        return 0        
-        
-        
-    def is_child(self, hierarchy, child):
-        if isinstance(hierarchy, dict):
-            exist = False
-            for c in hierarchy:
-                if c ==child:
-                    return True
-                else:
-                    exist= exist or self.is_child(hierarchy[c], child)
-            return exist    
-        elif isinstance(hierarchy, list):
-            return child in hierarchy   
+    
+    #Frequency of each class of the hierarchy, the number of instances of gold with the class or any of its 
+    #subclasses. Each label marks all its ancestors in the instance, and each class is counted once per instance.
+    def calculate_prob_hierarchy_multi_labe(self, comparator):
+        encoding = comparator.encoding
+        num_nodes = len(self.hierarchy_index.names)
+        label_ancestors = [self.hierarchy_index.get_ancestor_ids(label) for label in encoding.labels[:encoding.num_gold_labels]]
+        label_sizes = np.array([len(ancestors) for ancestors in label_ancestors], dtype=np.int64)
+        label_offsets = np.concatenate(([0], np.cumsum(label_sizes)[:-1])).astype(np.int64)
+        ancestors = np.concatenate(label_ancestors + [np.zeros(0, dtype=np.int64)]).astype(np.int64)
+        
+        #Pairs of instance and ancestor of each label of gold
+        sizes = label_sizes[encoding.gold_labels]
+        starts = np.repeat(label_offsets[encoding.gold_labels] - np.cumsum(sizes) + sizes, sizes)
+        nodes = ancestors[starts + np.arange(len(starts))]
+        rows = np.repeat(encoding.gold_label_rows.astype(np.int64), sizes)
+        pairs = np.unique(rows*num_nodes + nodes)
+        freq = np.bincount(pairs%num_nodes, minlength=num_nodes)
+        
+        for node_id, c in enumerate(self.hierarchy_index.names):
+            self.gold_freq[c]=int(freq[node_id])
+
    
   
     ######################################################################
@@ -502,7 +619,13 @@ class ICM(PyEvALLMetric):
          
         self.generate_prob(comparator) 
         
-        result_icm = comparator.gold_df.apply(lambda row: self.calculate_icm_row(row,comparator), axis=1).tolist()
+        self.information_content_context = self.get_information_content_context(comparator)
+        if comparator.proporties[comparator.COMPARATOR_PROPERTY_CLASSIFICATION_MONOLABEL] and comparator.hierarchy==None:
+            result_icm = self.calculate_icm_flat_mono_label(comparator)
+        else:
+            gold_values = comparator.gold_df[PyEvALLFormat.VALUE].tolist()
+            pred_values = comparator.get_pred_values_aligned()
+            result_icm = [self.calculate_icm_row(gold_value, pred_value, comparator) for gold_value, pred_value in zip(gold_values, pred_values)]
 
         gold_size = len(comparator.gold_df)
         average = sum(result_icm)/gold_size
@@ -524,21 +647,36 @@ class ICM(PyEvALLMetric):
         return False 
     
     
-    def calculate_icm_row(self, gold_row, comparator):
-        pred_row= comparator.pred_df[comparator.pred_df[PyEvALLFormat.ID] == gold_row[PyEvALLFormat.ID]]
+    #In flat mono label classification the ICM of an instance only depends on its pair of gold and predicted 
+    #classes, so it is computed once for each cell of the contingency table, with an extra column for the 
+    #instances without prediction, and assigned to the instances of the cell.
+    def calculate_icm_flat_mono_label(self, comparator):
+        encoding = comparator.encoding
+        pred_positions, missing_pred = comparator.get_alignment()
+        size = len(encoding.labels)
+        pred_codes = np.full(len(pred_positions), size, dtype=np.int64)
+        pred_codes[~missing_pred] = encoding.pred_labels[pred_positions[~missing_pred]]
+        cells, inverse = np.unique(encoding.gold_labels.astype(np.int64)*(size+1) + pred_codes, return_inverse=True)
+        
+        labels = encoding.labels.tolist() + [None]
+        result_cells = np.array([self.calculate_icm_row(labels[cell//(size+1)], labels[cell%(size+1)], comparator) for cell in cells.tolist()])
+        return result_cells[inverse.reshape(-1)].tolist()
+    
+    
+    def calculate_icm_row(self, gold_value, pred_value, comparator):
         pred_set=[]
         gold_set=[]        
 
-        if not pred_row.empty:
-            if np.isscalar(pred_row[PyEvALLFormat.VALUE].tolist()[0]):
-                pred_set.append(pred_row[PyEvALLFormat.VALUE].tolist()[0])
+        if not pred_value is None:
+            if np.isscalar(pred_value):
+                pred_set.append(pred_value)
             else:
-                pred_set=pred_row[PyEvALLFormat.VALUE].tolist()[0]
+                pred_set=pred_value
             
-        if np.isscalar(gold_row[PyEvALLFormat.VALUE]):
-            gold_set.append(gold_row[PyEvALLFormat.VALUE])
+        if np.isscalar(gold_value):
+            gold_set.append(gold_value)
         else:
-            gold_set=gold_row[PyEvALLFormat.VALUE]
+            gold_set=gold_value
         
         union_set= list(set(pred_set) | set(gold_set))         
         return self.alpha_1*self.information_content(pred_set, comparator) + self.alpha_2*self.information_content(gold_set, comparator) - self.beta*self.information_content(union_set, comparator)
@@ -548,8 +686,29 @@ class ICM(PyEvALLMetric):
         size = len(classes)
         if size==0:
             return 0
-        return self.get_prob_class(classes[0],comparator) + self.information_content(classes[1:size],comparator) - \
+        
+        #The sets are memoized in the order of their classes, since the recursion depends on it
+        key = (self.information_content_context, tuple(classes))
+        cache = self.information_content_cache
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        
+        value = self.get_prob_class(classes[0],comparator) + self.information_content(classes[1:size],comparator) - \
         self.information_content(self.calculate_set_deepest_common_ancestor( classes[0], classes[1:size], comparator), comparator)
+        
+        cache[key] = value
+        if len(cache)>self.INFORMATION_CONTENT_CACHE_SIZE:
+            cache.popitem(last=False)
+        return value
+    
+    
+    #Identifier of the values of the information content in the test case. They depend on the probabilities of the 
+    #classes, the size of gold for the classes without probability and the hierarchy with the classes of gold.
+    def get_information_content_context(self, comparator):
+        paths = None if self.hierarchy_index==None else tuple(self.hierarchy_index.paths)
+        context = (frozenset(self.gold_prob.items()), len(comparator.gold_df), paths)
+        return self.information_content_contexts.setdefault(context, len(self.information_content_contexts))
                     
     
     def get_prob_class(self, clas,comparator):
@@ -568,39 +727,19 @@ class ICM(PyEvALLMetric):
      
     def calculate_set_deepest_common_ancestor(self, clas, classes, comparator):
         deepest_common_ancestors=[]   
+        if self.hierarchy_index==None or not self.hierarchy_index.contains(clas):
+            return deepest_common_ancestors
             
         for c in classes:
-            parents_a= self.get_parents_dict(comparator.hierarchy, clas)
-            parents_b= self.get_parents_dict(comparator.hierarchy, c)
-            if parents_a==None or parents_b==None:
+            if not self.hierarchy_index.contains(c):
                 continue
-            #intersection list parents, only common are save
-            common= [ e for e in parents_a if e in parents_b ]
-            size= len(common)
-            #select only the deepest parent
-            common = common[size-1:]
+            #select only the deepest common parent
+            ancestor = self.hierarchy_index.get_deepest_common_ancestor(clas, c)
+            common = [] if ancestor==None else [ancestor]
             #Union with previous deepest parents
             deepest_common_ancestors= list(set(deepest_common_ancestors) | set(common))
 
         return deepest_common_ancestors      
-        
-        
-    def get_parents_dict(self, nested_dict, value):
-        if nested_dict == value:
-            return [nested_dict]
-        elif isinstance(nested_dict, dict):
-            for k, v in nested_dict.items():
-                if k == value:
-                    return [k]
-                p = self.get_parents_dict(v, value)
-                if p:
-                    return [k] + p
-        elif isinstance(nested_dict, list):
-            lst = nested_dict
-            for i in range(len(lst)):
-                p = self.get_parents_dict(lst[i], value)
-                if p:
-                    return p        
                 
                 
                 
@@ -608,6 +747,16 @@ class ICM(PyEvALLMetric):
 class ICMNorm(PyEvALLMetric):       
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.ICMNorm.value, "Normalized Information Contrast Model", "ICM-Norm", evaluation_id)
+        #Cache of the information content shared by the ICM of the predictions and the gold of all the test cases
+        self.information_content_cache= OrderedDict()
+        self.information_content_contexts= dict()
+        
+        
+    def get_icm(self):
+        icm = ICM(self.evaluation_id)
+        icm.information_content_cache = self.information_content_cache
+        icm.information_content_contexts = self.information_content_contexts
+        return icm
        
     
     def evaluate(self, comparator, **params):   
@@ -616,20 +765,14 @@ class ICMNorm(PyEvALLMetric):
             return
         
         #Evaluate ICM pred vs gold
-        icm = ICM(self.evaluation_id)
+        icm = self.get_icm()
         icm.evaluate(comparator, **params)
         res_pred= 0
         if PyEvALLReport.AVERAGE_TAG in icm.result:
             res_pred = icm.result[PyEvALLReport.AVERAGE_TAG] 
                    
         #Evaluate ICM gold vs gold  
-        comp_gold = PyEvALLComparator(comparator.gold_df, comparator.gold_df, comparator.get_testcase(), self.evaluation_id)
-        comp_gold.hierarchy= comparator.hierarchy
-        icm = ICM(self.evaluation_id)
-        icm.evaluate(comp_gold, **params)
-        res_gold=0
-        if PyEvALLReport.AVERAGE_TAG in icm.result:
-            res_gold=icm.result[PyEvALLReport.AVERAGE_TAG]
+        res_gold = self.evaluate_gold(comparator, **params)
         
         #Calculate ICM Norm and truncate to 0 if the value is less than 0.
         icm_norm= (float(res_pred) - (res_gold*-1))/(res_gold-(res_gold*-1))
@@ -637,6 +780,28 @@ class ICMNorm(PyEvALLMetric):
             icm_norm=0
 
         self.result[PyEvALLReport.AVERAGE_TAG]=icm_norm
+        
+        
+    #The ICM of gold vs gold only depends on the gold, the hierarchy and the parameters of ICM, so it is computed 
+    #once and shared by the evaluations of the same gold standard.
+    def evaluate_gold(self, comparator, **params):
+        icm = self.get_icm()
+        icm_params = [params.get(p, getattr(icm, p)) for p in ["alpha_1", "alpha_2", "beta"]]
+        key = PyEvALLGoldScores.get_key(comparator.get_testcase(), self.class_name, comparator.hierarchy, icm_params)
+        if comparator.gold_scores!=None and comparator.gold_scores.contains(key):
+            return comparator.gold_scores.get(key)
+        
+        comp_gold = PyEvALLComparator(comparator.gold_df, comparator.gold_df, comparator.get_testcase(), self.evaluation_id)
+        comp_gold.hierarchy= comparator.hierarchy
+        comp_gold.hierarchy_index= comparator.hierarchy_index
+        icm.evaluate(comp_gold, **params)
+        res_gold=0
+        if PyEvALLReport.AVERAGE_TAG in icm.result:
+            res_gold=icm.result[PyEvALLReport.AVERAGE_TAG]
+            
+        if comparator.gold_scores!=None:
+            comparator.gold_scores.set(key, res_gold)
+        return res_gold
 
         
     def fire_preconditions(self, comparator):
@@ -672,6 +837,9 @@ class ICMSoft(PyEvALLMetric):
         self.gold_average= dict()
         self.gold_deviation= dict()
         self.lst_classes= []  
+        #hierarchy of the test case, with the classes of gold not included in the hierarchy of the evaluation
+        self.hierarchy= None
+        self.hierarchy_index= None
 
   
     ######################################################################
@@ -680,12 +848,15 @@ class ICMSoft(PyEvALLMetric):
     #                                                                    #
     ######################################################################      
     def get_list_classes(self, comparator):
+        self.hierarchy = comparator.hierarchy
+        self.hierarchy_index = comparator.hierarchy_index
         if comparator.hierarchy==None:
             comparator.gold_df[PyEvALLFormat.VALUE].apply(lambda value: self.search_classes(value))
         else:
             #check for classses not included in hierarchy   
-            comparator.gold_df.apply(lambda row: self.check_class_not_in_hierachy(row, comparator.hierarchy), axis=1)            
-            self.get_classes_hierarchy(comparator.hierarchy)
+            self.hierarchy = self.extend_hierarchy(comparator)
+            self.hierarchy_index = self.hierarchy_index.extend(self.hierarchy)
+            self.get_classes_hierarchy(self.hierarchy)
             
     
     def search_classes(self, value):
@@ -703,21 +874,17 @@ class ICMSoft(PyEvALLMetric):
             gold_set=gold_row[PyEvALLFormat.VALUE]  
             
         for c in gold_set:
-            if not self.is_child(hierarchy, c):
+            if c not in hierarchy and not self.hierarchy_index.contains(c):
                 hierarchy[c]=[]      
        
-                        
-    def is_child(self, hierarchy, child):
-        if isinstance(hierarchy, dict):
-            exist = False
-            for c in hierarchy:
-                if c ==child:
-                    return True
-                else:
-                    exist= exist or self.is_child(hierarchy[c], child)
-            return exist    
-        elif isinstance(hierarchy, list):
-            return child in hierarchy 
+    
+    #Copy of the hierarchy with the classes of gold not included in it added to the first level. The hierarchy 
+    #of the evaluation is shared by all the test cases and metrics, so it is never modified.
+    def extend_hierarchy(self, comparator):
+        hierarchy = dict(comparator.hierarchy)
+        comparator.gold_df.apply(lambda row: self.check_class_not_in_hierachy(row, hierarchy), axis=1)
+        return hierarchy
+
             
             
     def get_classes_hierarchy(self, hierarchy):
@@ -735,7 +902,7 @@ class ICMSoft(PyEvALLMetric):
         gold_df_extended= comparator.gold_df.copy()
         
         if not comparator.hierarchy==None:          
-            gold_df_extended[PyEvALLFormat.VALUE] = gold_df_extended[PyEvALLFormat.VALUE].apply(lambda row: self.propagate_max_weigth_ancestors(row.copy(), comparator.hierarchy, None))
+            gold_df_extended[PyEvALLFormat.VALUE] = gold_df_extended[PyEvALLFormat.VALUE].apply(lambda row: self.propagate_max_weigth_ancestors(row.copy(), self.hierarchy, None))
         
         gold_df_extended[self.lst_classes] =gold_df_extended[PyEvALLFormat.VALUE].apply(lambda row: self.expand_df(row))
         gold_df_extended = gold_df_extended.drop(PyEvALLFormat.VALUE, axis=1)
@@ -809,7 +976,9 @@ class ICMSoft(PyEvALLMetric):
         self.get_list_classes(comparator)
         self.calculate_probabilities(comparator)
         
-        result_icm_soft = comparator.gold_df.apply(lambda row: self.calculate_icm_row(row, comparator), axis=1).tolist()
+        gold_values = comparator.gold_df[PyEvALLFormat.VALUE].tolist()
+        pred_values = comparator.get_pred_values_aligned()
+        result_icm_soft = [self.calculate_icm_row(gold_value, pred_value, comparator) for gold_value, pred_value in zip(gold_values, pred_values)]
         gold_size = len(comparator.gold_df)
         average = sum(result_icm_soft)/gold_size
         
@@ -824,17 +993,16 @@ class ICMSoft(PyEvALLMetric):
         return False     
     
         
-    def calculate_icm_row(self, gold_row, comparator):
-        pred_row= comparator.pred_df[comparator.pred_df[PyEvALLFormat.ID] == gold_row[PyEvALLFormat.ID]]
+    def calculate_icm_row(self, gold_value, pred_value, comparator):
         pred_set=[]
         gold_set=[]
         
-        if not pred_row.empty:
-            pred_dict = pred_row[PyEvALLFormat.VALUE].tolist()[0]
+        if not pred_value is None:
+            pred_dict = pred_value
             for c in pred_dict:
                 pred_set.append((c,pred_dict[c]))
         
-        gold_dict = gold_row[PyEvALLFormat.VALUE]
+        gold_dict = gold_value
         for c in gold_dict:
             gold_set.append((c,gold_dict[c]))           
         
@@ -890,18 +1058,17 @@ class ICMSoft(PyEvALLMetric):
         
     
     def calculate_set_deepest_common_ancestor(self, clas, classes, comparator):
-        deepest_common_ancestors=[]           
+        deepest_common_ancestors=[]
+        if self.hierarchy_index==None or not self.hierarchy_index.contains(clas[0]):
+            return deepest_common_ancestors
+                   
         for c in classes:
-            parents_a= self.get_parents_dict(comparator.hierarchy, clas[0])
-            parents_b= self.get_parents_dict(comparator.hierarchy, c[0])
-            if parents_a==None or parents_b==None:
+            if not self.hierarchy_index.contains(c[0]):
                 continue
-            #intersection list parents, only common are save
-            common= [ e for e in parents_a if e in parents_b ]
-            size= len(common)
-            #select only the deepest parent 
-            if size!=0:
-                tupla=(common[size-1:][0], min(clas[1], c[1]))
+            #select only the deepest common parent 
+            ancestor = self.hierarchy_index.get_deepest_common_ancestor(clas[0], c[0])
+            if ancestor!=None:
+                tupla=(ancestor, min(clas[1], c[1]))
                 common = [tupla]
                 #Union with previous deepest parents
                 deepest_common_ancestors= self.union_soft(deepest_common_ancestors, common) 
@@ -909,24 +1076,6 @@ class ICMSoft(PyEvALLMetric):
         return deepest_common_ancestors
 
 
-    def get_parents_dict(self, nested_dict, value):
-        if nested_dict == value:
-            return [nested_dict]
-        elif isinstance(nested_dict, dict):
-            for k, v in nested_dict.items():
-                if k == value:
-                    return [k]
-                p = self.get_parents_dict(v, value)
-                if p:
-                    return [k] + p
-        elif isinstance(nested_dict, list):
-            lst = nested_dict
-            for i in range(len(lst)):
-                p = self.get_parents_dict(lst[i], value)
-                if p:
-                    return p   
-
-
 
 
 class ICMSoftNorm(PyEvALLMetric):       
@@ -947,13 +1096,7 @@ class ICMSoftNorm(PyEvALLMetric):
             res_pred = icm_soft.result[PyEvALLReport.AVERAGE_TAG]        
             
         #Evaluate ICM gold vs gold       
-        comp_gold = PyEvALLComparator(comparator.gold_df, comparator.gold_df, comparator.get_testcase(), self.evaluation_id)
-        comp_gold.hierarchy= comparator.hierarchy
-        icm_soft = ICMSoft(self.evaluation_id)
-        icm_soft.evaluate(comp_gold, **params)
-        res_gold=0
-        if PyEvALLReport.AVERAGE_TAG in icm_soft.result:
-            res_gold=icm_soft.result[PyEvALLReport.AVERAGE_TAG]
+        res_gold = self.evaluate_gold(comparator, **params)
         
         #Calculate ICM Norm and truncate to 0 if the value is less than 0.
         icm_norm= (float(res_pred) - (res_gold*-1))/(res_gold-(res_gold*-1))
@@ -961,6 +1104,28 @@ class ICMSoftNorm(PyEvALLMetric):
             icm_norm=0
 
         self.result[PyEvALLReport.AVERAGE_TAG]=icm_norm
+        
+        
+    #The ICM Soft of gold vs gold only depends on the gold, the hierarchy and the parameters of ICM Soft, so it is 
+    #computed once and shared by the evaluations of the same gold standard.
+    def evaluate_gold(self, comparator, **params):
+        icm_soft = ICMSoft(self.evaluation_id)
+        icm_params = [params.get(p, getattr(icm_soft, p)) for p in ["alpha_1", "alpha_2", "beta"]]
+        key = PyEvALLGoldScores.get_key(comparator.get_testcase(), self.class_name, comparator.hierarchy, icm_params)
+        if comparator.gold_scores!=None and comparator.gold_scores.contains(key):
+            return comparator.gold_scores.get(key)
+        
+        comp_gold = PyEvALLComparator(comparator.gold_df, comparator.gold_df, comparator.get_testcase(), self.evaluation_id)
+        comp_gold.hierarchy= comparator.hierarchy
+        comp_gold.hierarchy_index= comparator.hierarchy_index
+        icm_soft.evaluate(comp_gold, **params)
+        res_gold=0
+        if PyEvALLReport.AVERAGE_TAG in icm_soft.result:
+            res_gold=icm_soft.result[PyEvALLReport.AVERAGE_TAG]
+            
+        if comparator.gold_scores!=None:
+            comparator.gold_scores.set(key, res_gold)
+        return res_gold
 
         
     def fire_preconditions(self, comparator):
@@ -1026,7 +1191,9 @@ class CrossEntropy(PyEvALLMetric):
         gold_df = comparator.gold_df.copy() 
         self.smooth_and_normalize_data(gold_df, pred_df)           
         
-        result_cross_entropy = gold_df.apply(lambda row: self.calculate_cross_entropy_instance(row, pred_df), axis=1).tolist()
+        gold_values = gold_df[PyEvALLFormat.VALUE].tolist()
+        pred_values = comparator.get_pred_values_aligned(pred_df)
+        result_cross_entropy = [self.calculate_cross_entropy_instance(gold_value, pred_value) for gold_value, pred_value in zip(gold_values, pred_values)]
         gold_size = len(gold_df)
         average = sum(result_cross_entropy)/gold_size
         
@@ -1043,14 +1210,12 @@ class CrossEntropy(PyEvALLMetric):
         return False 
 
 
-    def calculate_cross_entropy_instance(self, gold_row, pred_df):
-        pred_row= pred_df[pred_df[PyEvALLFormat.ID] == gold_row[PyEvALLFormat.ID]]
-        
+    def calculate_cross_entropy_instance(self, gold_value, pred_value):
         pred_dict=[]
-        if not pred_row.empty:
-            pred_dict = pred_row[PyEvALLFormat.VALUE].tolist()[0]
+        if not pred_value is None:
+            pred_dict = pred_value
         
-        gold_dict = gold_row[PyEvALLFormat.VALUE]
+        gold_dict = gold_value
        
         cross_entropy_instance=0.0
         for c in gold_dict:
@@ -1076,18 +1241,6 @@ class MAE(PyEvALLMetric):
             if c not in self.lst_classes:
                 self.lst_classes.append(c)  
 
-    def expand_df(self, value):
-        gold_dict = value
-        new_columns=[]
-        for c in self.lst_classes:
-            if c in gold_dict:
-                new_columns.append(gold_dict[c])
-            else:
-                new_columns.append(0.0)
-
-        return pd.Series(new_columns, index=[self.lst_classes])  
-
-    #We need to expand the dataframe
     def evaluate(self, comparator, **params):   
         self.logger.info("Executing MAE evaluation method")
         #Check preconditions of the metric
@@ -1096,14 +1249,11 @@ class MAE(PyEvALLMetric):
         
         self.get_list_classes(comparator)        
         
-        #copy dataframe modify it
-        gold_df_extended= comparator.gold_df.copy()  
-        gold_df_extended[self.lst_classes] =gold_df_extended[PyEvALLFormat.VALUE].apply(lambda row: self.expand_df(row))
-        gold_df_extended = gold_df_extended.drop(PyEvALLFormat.VALUE, axis=1)         
-        
         number_classes= len(self.lst_classes)
-        result_mae = gold_df_extended.apply(lambda row: self.calculate_mae_instance(row, comparator.pred_df, number_classes), axis=1).tolist()
-        gold_size = len(gold_df_extended)
+        gold_values = comparator.gold_df[PyEvALLFormat.VALUE].tolist()
+        pred_values = comparator.get_pred_values_aligned()
+        result_mae = [self.calculate_mae_instance(gold_value, pred_value, number_classes) for gold_value, pred_value in zip(gold_values, pred_values)]
+        gold_size = len(gold_values)
         average = sum(result_mae)/gold_size
         
         self.result[PyEvALLReport.AVERAGE_TAG]=average  
@@ -1119,24 +1269,19 @@ class MAE(PyEvALLMetric):
         return False 
 
 
-    def calculate_mae_instance(self, gold_row, pred_df, number_classes):    
-        pred_row= pred_df[pred_df[PyEvALLFormat.ID] == gold_row[PyEvALLFormat.ID]]
+    def calculate_mae_instance(self, gold_value, pred_value, number_classes):    
         mae_instance=0.0        
-           
-        for ind, column in enumerate(gold_row.index):
-            if column==PyEvALLFormat.ID or column==PyEvALLFormat.TEST_CASE:
-                continue
-            
+        
+        #Each class of the gold is a column, classes not in the instance have score 0.0   
+        for column in self.lst_classes:
+            score_gold= gold_value[column] if column in gold_value else 0.0
             score_pred= 0
-            if not pred_row.empty:
-                pred_dict=pred_row[PyEvALLFormat.VALUE].tolist()[0]
-                if column in pred_dict: 
-                    score_pred= pred_row[PyEvALLFormat.VALUE].tolist()[0][column]            
-            mae_instance= mae_instance+ abs(gold_row[column]-score_pred)
+            if not pred_value is None:
+                if column in pred_value: 
+                    score_pred= pred_value[column]            
+            mae_instance= mae_instance+ abs(score_gold-score_pred)
             
-            
-            
-        if ind>0:
+        if number_classes>0:
             mae_instance=mae_instance/number_classes
             
         return mae_instance
@@ -1152,6 +1297,9 @@ class PrecisionAtK(PyEvALLMetric):
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.PrecisionAtK.value, "Precision at k", "P@k", evaluation_id)    
         self.k_param=10     
+        self.sweep_param="k_param"
+        self.sweep_acronym="P@{}"
+        self.batch_evaluation=True
 
 
     def evaluate(self, comparator, **params):   
@@ -1161,13 +1309,40 @@ class PrecisionAtK(PyEvALLMetric):
             return   
               
         self.k_param = params.get("k_param", self.k_param)                 
-        p_at_k=None
-        relevants = comparator.get_first_k_relevant_items_in_pred(self.k_param)
-        if self.k_param!=0:
-            p_at_k = relevants/self.k_param
+        p_at_k=self.calculate_precision_at_k(comparator, self.k_param)
 
         self.result[PyEvALLReport.AVERAGE_TAG]=p_at_k
         self.logger.debug("Precision at k for the testcase %s is: %s", comparator.get_testcase(), p_at_k)        
+        
+        
+    def evaluate_sweep(self, comparator, lst_values, **params):
+        self.logger.info("Executing Precision at K evaluation method for k in %s", lst_values)
+        if self.fire_preconditions(comparator):
+            return None
+        return [self.calculate_precision_at_k(comparator, k) for k in lst_values]
+        
+        
+    def calculate_precision_at_k(self, comparator, k):
+        p_at_k=None
+        relevants = comparator.get_first_k_relevant_items_in_pred(k)
+        if k!=0:
+            p_at_k = relevants/k
+        return p_at_k
+    
+    
+    def evaluate_batch(self, batch, **params):
+        return self.evaluate_sweep_batch(batch, [params.get("k_param", self.k_param)])[0]
+    
+    
+    def evaluate_sweep_batch(self, batch, lst_values, **params):
+        #The relevant items of every cutoff are read from the same cumulative array
+        lst_results = []
+        for k in lst_values:
+            if k==0:
+                lst_results.append([None]*batch.size)
+            else:
+                lst_results.append((batch.get_value_at_cutoff(batch.cum_relevants, batch.offsets, k)/k).tolist())
+        return lst_results
                 
                 
     def fire_preconditions(self, comparator):
@@ -1184,6 +1359,7 @@ class PrecisionAtK(PyEvALLMetric):
 class RPrecision(PyEvALLMetric):       
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.RPrecision.value, "R Precision", "RPre", evaluation_id)    
+        self.batch_evaluation=True
 
 
     def evaluate(self, comparator, **params):   
@@ -1200,6 +1376,12 @@ class RPrecision(PyEvALLMetric):
 
         self.result[PyEvALLReport.AVERAGE_TAG]=r_p
         self.logger.debug("R Precision for the testcase %s is: %s", comparator.get_testcase(), r_p)        
+        
+        
+    def evaluate_batch(self, batch, **params):
+        lst_k = batch.get_all_relevants_items_in_gold()
+        lst_relevants = batch.get_first_k_relevant_items_in_pred(lst_k)
+        return [relevants/param_k if param_k!=0 else None for relevants, param_k in zip(lst_relevants.tolist(), lst_k.tolist())]
                 
                 
     def fire_preconditions(self, comparator):
@@ -1216,6 +1398,7 @@ class RPrecision(PyEvALLMetric):
 class MRR(PyEvALLMetric):    
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.MRR.value, "Mean Reciprocal Rank", "MRR", evaluation_id)    
+        self.batch_evaluation=True
 
     def evaluate(self, comparator, **params):   
         self.logger.info("Executing Main Reciprocal Rank evaluation method")
@@ -1234,6 +1417,13 @@ class MRR(PyEvALLMetric):
 
         self.result[PyEvALLReport.AVERAGE_TAG]=mmr
         self.logger.debug("MRR for the testcase %s is: %s", comparator.get_testcase(), mmr)        
+        
+        
+    def evaluate_batch(self, batch, **params):
+        lst_relevants_gold = batch.get_all_relevants_items_in_gold().tolist()
+        lst_positions = batch.get_position_first_relevant_in_pred().tolist()
+        return [(1/position if position!=0 else 0) if relevants_gold>0 else None 
+                for position, relevants_gold in zip(lst_positions, lst_relevants_gold)]
                 
                 
     def fire_preconditions(self, comparator):
@@ -1251,6 +1441,9 @@ class MAP(PyEvALLMetric):
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.MAP.value, "Mean Average Precision", "MAP", evaluation_id) 
         self.r_param=1000   
+        self.sweep_param="r_param"
+        self.sweep_acronym="MAP@{}"
+        self.batch_evaluation=True
 
 
     def evaluate(self, comparator, **params):   
@@ -1260,22 +1453,52 @@ class MAP(PyEvALLMetric):
             return   
         
         self.r_param = params.get("r_param", self.r_param)         
+        map=self.calculate_map(comparator, self.calculate_sum_precision(comparator), self.r_param)
+
+        self.result[PyEvALLReport.AVERAGE_TAG]=map
+        self.logger.debug("MAP for the testcase %s is: %s", comparator.get_testcase(), map)        
+        
+        
+    def evaluate_sweep(self, comparator, lst_values, **params):
+        self.logger.info("Executing MAP evaluation method for r in %s", lst_values)
+        if self.fire_preconditions(comparator):
+            return None
+        sum_precision = self.calculate_sum_precision(comparator)
+        return [self.calculate_map(comparator, sum_precision, r) for r in lst_values]
+    
+    
+    #Cumulative sum of the precision at each position k with a relevant item
+    def calculate_sum_precision(self, comparator):
+        _, _, relevants, cum_relevants = comparator.get_ranking_arrays()
+        precisions = cum_relevants/np.arange(1, len(relevants)+1)
+        return np.cumsum(np.where(relevants, precisions, 0.0))
+        
+        
+    def calculate_map(self, comparator, sum_precision, r):
         relevants_in_gold= comparator.get_all_relevants_items_in_gold()   
-        lst_ids_pred_sorted = comparator.get_list_ids_ordered_pred() 
-        threshold = min(self.r_param,len(lst_ids_pred_sorted))
-        sumPrecision=0
-        
-        for k in range(0,threshold):
-            relevants_in_k= comparator.get_first_k_relevant_items_in_pred(k+1)
-            if comparator.is_relevant_item_with_id_in_gold(lst_ids_pred_sorted[k]):
-                sumPrecision+=relevants_in_k/(k+1)
+        threshold = max(0, min(r,len(sum_precision)))
+        sumPrecision = 0 if threshold==0 else float(sum_precision[threshold-1])
              
         map=None
         if relevants_in_gold!=None and relevants_in_gold!=0:
-            map = sumPrecision/relevants_in_gold            
-
-        self.result[PyEvALLReport.AVERAGE_TAG]=map
-        self.logger.debug("MAP for the testcase %s is: %s", comparator.get_testcase(), map)        
+            map = sumPrecision/relevants_in_gold   
+        return map         
+    
+    
+    def evaluate_batch(self, batch, **params):
+        return self.evaluate_sweep_batch(batch, [params.get("r_param", self.r_param)])[0]
+    
+    
+    def evaluate_sweep_batch(self, batch, lst_values, **params):
+        precisions = batch.cum_relevants/batch.positions
+        sum_precision = batch.accumulate(np.where(batch.relevants, precisions, 0.0), batch.offsets)
+        lst_relevants_gold = batch.get_all_relevants_items_in_gold().tolist()
+        lst_results = []
+        for r in lst_values:
+            lst_sum = batch.get_value_at_cutoff(sum_precision, batch.offsets, max(0, r)).tolist()
+            lst_results.append([sumPrecision/relevants_gold if relevants_gold!=0 else None 
+                                for sumPrecision, relevants_gold in zip(lst_sum, lst_relevants_gold)])
+        return lst_results
               
                 
     def fire_preconditions(self, comparator):
@@ -1292,6 +1515,7 @@ class MAP(PyEvALLMetric):
 class DCG(PyEvALLMetric):     
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.DCG.value, "Discounted Cumulative Gain", "DCG", evaluation_id)   
+        self.batch_evaluation=True
 
 
     def evaluate(self, comparator, **params):   
@@ -1300,26 +1524,67 @@ class DCG(PyEvALLMetric):
         if self.fire_preconditions(comparator):
             return   
         
-        values_gold= comparator.get_dict_values_gold_by_id()  
-        lst_ids_pred_sorted = comparator.get_list_ids_ordered_pred() 
-        threshold = len(lst_ids_pred_sorted)        
-        
         #check if there are relevants elements in the gold
         if comparator.get_all_relevants_items_in_gold()>0:
-            dcg=0
-            for k in range(0,threshold):
-                id_pred = lst_ids_pred_sorted[k]
-                if id_pred in values_gold:
-                    log_item= math.log10((k+1)+1)/math.log10(2)
-                    if not (log_item==0):
-                        numerator= pow(2, values_gold[id_pred])-1
-                        dcg= dcg + (numerator/log_item)
-
+            dcg=self.calculate_dcg_pred(comparator)
         else:
             dcg=None
             
         self.result[PyEvALLReport.AVERAGE_TAG]=dcg
         self.logger.debug("DCG for the testcase %s is: %s", comparator.get_testcase(), dcg)        
+        
+        
+    @staticmethod
+    def calculate_dcg_pred(comparator, cutoff=None):
+        return DCG.get_value_at_cutoff(DCG.calculate_cum_dcg_pred(comparator), cutoff)
+    
+    
+    @staticmethod
+    def calculate_dcg_perfect_rank(comparator, cutoff=None):
+        return DCG.get_value_at_cutoff(DCG.calculate_cum_dcg_perfect_rank(comparator), cutoff)
+    
+    
+    #DCG at each position of the ranking of predictions
+    @staticmethod
+    def calculate_cum_dcg_pred(comparator):
+        gold_values, in_gold, _, _ = comparator.get_ranking_arrays()
+        discounts = comparator.get_ranking_discounts(len(gold_values))
+        return np.cumsum(np.where(in_gold, (np.power(2.0, gold_values)-1)/discounts, 0.0))
+    
+    
+    #DCG at each position of the perfect ranking
+    @staticmethod
+    def calculate_cum_dcg_perfect_rank(comparator):
+        gains = comparator.get_gains_perfect_rank_gold()
+        discounts = comparator.get_ranking_discounts(len(gains))
+        return np.cumsum(gains/discounts)
+    
+    
+    #DCG at each position of the rankings of predictions of a batch
+    @staticmethod
+    def calculate_cum_dcg_pred_batch(batch):
+        discounts = batch.get_discounts(batch.positions)
+        return batch.accumulate(np.where(batch.in_gold, (np.power(2.0, batch.gold_values)-1)/discounts, 0.0), batch.offsets)
+    
+    
+    #DCG at each position of the perfect rankings of a batch
+    @staticmethod
+    def calculate_cum_dcg_perfect_rank_batch(batch):
+        gains = np.power(2.0, batch.perfect_values)-1
+        return batch.accumulate(gains/batch.get_discounts(batch.gold_positions), batch.gold_offsets)
+    
+    
+    def evaluate_batch(self, batch, **params):
+        lst_dcg = batch.get_value_at_cutoff(DCG.calculate_cum_dcg_pred_batch(batch), batch.offsets).tolist()
+        lst_relevants_gold = batch.get_all_relevants_items_in_gold().tolist()
+        return [dcg if relevants_gold>0 else None for dcg, relevants_gold in zip(lst_dcg, lst_relevants_gold)]
+    
+    
+    #Value of a cumulative array at the position cutoff, None for the whole array.
+    @staticmethod
+    def get_value_at_cutoff(cum_values, cutoff):
+        size = len(cum_values) if cutoff==None else max(0, min(cutoff, len(cum_values)))
+        return 0 if size==0 else float(cum_values[size-1])
               
                 
     def fire_preconditions(self, comparator):
@@ -1336,6 +1601,10 @@ class DCG(PyEvALLMetric):
 class nDCG(PyEvALLMetric):    
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.nDCG.value, "Normalized Discounted Cumulative Gain", "nDCG", evaluation_id)   
+        self.cutoff_param=None
+        self.sweep_param="cutoff_param"
+        self.sweep_acronym="nDCG@{}"
+        self.batch_evaluation=True
 
 
     def evaluate(self, comparator, **params):   
@@ -1344,40 +1613,48 @@ class nDCG(PyEvALLMetric):
         if self.fire_preconditions(comparator):
             return   
         
+        self.cutoff_param = params.get("cutoff_param", self.cutoff_param)
         #Calculamos dcg sobre el ranking normal.
-        values_gold= comparator.get_dict_values_gold_by_id()  
-        lst_ids_pred_sorted = comparator.get_list_ids_ordered_pred() 
-        threshold = len(lst_ids_pred_sorted)
-        sum_dcg=0
-        
-        for k in range(0,threshold):
-            id_pred = lst_ids_pred_sorted[k]
-            if id_pred in values_gold:
-                log_item= math.log10((k+1)+1)/math.log10(2)
-                if not (log_item==0):
-                    numerator= pow(2, values_gold[id_pred])-1
-                    sum_dcg= sum_dcg + (numerator/log_item)
-        
+        sum_dcg=DCG.calculate_dcg_pred(comparator, self.cutoff_param)
         
         #Calculate dcg over the perfect ranking
-        perfect_ranking = comparator.get_list_perfect_rank_gold() 
-        threshold = len(perfect_ranking)
-        sum_idcg=0
-        
-        for k in range(0,threshold):
-            id_pred = perfect_ranking[k]
-            if id_pred in values_gold:
-                log_item= math.log10((k+1)+1)/math.log10(2)
-                if not (log_item==0):
-                    numerator= pow(2, values_gold[id_pred])-1
-                    sum_idcg= sum_idcg + (numerator/log_item)        
+        sum_idcg=DCG.calculate_dcg_perfect_rank(comparator, self.cutoff_param)
              
-        ndcg=None
-        if not (sum_idcg==0):
-            ndcg=sum_dcg/sum_idcg            
+        ndcg=self.calculate_ndcg(sum_dcg, sum_idcg)
 
         self.result[PyEvALLReport.AVERAGE_TAG]=ndcg
         self.logger.debug("nDCG for the testcase %s is: %s", comparator.get_testcase(), ndcg)   
+        
+        
+    def evaluate_sweep(self, comparator, lst_values, **params):
+        self.logger.info("Executing nDCG evaluation method for cutoffs in %s", lst_values)
+        if self.fire_preconditions(comparator):
+            return None
+        cum_dcg = DCG.calculate_cum_dcg_pred(comparator)
+        cum_idcg = DCG.calculate_cum_dcg_perfect_rank(comparator)
+        return [self.calculate_ndcg(DCG.get_value_at_cutoff(cum_dcg, k), DCG.get_value_at_cutoff(cum_idcg, k)) for k in lst_values]
+    
+    
+    def calculate_ndcg(self, sum_dcg, sum_idcg):
+        ndcg=None
+        if not (sum_idcg==0):
+            ndcg=sum_dcg/sum_idcg
+        return ndcg  
+    
+    
+    def evaluate_batch(self, batch, **params):
+        return self.evaluate_sweep_batch(batch, [params.get("cutoff_param", self.cutoff_param)])[0]
+    
+    
+    def evaluate_sweep_batch(self, batch, lst_values, **params):
+        cum_dcg = DCG.calculate_cum_dcg_pred_batch(batch)
+        cum_idcg = DCG.calculate_cum_dcg_perfect_rank_batch(batch)
+        lst_results = []
+        for k in lst_values:
+            lst_dcg = batch.get_value_at_cutoff(cum_dcg, batch.offsets, k).tolist()
+            lst_idcg = batch.get_value_at_cutoff(cum_idcg, batch.gold_offsets, k).tolist()
+            lst_results.append([self.calculate_ndcg(sum_dcg, sum_idcg) for sum_dcg, sum_idcg in zip(lst_dcg, lst_idcg)])
+        return lst_results
              
                 
     def fire_preconditions(self, comparator):
@@ -1393,6 +1670,10 @@ class nDCG(PyEvALLMetric):
 class ERR(PyEvALLMetric):    
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.ERR.value, "Expected Reciprocal Rank", "ERR", evaluation_id)   
+        self.cutoff_param=None
+        self.sweep_param="cutoff_param"
+        self.sweep_acronym="ERR@{}"
+        self.batch_evaluation=True
 
 
     def evaluate(self, comparator, **params):   
@@ -1401,43 +1682,76 @@ class ERR(PyEvALLMetric):
         if self.fire_preconditions(comparator):
             return   
         
+        self.cutoff_param = params.get("cutoff_param", self.cutoff_param)
         #if there are no relevants in gold it makes no sense calculate the metric
         relevants_in_gold= comparator.get_all_relevants_items_in_gold()  
         if relevants_in_gold==None or relevants_in_gold==0:
             self.result[PyEvALLReport.AVERAGE_TAG]=None
             return 
        
+        #ERR@k only considers the first k items of the ranking
+        err = DCG.get_value_at_cutoff(self.calculate_cum_err(comparator), self.cutoff_param)
+
+        self.result[PyEvALLReport.AVERAGE_TAG]=err
+        self.logger.debug("ERR for the testcase %s is: %s", comparator.get_testcase(), err)   
+        
+        
+    def evaluate_sweep(self, comparator, lst_values, **params):
+        self.logger.info("Executing ERR evaluation method for cutoffs in %s", lst_values)
+        if self.fire_preconditions(comparator):
+            return None
+        relevants_in_gold= comparator.get_all_relevants_items_in_gold()  
+        if relevants_in_gold==None or relevants_in_gold==0:
+            return [None]*len(lst_values)
+        cum_err = self.calculate_cum_err(comparator)
+        return [DCG.get_value_at_cutoff(cum_err, k) for k in lst_values]
+    
+    
+    #ERR at each position of the ranking of predictions
+    def calculate_cum_err(self, comparator):
         # get the max value in the gold     
-        values_gold= comparator.get_dict_values_gold_by_id()
-        perfect_rank= comparator.get_list_perfect_rank_gold()
-        maxValue = 0 if len(perfect_rank)==0 else values_gold[perfect_rank[0]] 
+        gold_values, in_gold, _, _ = comparator.get_ranking_arrays()
+        maxValue = int(comparator.gold_df[PyEvALLFormat.VALUE].max())
         powMaxValue =0
         if maxValue>0:
             powMaxValue= pow(2, maxValue)
-        lst_ids_pred_sorted = comparator.get_list_ids_ordered_pred()
-         
         
-        err=0
-        for k in range(0,len(lst_ids_pred_sorted)):
-            id_pred = lst_ids_pred_sorted[k]
-            RELk = 0
-            errMulti=1
-            if id_pred in values_gold:
-                for j in range(0,k):
-                    RELi=0
-                    id_pred_j = lst_ids_pred_sorted[j]
-                    if id_pred_j in values_gold:
-                        if powMaxValue!=0.0:
-                            RELi = (pow(2, values_gold[id_pred_j])-1)/powMaxValue
-                    errMulti= errMulti*(1-RELi);
-                if powMaxValue!=0.0:
-                    RELk = (pow(2, values_gold[id_pred])-1)/powMaxValue;
-                    
-            err=err +(RELk/(float)(k+1))* errMulti;                     
-
-
-        self.result[PyEvALLReport.AVERAGE_TAG]=err
-        self.logger.debug("ERR for the testcase %s is: %s", comparator.get_testcase(), err)   
+        #Probability of relevance of each item
+        rel = np.zeros(len(gold_values))
+        if powMaxValue!=0.0:
+            rel = np.where(in_gold, (np.power(2.0, gold_values)-1)/powMaxValue, 0.0)
+        
+        #Probability of reaching each item: product of (1-RELi) of the previous items
+        errMulti = np.concatenate(([1.0], np.cumprod(1-rel)[:-1]))
+        return np.cumsum((rel/np.arange(1, len(rel)+1))*errMulti)
+    
+    
+    def evaluate_batch(self, batch, **params):
+        return self.evaluate_sweep_batch(batch, [params.get("cutoff_param", self.cutoff_param)])[0]
+    
+    
+    def evaluate_sweep_batch(self, batch, lst_values, **params):
+        cum_err = self.calculate_cum_err_batch(batch)
+        lst_relevants_gold = batch.get_all_relevants_items_in_gold().tolist()
+        lst_results = []
+        for k in lst_values:
+            lst_err = batch.get_value_at_cutoff(cum_err, batch.offsets, None if k==None else max(0, k)).tolist()
+            lst_results.append([err if relevants_gold!=0 else None for err, relevants_gold in zip(lst_err, lst_relevants_gold)])
+        return lst_results
+    
+    
+    #ERR at each position of the rankings of predictions of a batch
+    def calculate_cum_err_batch(self, batch):
+        max_values = batch.max_gold_values[batch.query]
+        powMaxValues = np.where(max_values>0, np.power(2.0, max_values), 1.0)
+        rel = np.where(batch.in_gold & (max_values>0), (np.power(2.0, batch.gold_values)-1)/powMaxValues, 0.0)
+        
+        #Probability of reaching each item: product of (1-RELi) of the previous items of the query
+        cum_multi = batch.accumulate(1-rel, batch.offsets, np.multiply, 1.0)
+        errMulti = np.ones(len(rel))
+        not_first = np.flatnonzero(batch.positions>1)
+        errMulti[not_first] = cum_multi[not_first-1]
+        return batch.accumulate((rel/batch.positions)*errMulti, batch.offsets)
              
                 
     def fire_preconditions(self, comparator):
@@ -1454,6 +1768,9 @@ class RBP(PyEvALLMetric):
     def __init__(self, evaluation_id):
         super().__init__(MetricFactory.RBP.value, "Rank Biased Precision", "RBP", evaluation_id)   
         self.p_param=0.8 
+        self.sweep_param="p_param"
+        self.sweep_acronym="RBP(p={})"
+        self.batch_evaluation=True
 
 
     def evaluate(self, comparator, **params):   
@@ -1469,20 +1786,46 @@ class RBP(PyEvALLMetric):
             self.result[PyEvALLReport.AVERAGE_TAG]=None
             return 
        
-        # get the max value in the gold     
-        values_gold= comparator.get_dict_values_gold_by_id()
-        lst_ids_pred_sorted = comparator.get_list_ids_ordered_pred()       
-        
-        rbpAux=0
-        for k in range(0,len(lst_ids_pred_sorted)):
-            id_pred = lst_ids_pred_sorted[k]            
-            posI= k+1;
-            if id_pred in values_gold:
-                rbpAux = rbpAux + values_gold[id_pred]* pow(self.p_param, posI-1)
-                    
-        rbp = (1-self.p_param)*rbpAux;   
+        rbp = self.calculate_rbp(comparator, self.p_param)
         self.result[PyEvALLReport.AVERAGE_TAG]=rbp
         self.logger.debug("RBP for the testcase %s is: %s", comparator.get_testcase(), rbp)   
+        
+        
+    def evaluate_sweep(self, comparator, lst_values, **params):
+        self.logger.info("Executing RBP evaluation method for p in %s", lst_values)
+        if self.fire_preconditions(comparator):
+            return None
+        relevants_in_gold= comparator.get_all_relevants_items_in_gold()  
+        if relevants_in_gold==None or relevants_in_gold==0:
+            return [None]*len(lst_values)
+        return [self.calculate_rbp(comparator, p) for p in lst_values]
+    
+    
+    def calculate_rbp(self, comparator, p):
+        gold_values, in_gold, _, _ = comparator.get_ranking_arrays()
+        #Powers computed with pow to keep the same precision as the sequential definition
+        persistence = np.array([pow(p, k) for k in range(len(gold_values))], dtype=np.float64)
+        rbpAux = np.cumsum(np.where(in_gold, gold_values*persistence, 0.0))
+        rbpAux = 0 if len(rbpAux)==0 else float(rbpAux[-1])
+                    
+        return (1-p)*rbpAux
+    
+    
+    def evaluate_batch(self, batch, **params):
+        return self.evaluate_sweep_batch(batch, [params.get("p_param", self.p_param)])[0]
+    
+    
+    def evaluate_sweep_batch(self, batch, lst_values, **params):
+        #Matrix of persistences with a column per value of p, the gains of each query are added in order of position
+        size = int(batch.positions.max()) if len(batch.positions)>0 else 0
+        persistence = np.array([[pow(p, k) for p in lst_values] for k in range(size)], dtype=np.float64).reshape(size, len(lst_values))
+        gains = np.where(batch.in_gold[:, None], batch.gold_values[:, None]*persistence[batch.positions-1], 0.0)
+        lst_relevants_gold = batch.get_all_relevants_items_in_gold().tolist()
+        lst_results = []
+        for column, p in enumerate(lst_values):
+            lst_rbp = np.bincount(batch.query, weights=gains[:, column], minlength=batch.size).tolist()
+            lst_results.append([(1-p)*rbpAux if relevants_gold!=0 else None for rbpAux, relevants_gold in zip(lst_rbp, lst_relevants_gold)])
+        return lst_results
              
                 
     def fire_preconditions(self, comparator):
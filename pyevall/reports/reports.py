@@ -23,6 +23,7 @@
 #
 # ============================================================================== 
 import jsbeautifier
+import copy
 import json
 from pyevall.utils.utils import PyEvALLUtils
 import pandas as pd
@@ -96,6 +97,9 @@ class PyEvALLReport(object):
     FORMAT_DIFFERENTE_TYPES_IN_VALUE_FIELD_ERROR="FORMAT_DIFFERENTE_TYPES_IN_VALUE_FIELD_ERROR"
     FORMAT_DIFFERENT_TYPES_IN_VALUE_GOLD_AND_PRED="FORMAT_DIFFERENT_TYPES_IN_VALUE_GOLD_AND_PRED"
     
+    #TAGS Execution errors
+    EXECUTION_WORKER_ERROR="EXECUTION_WORKER_ERROR"
+    
     
     def __init__(self):
         '''  '''
@@ -177,9 +181,25 @@ class PyEvALLReport(object):
                 self.report[self.FILES_TAG][file_name][self.ERRORS_TAG][warning][self.STATUS_TAG]= self.STOP if stop_error==True else self.CONTINUE
                 self.report[self.FILES_TAG][file_name][self.STATUS_TAG]=self.WARNING          
         else:
-            raise Exception("Imposible error")  
+            raise Exception("Imposible error")
+
+
+    def merge_file_report(self, file_name, file_report):
+        if file_name in self.report[self.FILES_TAG]:
+            errors = self.report[self.FILES_TAG][file_name][self.ERRORS_TAG]
+            for error in file_report[self.ERRORS_TAG]:
+                if not error in errors:
+                    errors[error]=copy.deepcopy(file_report[self.ERRORS_TAG][error])
+                else:
+                    for tag in (self.LINES_TAG, self.TEST_CASES_TAG):
+                        if tag in file_report[self.ERRORS_TAG][error]:
+                            errors[error][tag].extend(file_report[self.ERRORS_TAG][error][tag])
+            if not file_report[self.STATUS_TAG]==self.OK:
+                self.report[self.FILES_TAG][file_name][self.STATUS_TAG]=file_report[self.STATUS_TAG]
+        else:
+            raise Exception("Imposible error")
+
 
-        
     ##########################################
     #                                        #
     #            BUILDING METRICS REPORT     #
@@ -443,17 +463,17 @@ class PyEvALLDataframeReport(PyEvALLReport):
     def generate_df_test_case(self, row, metrics_section): 
         df_dict, df_dict_classes= self.parse_metrics_section_for_tc(row[PyEvALLReport.FILES_TAG], metrics_section)  
         for tc in df_dict:
-            if self.df_test_case==None:
+            if self.df_test_case is None:
                 self.df_test_case = pd.DataFrame(df_dict[tc], index=[0])
             else:
-                self.df_test_case = self.df_test_case.append(df_dict[tc], ignore_index = True) 
+                self.df_test_case = pd.concat([self.df_test_case, pd.DataFrame(df_dict[tc], index=[0])], ignore_index = True) 
                 
         if not len(df_dict_classes)==0 :
             for tc in df_dict_classes:
-                if self.df_test_case_classes==None:
+                if self.df_test_case_classes is None:
                     self.df_test_case_classes = pd.DataFrame(df_dict_classes[tc], index=[0])
                 else:
-                    self.df_test_case_classes = self.df_test_case_classes.append(df_dict_classes[tc], ignore_index = True) 
+                    self.df_test_case_classes = pd.concat([self.df_test_case_classes, pd.DataFrame(df_dict_classes[tc], index=[0])], ignore_index = True) 
                   
     
     def parse_metrics_section_for_tc(self, file, metrics_section):
@@ -26,20 +26,38 @@ import os
 import tempfile
 import uuid
 import logging.config
+import contextvars
+import threading
+import types
+import numpy as np
 from distutils.command.config import config
 
+#Lock of the initialization of the logging configuration of the process
+_LOGGING_LOCK = threading.Lock()
+
+
+
 class PyEvALLUtils(object):   
     dirname = os.path.dirname(__file__)
     LOG_FILENAME = os.path.join(dirname, 'file.conf' )   
     PYEVALL_KEYS_TEXTS_REPORTS=os.path.join(dirname, 'pyevall_keys_texts_reports.rep' )
     MODULE_NAME="pyevall.metrics.metrics" 
     TEMP_FOLDER_EXECUTION= os.path.join(tempfile.gettempdir(), "pyevall_"+str(uuid.uuid4()))
+    #Version of PyEvALL, also read by setup.py
+    VERSION="0.1.78"
 
 
     #PARAMS
     PARAM_HIERARCHY = "hierarchy"
     PARAM_REPORT = "report" #options: "embedded", "dataframe"
     PARAM_LOG_LEVEL="log_level"
+    PARAM_EXECUTION="execution" #options: "serial", "parallel"
+    PARAM_NUM_WORKERS="num_workers"
+    PARAM_VALIDATION="validation" #options: "fast", "strict"
+    PARAM_GOLD_CACHE="gold_cache" #folder of the persistent cache of gold standards, None to disable it
+    
+    #Compiled index of the hierarchy, built from the parameter hierarchy
+    HIERARCHY_INDEX="hierarchy_index"
     
     #OPTIONS PARAMS
     PARAM_OPTION_REPORT_SIMPLE= "simple"    
@@ -48,7 +66,22 @@ class PyEvALLUtils(object):
     PARAM_OPTION_LOG_LEVEL_DEBUG="debug"
     PARAM_OPTION_LOG_LEVEL_INFO="info"
     PARAM_OPTION_LOG_LEVEL_NONE="none"
-    CONFIGURATION=dict()
+    PARAM_OPTION_EXECUTION_SERIAL="serial"
+    PARAM_OPTION_EXECUTION_PARALLEL="parallel"
+    PARAM_OPTION_VALIDATION_FAST="fast"
+    PARAM_OPTION_VALIDATION_STRICT="strict"
+    #Read-only configuration of each active evaluation by id. It is stored in a context variable, so evaluations 
+    #executed in different threads (or asyncio tasks) never see the configuration of each other.
+    CONFIGURATION=contextvars.ContextVar("pyevall_configuration", default=types.MappingProxyType(dict()))
+    
+    #LOGGING
+    LOGGER_NAME="pyevall"
+    LOGGING_INITIALIZED=False
+    LOG_LEVELS={
+                PARAM_OPTION_LOG_LEVEL_DEBUG:logging.DEBUG,
+                PARAM_OPTION_LOG_LEVEL_INFO:logging.INFO,
+                PARAM_OPTION_LOG_LEVEL_NONE:logging.CRITICAL+1
+        }
     #Default evaluation configuration
     #CONFIGURATION={
     #            PARAM_HIERARCHY:None,
@@ -167,49 +200,93 @@ class PyEvALLUtils(object):
     
     @classmethod
     def load_configuration(cls, evaluation_id, **params):
-        conf = PyEvALLUtils.get_active_configuration(evaluation_id)      
+        conf = dict(PyEvALLUtils.get_active_configuration(evaluation_id))
         
         if PyEvALLUtils.PARAM_HIERARCHY in params:
-            conf[PyEvALLUtils.PARAM_HIERARCHY]=params[PyEvALLUtils.PARAM_HIERARCHY]        
+            conf[PyEvALLUtils.PARAM_HIERARCHY]=cls.freeze_hierarchy(params[PyEvALLUtils.PARAM_HIERARCHY])
+            conf[PyEvALLUtils.HIERARCHY_INDEX]=PyEvALLHierarchy.compile(conf[PyEvALLUtils.PARAM_HIERARCHY])
         if PyEvALLUtils.PARAM_REPORT in params:
             conf[PyEvALLUtils.PARAM_REPORT]=params[PyEvALLUtils.PARAM_REPORT]                       
         if PyEvALLUtils.PARAM_LOG_LEVEL in params:
             conf[PyEvALLUtils.PARAM_LOG_LEVEL]=params[PyEvALLUtils.PARAM_LOG_LEVEL]
+        if PyEvALLUtils.PARAM_EXECUTION in params:
+            conf[PyEvALLUtils.PARAM_EXECUTION]=params[PyEvALLUtils.PARAM_EXECUTION]
+        if PyEvALLUtils.PARAM_NUM_WORKERS in params:
+            conf[PyEvALLUtils.PARAM_NUM_WORKERS]=params[PyEvALLUtils.PARAM_NUM_WORKERS]
+        if PyEvALLUtils.PARAM_VALIDATION in params:
+            conf[PyEvALLUtils.PARAM_VALIDATION]=params[PyEvALLUtils.PARAM_VALIDATION]
+        if PyEvALLUtils.PARAM_GOLD_CACHE in params:
+            conf[PyEvALLUtils.PARAM_GOLD_CACHE]=params[PyEvALLUtils.PARAM_GOLD_CACHE]
+        
+        #The configurations are never modified, a new mapping is set in the context of the evaluation
+        configurations = dict(cls.CONFIGURATION.get())
+        configurations[evaluation_id]= types.MappingProxyType(conf)
+        cls.CONFIGURATION.set(types.MappingProxyType(configurations))
          
             
     @classmethod    
     def get_active_configuration(cls, evaluation_id):
-        if not evaluation_id in PyEvALLUtils.CONFIGURATION:
-            conf={
+        conf = cls.CONFIGURATION.get().get(evaluation_id)
+        if conf==None:
+            conf=types.MappingProxyType({
                         cls.PARAM_HIERARCHY:None,
                         cls.PARAM_REPORT:cls.PARAM_OPTION_REPORT_SIMPLE,
-                        cls.PARAM_LOG_LEVEL:cls.PARAM_OPTION_LOG_LEVEL_INFO               
-                } 
-            PyEvALLUtils.CONFIGURATION[evaluation_id]= conf
-        return PyEvALLUtils.CONFIGURATION[evaluation_id]             
+                        cls.PARAM_LOG_LEVEL:cls.PARAM_OPTION_LOG_LEVEL_INFO,
+                        cls.PARAM_EXECUTION:cls.PARAM_OPTION_EXECUTION_SERIAL,
+                        cls.PARAM_NUM_WORKERS:None,
+                        cls.PARAM_VALIDATION:cls.PARAM_OPTION_VALIDATION_FAST,
+                        cls.PARAM_GOLD_CACHE:None,
+                        cls.HIERARCHY_INDEX:None               
+                })
+        return conf             
 
 
     @classmethod
     def remove_active_configuration(cls, evaluation_id):
-        if evaluation_id in cls.CONFIGURATION:
-            cls.CONFIGURATION.pop(evaluation_id)
+        configurations = cls.CONFIGURATION.get()
+        if evaluation_id in configurations:
+            configurations = dict(configurations)
+            configurations.pop(evaluation_id)
+            cls.CONFIGURATION.set(types.MappingProxyType(configurations))
+            
+            
+    @classmethod
+    def freeze_hierarchy(cls, hierarchy):
+        #Read-only copy of the hierarchy, so that the metrics can not modify the hierarchy of the user or share
+        #changes between evaluations.
+        if isinstance(hierarchy, dict):
+            return PyEvALLFrozenDict((c, cls.freeze_hierarchy(hierarchy[c])) for c in hierarchy)
+        elif isinstance(hierarchy, list):
+            return PyEvALLFrozenList(cls.freeze_hierarchy(c) for c in hierarchy)
+        return hierarchy
+    
     
     
+    @classmethod
+    def init_logging(cls):
+        #The logging configuration is loaded only once per process, the level of each evaluation is applied by 
+        #the PyEvALLLoggerAdapter of its loggers.
+        #the lock avoids that two threads reload the handlers while the other is logging
+        if not cls.LOGGING_INITIALIZED:
+            with _LOGGING_LOCK:
+                if not cls.LOGGING_INITIALIZED:
+                    logging.config.fileConfig(PyEvALLUtils.LOG_FILENAME, disable_existing_loggers=False)
+                    logging.getLogger(cls.LOGGER_NAME).setLevel(logging.DEBUG)
+                    cls.LOGGING_INITIALIZED=True
+    
     
     @classmethod
     def get_logger(cls, name, evaluation_id):
-        logging.config.fileConfig(PyEvALLUtils.LOG_FILENAME, disable_existing_loggers=False)        
-        logger= logging.getLogger(name) 
-        conf = PyEvALLUtils.get_active_configuration(evaluation_id)  
-        if conf[cls.PARAM_LOG_LEVEL]==cls.PARAM_OPTION_LOG_LEVEL_NONE:
-            logging.getLogger().removeHandler(logging.getLogger().handlers[0]) 
-            hl= logging.NullHandler()
-            logger.addHandler(hl)
-        elif conf[cls.PARAM_LOG_LEVEL]==cls.PARAM_OPTION_LOG_LEVEL_DEBUG:
-            logger.setLevel(logging.DEBUG)
-        elif conf[cls.PARAM_LOG_LEVEL]==cls.PARAM_OPTION_LOG_LEVEL_INFO:
-            logger.setLevel(logging.INFO)
-        return logger  
+        cls.init_logging()
+        return PyEvALLLoggerAdapter(logging.getLogger(name), evaluation_id)
+    
+    
+    @classmethod
+    def get_log_level(cls, evaluation_id):
+        conf = cls.CONFIGURATION.get().get(evaluation_id)
+        if conf==None:
+            return logging.INFO
+        return cls.LOG_LEVELS.get(conf[cls.PARAM_LOG_LEVEL], logging.INFO)
     
     
     @classmethod
@@ -242,6 +319,156 @@ class PyEvALLUtils(object):
 
 
 
-   
-       
-        
\ No newline at end of file
+class PyEvALLLoggerAdapter(logging.LoggerAdapter):
+    """
+    Logger of an evaluation. The messages are filtered with the log level of the evaluation, so that several 
+    evaluations with different levels share the same loggers and handlers. The message is only formatted if 
+    the level is enabled.
+    """
+    def __init__(self, logger, evaluation_id):
+        super().__init__(logger, None)
+        self.evaluation_id = evaluation_id
+        
+        
+    def isEnabledFor(self, level):
+        return level>=PyEvALLUtils.get_log_level(self.evaluation_id)
+
+
+
+
+class PyEvALLFrozenDict(dict):
+    """
+    Read-only dictionary of a frozen hierarchy.
+    """
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("The hierarchy of an evaluation can not be modified")
+    
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _readonly
+    
+    
+    def __reduce__(self):
+        return (PyEvALLFrozenDict, (dict(self),))
+    
+    
+    
+    
+class PyEvALLFrozenList(list):
+    """
+    Read-only list of a frozen hierarchy.
+    """
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("The hierarchy of an evaluation can not be modified")
+    
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+    
+    
+    def __reduce__(self):
+        return (PyEvALLFrozenList, (list(self),))
+    
+    
+    
+    
+class PyEvALLHierarchy(object):
+    """
+    Compiled index of a hierarchy of classes, built once per evaluation. Each class is a node identified by the 
+    order of its first occurrence in a depth-first walk of the hierarchy, with its depth, its parent, its path 
+    from the root and the bitset of its ancestors. As the ancestors of a node always have lower ids, the deepest 
+    common ancestor of two classes is the highest bit shared by their bitsets. If a class is repeated in the 
+    hierarchy, its first occurrence is indexed and the deepest common ancestors are computed on the paths.
+    """
+    def __init__(self, names, paths):
+        self.names = names
+        self.paths = paths
+        self.node_ids = {name:node_id for node_id, name in enumerate(names)}
+        ids = [[self.node_ids[c] for c in path] for path in paths]
+        self.path_ids = [np.unique(path) for path in ids]
+        self.depths = np.array([len(path)-1 for path in paths], dtype=np.int32)
+        self.parents = np.array([path[-2] if len(path)>1 else -1 for path in ids], dtype=np.int32)
+        self.ancestors = [sum(1<<node_id for node_id in set(path)) for path in ids]
+        #the bitsets are only valid if the path of each node extends the path of its parent
+        self.is_tree = all(len(set(path))==len(path) and (len(path)==1 or paths[path[-2]]==paths[node_id][:-1]) 
+                           for node_id, path in enumerate(ids))
+        
+        
+    @classmethod
+    def compile(cls, hierarchy):
+        if hierarchy==None:
+            return None
+        names = []
+        paths = []
+        seen = set()
+        cls.compile_level(hierarchy, (), names, paths, seen)
+        return cls(names, paths)
+    
+    
+    @classmethod
+    def compile_level(cls, hierarchy, path, names, paths, seen):
+        #The classes are visited in the same order than the recursive search of the paths of the ICM metrics
+        if isinstance(hierarchy, dict):
+            for c in hierarchy:
+                cls.add_node(c, path+(c,), names, paths, seen)
+                cls.compile_level(hierarchy[c], path+(c,), names, paths, seen)
+        elif isinstance(hierarchy, list):
+            for c in hierarchy:
+                cls.compile_level(c, path, names, paths, seen)
+        else:
+            cls.add_node(hierarchy, path+(hierarchy,), names, paths, seen)
+            
+    
+    @classmethod
+    def add_node(cls, name, path, names, paths, seen):
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+            paths.append(path)
+            
+            
+    def extend(self, classes):
+        #Copy of the index with the classes added to the first level of the hierarchy
+        classes = [c for c in dict.fromkeys(classes) if c not in self.node_ids]
+        if len(classes)==0:
+            return self
+        return PyEvALLHierarchy(self.names + classes, self.paths + [(c,) for c in classes])
+    
+    
+    def contains(self, name):
+        return name in self.node_ids
+    
+    
+    def get_path(self, name):
+        node_id = self.node_ids.get(name)
+        if node_id==None:
+            return None
+        return list(self.paths[node_id])
+    
+    
+    #Ids of the class and its ancestors, empty if the class is not in the hierarchy
+    def get_ancestor_ids(self, name):
+        node_id = self.node_ids.get(name)
+        if node_id==None:
+            return np.zeros(0, dtype=np.int64)
+        return self.path_ids[node_id]
+    
+    
+    def is_descendant(self, name, ancestor):
+        node_id = self.node_ids.get(name)
+        ancestor_id = self.node_ids.get(ancestor)
+        if node_id==None or ancestor_id==None or node_id==ancestor_id:
+            return False
+        return bool(self.ancestors[node_id]>>ancestor_id & 1)
+    
+    
+    def get_deepest_common_ancestor(self, name_a, name_b):
+        #None if the classes do not share any ancestor
+        node_a = self.node_ids[name_a]
+        node_b = self.node_ids[name_b]
+        if self.is_tree:
+            common = self.ancestors[node_a] & self.ancestors[node_b]
+            if common==0:
+                return None
+            return self.names[common.bit_length()-1]
+        path_b = self.paths[node_b]
+        common = [e for e in self.paths[node_a] if e in path_b]
+        if len(common)==0:
+            return None
+        return common[-1]
@@ -1,8 +1,14 @@
 from setuptools import setup
+import os
+import re
+
+#The version is defined only once, in the utilities of the package
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyevall', 'utils', 'utils.py'), encoding='utf-8') as f:
+    VERSION = re.search(r'^\s*VERSION\s*=\s*"([^"]+)"', f.read(), re.M).group(1)
 
 setup(
     name='PyEvALL',
-    version='0.1.78',
+    version=VERSION,
     description='PyEvALL (The Python library to Evaluate ALL) is a evaluation tool for information systems that allows assessing a wide range of metrics covering various evaluation contexts, including classification, ranking, or LeWiDi (Learning with disagreement).',
     long_description="""# PyEvALL\n PyEvALL (The Python library to Evaluate ALL) is an evaluation tool for information systems that allows assessing a wide range of metrics covering various evaluation contexts, including classification, ranking, or LeWiDi (Learning with disagreement). PyEvALL is designed based on the following concepts: (i) **persistence**, users can save evaluations and retrieve past evaluations; (ii) **replicability**, all evaluations are conducted using the same methodology, making them strictly comparable; (iii) **effectiveness**, all metrics are unified under measurement theory and have been doubly implemented and compared; (iv) **generalization**, achieved through the use of a standardized input format enabling users to evaluate all evaluation contexts.\n""",
     long_description_content_type='text/markdown',
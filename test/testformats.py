@@ -26,6 +26,12 @@ from pyevall.evaluation import PyEvALLEvaluation
 from pyevall.reports.reports import PyEvALLReport
 from pyevall.utils.utils import PyEvALLUtils
 from pyevall.metrics.metricfactory import MetricFactory
+from pyevall.comparators.formats import PyEvALLParser
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import json
+import tempfile
+import os
 
 HEADER = '\033[95m'
 OKBLUE = '\033[94m'
@@ -54,6 +60,7 @@ def test_format_json():
     #Test incorrect schema
     test_format_json_incorrect_schema_prediction()
     test_format_json_incorrect_schema_gold()
+    test_format_json_incorrect_schema_strict_validation()
     
     #Test duplicate id
     test_format_json_duplicates_ids_prediction()
@@ -64,6 +71,36 @@ def test_format_json():
     #Test ranking duplicate score in value
     test_format_ranking_duplicated_value()
     
+    #Test gold standard parsed once and shared
+    test_format_shared_goldstandard()
+    
+    #Test parallel evaluation of a list of predictions
+    test_format_parallel_evaluation()
+    
+    #Test concurrent evaluations in threads
+    test_format_concurrent_evaluation()
+    
+    #Test one instance shared by concurrent evaluations in threads
+    test_format_shared_instance_evaluation()
+    
+    #Test evaluation of predictions and gold standard in memory
+    test_format_in_memory_evaluation()
+    
+    #Test validation of the columns of DataFrames
+    test_format_in_memory_frame_schema()
+    
+    #Test integer encoding of ids and labels
+    test_format_encoding_ids_labels()
+    
+    #Test persistent cache of gold standards
+    test_format_gold_cache()
+    
+    #Test binary format
+    test_format_binary_evaluation()
+    
+    #Test scores of the gold standard against itself shared by the evaluations
+    test_format_gold_scores()
+    
 
     
 def test_format_json_incorrect_url_prediction():
@@ -219,6 +256,32 @@ def test_format_json_incorrect_schema_gold():
                     print(FAIL + "TEST FAILED" + ENDC)
                                         
                     
+def test_format_json_incorrect_schema_strict_validation():
+    eval = PyEvALLEvaluation()
+    params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
+    m = []
+    path="resources/format/json/"
+    #incorrect file and lines of the error with fast and strict validation
+    lst_pred=[("SCHEMA_INCORRECT.json", [2], [3]), ("SCHEMA_INCORRECT_EMPTY_LIST.json", [2], [2]), 
+              ("SCHEMA_INCORRECT_DICT_VALUE.json", [2], [2])]
+    file_gold="GOLD_MONO.json"
+    passed = True
+    for file_pred, lines_fast, lines_strict in lst_pred:
+        params[PyEvALLUtils.PARAM_VALIDATION]= PyEvALLUtils.PARAM_OPTION_VALIDATION_FAST
+        report_fast = eval.evaluate(path +file_pred, path + file_gold, m, **params).report
+        params[PyEvALLUtils.PARAM_VALIDATION]= PyEvALLUtils.PARAM_OPTION_VALIDATION_STRICT
+        report_strict = eval.evaluate(path +file_pred, path + file_gold, m, **params).report
+        error_fast = report_fast[PyEvALLReport.FILES_TAG][file_pred][PyEvALLReport.ERRORS_TAG].get(PyEvALLReport.FORMAT_INCORRECT_SCHEMA_JSON_ERROR)
+        error_strict = report_strict[PyEvALLReport.FILES_TAG][file_pred][PyEvALLReport.ERRORS_TAG].get(PyEvALLReport.FORMAT_INCORRECT_SCHEMA_JSON_ERROR)
+        if error_fast==None or error_strict==None or error_fast[PyEvALLReport.LINES_TAG]!=lines_fast or error_strict[PyEvALLReport.LINES_TAG]!=lines_strict:
+            passed = False
+    print("************** Testing json format: incorrect schema with fast and strict validation -- ", end=" ")
+    if passed:
+        print(OKGREEN + "TEST PASSED" + ENDC, ", files: ", len(lst_pred))
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+                                        
+                    
 def test_format_json_duplicates_ids_prediction():
     eval = PyEvALLEvaluation()
     params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
@@ -287,6 +350,228 @@ def test_format_ranking_duplicated_value():
                         print(FAIL + "TEST FAILED" + ENDC)   
                                             
 
+def test_format_shared_goldstandard():
+    eval = PyEvALLEvaluation()
+    params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
+    m = ["Accuracy"]
+    path="resources/format/json/"
+    file_pred="SYS_MONO.json"
+    file_gold="GOLD_MONO.json"
+    gold = eval.load_goldstandard(path + file_gold, **params)
+    report_shared = eval.evaluate_lst([path +file_pred, path +file_pred], gold, m, **params).report
+    report = eval.evaluate(path +file_pred, path + file_gold, m, **params).report
+    print("************** Testing shared gold standard: same evaluation -- ", end=" ")
+    for evaluation in report_shared:
+        if report_shared[evaluation]==report:
+            print(OKGREEN + "TEST PASSED" + ENDC, ", evaluation: ", evaluation)
+        else:
+            print(FAIL + "TEST FAILED" + ENDC)
+                                            
+
+def test_format_parallel_evaluation():
+    eval = PyEvALLEvaluation()
+    params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
+    m = ["Accuracy", "FMeasure"]
+    path="resources/format/json/"
+    lst_pred=[path + "SYS_MONO.json", path + "asdf", path + "SYS_DUPLICATE_IDS.json"]
+    file_gold="GOLD_MONO.json"
+    report_serial = eval.evaluate_lst(lst_pred, path + file_gold, m, **params).report
+    params[PyEvALLUtils.PARAM_EXECUTION]= PyEvALLUtils.PARAM_OPTION_EXECUTION_PARALLEL
+    params[PyEvALLUtils.PARAM_NUM_WORKERS]= 2
+    report_parallel = eval.evaluate_lst(lst_pred, path + file_gold, m, **params).report
+    print("************** Testing parallel evaluation: same meta report -- ", end=" ")
+    if list(report_serial)==list(report_parallel) and report_serial==report_parallel:
+        print(OKGREEN + "TEST PASSED" + ENDC, ", evaluations: ", len(report_parallel))
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+        
+        
+def test_format_concurrent_evaluation():
+    path="resources/format/json/"
+    hierarchy={"TRUE": ["B"]}
+    lst_evaluations=[(path + "SYS2.txt", path + "GOLD_MULTI.txt", ["ICM", "Precision"], {PyEvALLUtils.PARAM_HIERARCHY: hierarchy}),
+                     (path + "SYS2.txt", path + "GOLD_MULTI.txt", ["Precision", "Recall"], {PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_DEBUG}),
+                     (path + "SYS_MONO.json", path + "GOLD_MONO.json", ["Accuracy", "FMeasure"], {PyEvALLUtils.PARAM_REPORT: PyEvALLUtils.PARAM_OPTION_REPORT_EMBEDDED})]
+    
+    def evaluate(evaluation):
+        pred, gold, m, params = evaluation
+        params = dict(params)
+        params.setdefault(PyEvALLUtils.PARAM_LOG_LEVEL, PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE)
+        return PyEvALLEvaluation().evaluate(pred, gold, m, **params).report
+    
+    lst_serial = [evaluate(evaluation) for evaluation in lst_evaluations]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        lst_concurrent = list(executor.map(evaluate, lst_evaluations*4))
+    print("************** Testing concurrent evaluations: same reports and hierarchy not modified -- ", end=" ")
+    if lst_concurrent==lst_serial*4 and hierarchy=={"TRUE": ["B"]}:
+        print(OKGREEN + "TEST PASSED" + ENDC, ", evaluations: ", len(lst_concurrent))
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+        
+        
+def test_format_shared_instance_evaluation():
+    path="resources/format/json/"
+    lst_evaluations=[(path + "SYS2.txt", path + "GOLD_MULTI.txt", ["ICM", "Precision"], {PyEvALLUtils.PARAM_HIERARCHY: {"TRUE": ["B"]}}),
+                     (path + "SYS2.txt", path + "GOLD_MULTI.txt", ["Precision", "Recall"], {}),
+                     (path + "SYS_MONO.json", path + "GOLD_MONO.json", ["Accuracy", "FMeasure"], {PyEvALLUtils.PARAM_REPORT: PyEvALLUtils.PARAM_OPTION_REPORT_EMBEDDED})]
+    #One instance shared by all the threads
+    test = PyEvALLEvaluation()
+    
+    def evaluate(evaluation):
+        pred, gold, m, params = evaluation
+        params = dict(params)
+        params[PyEvALLUtils.PARAM_LOG_LEVEL] = PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE
+        return test.evaluate(pred, gold, m, **params).report
+    
+    lst_serial = [evaluate(evaluation) for evaluation in lst_evaluations]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        lst_concurrent = list(executor.map(evaluate, lst_evaluations*4))
+    print("************** Testing one instance shared by concurrent evaluations: same reports -- ", end=" ")
+    if lst_concurrent==lst_serial*4:
+        print(OKGREEN + "TEST PASSED" + ENDC, ", evaluations: ", len(lst_concurrent))
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+                                            
+                                            
+def test_format_in_memory_evaluation():
+    eval = PyEvALLEvaluation()
+    params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
+    m = ["Accuracy", "FMeasure"]
+    path="resources/format/json/"
+    file_pred="SYS_DUPLICATE_IDS.json"
+    file_gold="GOLD_MONO.json"
+    with open(path + file_pred, encoding='utf-8') as f:
+        pred = json.load(f)
+    with open(path + file_gold, encoding='utf-8') as f:
+        gold = json.load(f)
+    report = eval.evaluate(path +file_pred, path + file_gold, m, **params).report
+    report_records = eval.evaluate_records(pred, gold, m, **params).report
+    report_frames = eval.evaluate_frames(pd.DataFrame(pred), pd.DataFrame(gold), m, **params).report
+    print("************** Testing in-memory evaluation: same metrics and errors than files -- ", end=" ")
+    errors = report[PyEvALLReport.FILES_TAG][file_pred][PyEvALLReport.ERRORS_TAG]
+    errors_records = report_records[PyEvALLReport.FILES_TAG][PyEvALLParser.MEMORY_PRED_NAME][PyEvALLReport.ERRORS_TAG]
+    errors_frames = report_frames[PyEvALLReport.FILES_TAG][PyEvALLParser.MEMORY_PRED_NAME][PyEvALLReport.ERRORS_TAG]
+    if report_records[PyEvALLReport.METRIC_TAG]==report[PyEvALLReport.METRIC_TAG]==report_frames[PyEvALLReport.METRIC_TAG] and errors_records==errors==errors_frames:
+        print(OKGREEN + "TEST PASSED" + ENDC, ", metrics: ", len(report_records[PyEvALLReport.METRIC_TAG]))
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+        
+        
+def test_format_in_memory_frame_schema():
+    eval = PyEvALLEvaluation()
+    m = ["Accuracy"]
+    path="resources/format/json/"
+    with open(path + "GOLD_MONO.json", encoding='utf-8') as f:
+        gold = json.load(f)
+    #Records with a value and an id that do not conform to the schema
+    pred = [dict(record) for record in gold]
+    pred[2]["value"] = 1.5
+    pred[4]["id"] = None
+    lst_errors=[]
+    for validation in (PyEvALLUtils.PARAM_OPTION_VALIDATION_FAST, PyEvALLUtils.PARAM_OPTION_VALIDATION_STRICT):
+        params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE, PyEvALLUtils.PARAM_VALIDATION: validation}
+        report_records = eval.evaluate_records(pred, gold, m, **params).report
+        report_frames = eval.evaluate_frames(pd.DataFrame(pred), pd.DataFrame(gold), m, **params).report
+        lst_errors.append((report_records[PyEvALLReport.FILES_TAG][PyEvALLParser.MEMORY_PRED_NAME][PyEvALLReport.ERRORS_TAG],
+                           report_frames[PyEvALLReport.FILES_TAG][PyEvALLParser.MEMORY_PRED_NAME][PyEvALLReport.ERRORS_TAG]))
+    print("************** Testing schema of DataFrames: same error and record than the records -- ", end=" ")
+    if all(errors_records==errors_frames and len(errors_frames)>0 for errors_records, errors_frames in lst_errors):
+        print(OKGREEN + "TEST PASSED" + ENDC, ", errors: ", [errors_frames for errors_records, errors_frames in lst_errors])
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+                                            
+
+def test_format_encoding_ids_labels():
+    eval = PyEvALLEvaluation()
+    params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
+    gold = [{"test_case": "T1", "id": "1", "value": "B"}, {"test_case": "T1", "id": "2", "value": "A"}, 
+            {"test_case": "T1", "id": "3", "value": "B"}]
+    pred = [{"test_case": "T1", "id": "3", "value": "C"}, {"test_case": "T1", "id": "4", "value": "A"}]
+    goldstandard = eval.load_goldstandard(gold, **params)
+    encoding = goldstandard.get_encoding("T1").encode_predictions(pd.DataFrame(pred))
+    print("************** Testing integer encoding of ids and labels shared by gold and predictions -- ", end=" ")
+    if (list(encoding.decode_ids(encoding.gold_ids))==["1", "2", "3"] and list(encoding.decode_ids(encoding.pred_ids))==["3", "4"]
+            and list(encoding.pred_ids)==[2, 3] and list(encoding.gold_labels)==[0, 1, 0] and list(encoding.pred_labels)==[2, 1]
+            and list(encoding.decode_labels(encoding.pred_labels))==["C", "A"] and encoding.num_gold_labels==2 
+            and len(goldstandard.get_encoding("T1").ids)==3 and encoding.gold_ids.dtype=="int32"):
+        print(OKGREEN + "TEST PASSED" + ENDC)
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+                                            
+
+def test_format_gold_cache():
+    eval = PyEvALLEvaluation()
+    params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
+    m = ["Accuracy", "FMeasure"]
+    path="resources/metric/test/classification/"
+    file_pred="predictions/1/SYS1.txt"
+    file_gold="gold/1/GOLD1.txt"
+    report = eval.evaluate(path +file_pred, path + file_gold, m, **params).report
+    with tempfile.TemporaryDirectory() as cache:
+        params[PyEvALLUtils.PARAM_GOLD_CACHE]=cache
+        report_stored = eval.evaluate(path +file_pred, path + file_gold, m, **params).report
+        report_cached = eval.evaluate(path +file_pred, path + file_gold, m, **params).report
+        entries = os.listdir(cache)
+    print("************** Testing gold cache: same evaluation from the cache -- ", end=" ")
+    if report_stored==report==report_cached and len(entries)==1:
+        print(OKGREEN + "TEST PASSED" + ENDC, ", entries: ", len(entries))
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+                                            
+
+def test_format_binary_evaluation():
+    eval = PyEvALLEvaluation()
+    params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
+    m = ["Accuracy", "FMeasure", "ICM"]
+    path="resources/format/json/"
+    file_pred="SYS2.txt"
+    file_gold="GOLD_MULTI.txt"
+    report = eval.evaluate(path +file_pred, path + file_gold, m, **params).report
+    with tempfile.TemporaryDirectory() as folder:
+        binary_pred = os.path.join(folder, "SYS2.npz")
+        binary_gold = os.path.join(folder, "GOLD_MULTI.npz")
+        eval.convert_to_binary(path + file_pred, binary_pred, **params)
+        eval.convert_to_binary(path + file_gold, binary_gold, **params)
+        report_binary = eval.evaluate(binary_pred, binary_gold, m, **params).report
+        #Strings with characters out of ASCII and trailing null characters
+        gold = [{"test_case": "Año\x00", "id": "ñ1", "value": "sí"}, {"test_case": "Año\x00", "id": "2\x00", "value": "no"}]
+        pred = [{"test_case": "Año\x00", "id": "ñ1", "value": "sí"}, {"test_case": "Año\x00", "id": "2\x00", "value": "sí"}]
+        eval.convert_to_binary(gold, binary_gold, **params)
+        report_strings = eval.evaluate_records(pred, gold, m, **params).report
+        report_strings_binary = eval.evaluate_records(pred, binary_gold, m, **params).report
+    print("************** Testing binary format: same metrics than JSON files -- ", end=" ")
+    if report_binary[PyEvALLReport.METRIC_TAG]==report[PyEvALLReport.METRIC_TAG] and report_strings_binary[PyEvALLReport.METRIC_TAG]==report_strings[PyEvALLReport.METRIC_TAG]:
+        print(OKGREEN + "TEST PASSED" + ENDC, ", metrics: ", len(report_binary[PyEvALLReport.METRIC_TAG]))
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+                                            
+
+def test_format_gold_scores():
+    eval = PyEvALLEvaluation()
+    params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
+    m = ["ICMNorm"]
+    path="resources/metric/test/classification/"
+    lst_pred=[path + "predictions/1/SYS1.txt", path + "predictions/1/SYS1.txt"]
+    file_gold="gold/1/GOLD1.txt"
+    report = eval.evaluate(lst_pred[0], path + file_gold, m, **params).report
+    meta_report = eval.evaluate_lst(lst_pred, path + file_gold, m, **params).report
+    with tempfile.TemporaryDirectory() as cache:
+        params[PyEvALLUtils.PARAM_GOLD_CACHE]=cache
+        report_stored = eval.evaluate(lst_pred[0], path + file_gold, m, **params).report
+        report_cached = eval.evaluate(lst_pred[0], path + file_gold, m, **params).report
+        #Only the evaluation that computes the scores stores them
+        entries = [e for e in os.listdir(cache) if ".scores." in e and e.endswith(".json")]
+        params[PyEvALLUtils.PARAM_EXECUTION]=PyEvALLUtils.PARAM_OPTION_EXECUTION_PARALLEL
+        meta_report_cached = eval.evaluate_lst(lst_pred, path + file_gold, m, **params).report
+    print("************** Testing gold scores: same ICMNorm with the shared and cached scores -- ", end=" ")
+    metrics = [r[PyEvALLReport.METRIC_TAG] for r in list(meta_report.values()) + list(meta_report_cached.values())] 
+    metrics += [report_stored[PyEvALLReport.METRIC_TAG], report_cached[PyEvALLReport.METRIC_TAG]]
+    if all(metric==report[PyEvALLReport.METRIC_TAG] for metric in metrics) and len(entries)==1:
+        print(OKGREEN + "TEST PASSED" + ENDC, ", evaluations: ", len(metrics))
+    else:
+        print(FAIL + "TEST FAILED" + ENDC)
+                                            
+
 if __name__ == '__main__':
     test_format_json()
     
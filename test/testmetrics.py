@@ -28,6 +28,7 @@ from pyevall.evaluation import PyEvALLEvaluation
 from pyevall.metrics.metricfactory import MetricFactory
 from pyevall.reports.reports import PyEvALLReport
 from pyevall.utils.utils import PyEvALLUtils
+from pyevall.utils.utils import PyEvALLHierarchy
 
 HEADER = '\033[95m'
 OKBLUE = '\033[94m'
@@ -248,10 +249,55 @@ def evaluate_pyevall_ranking(pred, gold, **params):
 
 
 
+def test_3_ranking_metrics_sweep():
+    folder_pred="resources/metric/test/ranking/predictions/"
+    folder_gold="resources/metric/test/ranking/gold/"
+    params={PyEvALLUtils.PARAM_LOG_LEVEL: PyEvALLUtils.PARAM_OPTION_LOG_LEVEL_NONE }
+    lst_k=[1, 5, 10]
+    for i in range(1,16):
+        print("Executing sweep test number %s: ", i)
+        pred= folder_pred + "SYS" + str(i) + ".txt"
+        gold= folder_gold + "GOLD" + str(i) + ".txt"
+        sweep_params= dict(params, metric_params={MetricFactory.PrecisionAtK.value: {"k_param": lst_k}})
+        df_sweep = evaluate_pyevall_ranking(pred, gold, **sweep_params)
+        passed = True
+        for k in lst_k:
+            df_k = evaluate_pyevall_ranking(pred, gold, **dict(params, k_param=k))
+            score_sweep = df_sweep[df_sweep["metric"]==MetricFactory.PrecisionAtK.value + "@" + str(k)]["score"].tolist()
+            score_k = df_k[df_k["metric"]==MetricFactory.PrecisionAtK.value]["score"].tolist()
+            if not score_sweep==score_k:
+                passed = False
+        if not passed:
+            print("\tTest number %s " % (i), FAIL + "FAILED" + ENDC)
+        else:
+            print("\tTest number %s " % (i), OKGREEN + "PASSED" + ENDC)
+
+            
+            
+def test_4_hierarchy_index():
+    print("Executing test of the compiled hierarchy")
+    hierarchy = {"A":{"A1":["A11", "A12"], "A2":[]}, "B":["B1", "B2"]}
+    index = PyEvALLHierarchy.compile(hierarchy).extend(["C", "A1"])
+    expected = [("A11", "A12", "A1"), ("A11", "A2", "A"), ("A12", "A1", "A1"), ("B1", "B2", "B"), 
+                ("A11", "B1", None), ("B1", "C", None), ("C", "C", "C")]
+    passed = index.get_path("A12")==["A", "A1", "A12"] and index.get_path("C")==["C"] and index.get_path("D")==None
+    passed = passed and index.is_descendant("A11", "A") and not index.is_descendant("A", "A11") 
+    passed = passed and index.get_ancestor_ids("A12").tolist()==[0, 1, 3] and len(index.get_ancestor_ids("D"))==0
+    for class_a, class_b, ancestor in expected:
+        if not index.get_deepest_common_ancestor(class_a, class_b)==ancestor:
+            passed = False
+    if not passed:
+        print("\tTest hierarchy index ", FAIL + "FAILED" + ENDC)
+    else:
+        print("\tTest hierarchy index ", OKGREEN + "PASSED" + ENDC)
+
+
 
 if __name__ == '__main__':    
     test_2_classification_metrics()
     test_1_ranking_metrics()
+    test_3_ranking_metrics_sweep()
+    test_4_hierarchy_index()
 
     
     